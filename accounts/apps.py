@@ -5,3 +5,9 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
     verbose_name = '用户管理'
+
+    def ready(self):
+        from .signals import connect_signals
+        from .tokens import check_revocation_cache
+        connect_signals()
+        check_revocation_cache()
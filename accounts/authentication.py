@@ -0,0 +1,60 @@
+"""
+无状态 JWT 认证
+
+settings.JWT_STATELESS_AUTH 开启时替代 JWTAuthentication：由令牌声明构造 ClaimUser，
+请求认证与 HasPermission 鉴权都不查询数据库，只读取注销缓存与权限版本戳。
+
+令牌中的权限版本与当前版本不一致（用户角色或角色权限已变化、用户被修改）时，
+退回按数据库加载用户，保证变更即时生效。
+"""
+from functools import cached_property
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from . import permission_cache, tokens
+
+
+class ClaimUser(TokenUser):
+    """由令牌声明构造的用户"""
+
+    @cached_property
+    def id(self):
+        # 令牌中的用户ID为字符串，与模型主键保持一致
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def roles(self):
+        return self.token.get('roles', [])
+
+    @cached_property
+    def perm_ver(self):
+        return self.token.get('perm_ver')
+
+    def __str__(self):
+        return f"ClaimUser {self.id}"
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """按令牌声明认证，不查询用户表"""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if tokens.is_revoked(validated_token):
+            raise InvalidToken(_('令牌已注销'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        perm_ver = validated_token.get('perm_ver')
+        user = ClaimUser(validated_token)
+        if perm_ver and perm_ver == permission_cache.get_stamp(user.pk):
+            return user
+        # 签发后用户或权限已变化（或旧版本令牌），按数据库加载
+        return super().get_user(validated_token)
@@ -0,0 +1,152 @@
+"""
+用户权限缓存
+
+把用户通过角色获得的全部权限编译为位集（以 Permission.id 为位序号），按用户缓存。
+HasPermission 在缓存命中时无需查询数据库。
+
+缓存项以版本戳区分:
+    全局版本: 角色、权限或角色-权限关系变化时递增，所有用户的位集失效
+    用户版本: 用户的角色变化时递增，只使该用户的位集失效
+版本戳 "全局版本.用户版本" 同时写入 JWT 的 perm_ver 声明（见 accounts.tokens）。
+
+失效信号只作用于缓存所在的进程。进程内缓存（LocMem/Dummy）无法把失效传给其他
+gunicorn/celery 进程，此时位集只缓存 PERMISSION_CACHE_LOCAL_TIMEOUT 秒（默认 5 秒），
+撤销的角色最多在该时间内仍有效。
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'perm'
+GLOBAL_VERSION_KEY = f'{KEY_PREFIX}:version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PERMISSION_CACHE_ALIAS', 'default')]
+
+
+def is_shared(cache=None):
+    """缓存能否在进程间共享；LocMem/Dummy 只在当前进程内有效"""
+    cache = cache or get_cache()
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def get_timeout():
+    if not is_shared():
+        return getattr(settings, 'PERMISSION_CACHE_LOCAL_TIMEOUT', 5)
+    return getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 60 * 60)
+
+
+def _user_version_key(user_id):
+    return f'{KEY_PREFIX}:user-version:{user_id}'
+
+
+def _catalog_key(global_version):
+    return f'{KEY_PREFIX}:catalog:{global_version}'
+
+
+def _bits_key(user_id, stamp):
+    return f'{KEY_PREFIX}:bits:{user_id}:{stamp}'
+
+
+def _initial_version():
+    # 版本号被淘汰后以当前毫秒时间重新初始化，不会与旧版本号重复
+    return int(time.time() * 1000)
+
+
+def _bump(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+
+
+def invalidate_all():
+    """角色/权限定义变化：所有用户的权限位集失效"""
+    _bump(GLOBAL_VERSION_KEY)
+    logger.debug("权限缓存已全部失效")
+
+
+def invalidate_user(user_id):
+    """用户角色变化：只使该用户的权限位集失效"""
+    _bump(_user_version_key(user_id))
+    logger.debug(f"用户{user_id}的权限缓存已失效")
+
+
+def get_stamp(user_id):
+    """用户当前的权限版本戳"""
+    cache = get_cache()
+    user_key = _user_version_key(user_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, user_key])
+    for key in (GLOBAL_VERSION_KEY, user_key):
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return f'{versions[GLOBAL_VERSION_KEY]}.{versions[user_key]}'
+
+
+def compile_catalog():
+    """权限代码 -> 位序号"""
+    from .models import Permission
+
+    return dict(Permission.objects.values_list('code', 'id'))
+
+
+def compile_bits(user):
+    """计算用户拥有的权限位集"""
+    from .models import Permission
+
+    bits = 0
+    permission_ids = (
+        Permission.objects.filter(role__user=user.pk).values_list('id', flat=True).distinct()
+    )
+    for permission_id in permission_ids:
+        bits |= 1 << permission_id
+    return bits
+
+
+def load(user, stamp=None):
+    """返回 (权限目录, 用户位集)，同一请求内在 user 对象上复用"""
+    stamp = stamp or get_stamp(user.pk)
+    cached = getattr(user, '_permission_cache', None)
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    cache = get_cache()
+    catalog_key = _catalog_key(stamp.split('.')[0])
+    bits_key = _bits_key(user.pk, stamp)
+    values = cache.get_many([catalog_key, bits_key])
+
+    catalog = values.get(catalog_key)
+    if catalog is None:
+        catalog = compile_catalog()
+        cache.set(catalog_key, catalog, get_timeout())
+    bits = values.get(bits_key)
+    if bits is None:
+        bits = compile_bits(user)
+        cache.set(bits_key, bits, get_timeout())
+
+    user._permission_cache = (stamp, catalog, bits)
+    return catalog, bits
+
+
+def has_permission_code(user, code, stamp=None):
+    """用户是否通过角色拥有指定权限代码"""
+    catalog, bits = load(user, stamp)
+    bit = catalog.get(code)
+    if bit is None:
+        return False
+    return bool(bits >> bit & 1)
+
+
+def get_permission_codes(user, stamp=None):
+    """用户拥有的权限代码集合"""
+    catalog, bits = load(user, stamp)
+    return {code for code, bit in catalog.items() if bits >> bit & 1}
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from . import permission_cache
+
 
 class IsSuperUser(permissions.BasePermission):
     """只有超级管理员才能访问"""
@@ -52,11 +54,12 @@ class HasPermission(permissions.BasePermission):
         if request.user.is_superuser:
             return True
         
-        # 检查用户是否拥有该权限
-        permission_code = view.permission_code
+        # 检查用户是否拥有该权限（按用户缓存的权限位集，命中时不查询数据库）
+        permission_code = getattr(view, 'permission_code', None)
         if not permission_code:
             return True
         
-        return request.user.roles.filter(
-            permissions__code=permission_code
-        ).exists()
+        # 无状态认证的用户已在认证时校验过令牌中的权限版本，可直接复用
+        return permission_cache.has_permission_code(
+            request.user, permission_code, stamp=getattr(request.user, 'perm_ver', None)
+        )
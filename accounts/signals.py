@@ -0,0 +1,60 @@
+"""
+权限变更信号
+
+角色、权限及其关联关系变化后递增权限缓存版本（见 permission_cache）。
+失效放在事务提交之后执行，避免其他请求在提交前把旧权限重新写回缓存。
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import permission_cache
+from .models import Permission, Role, User
+
+M2M_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+def invalidate_all(sender, **kwargs):
+    transaction.on_commit(permission_cache.invalidate_all)
+
+
+def role_permissions_changed(sender, action, **kwargs):
+    if action in M2M_ACTIONS:
+        transaction.on_commit(permission_cache.invalidate_all)
+
+
+def user_roles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        # 从角色一侧清空时无法得知受影响的用户
+        transaction.on_commit(permission_cache.invalidate_all)
+        return
+    else:
+        user_ids = list(pk_set or ())
+
+    def invalidate():
+        for user_id in user_ids:
+            permission_cache.invalidate_user(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+def user_saved(sender, instance, created, **kwargs):
+    # 用户状态/超级用户标记变化后，已签发令牌中的声明不再可信
+    if not created:
+        transaction.on_commit(lambda: permission_cache.invalidate_user(instance.pk))
+
+
+def connect_signals():
+    for model in (Role, Permission):
+        post_save.connect(invalidate_all, sender=model,
+                          dispatch_uid=f'permission_cache_save_{model.__name__}')
+        post_delete.connect(invalidate_all, sender=model,
+                            dispatch_uid=f'permission_cache_delete_{model.__name__}')
+    post_save.connect(user_saved, sender=User, dispatch_uid='permission_cache_user_save')
+    m2m_changed.connect(role_permissions_changed, sender=Role.permissions.through,
+                        dispatch_uid='permission_cache_role_permissions')
+    m2m_changed.connect(user_roles_changed, sender=User.roles.through,
+                        dispatch_uid='permission_cache_user_roles')
@@ -0,0 +1,100 @@
+"""
+JWT 令牌声明与注销
+
+签发的令牌携带用户上下文，开启无状态认证（settings.JWT_STATELESS_AUTH）后
+请求的认证与鉴权均不访问数据库（见 accounts.authentication）:
+
+    user_id: 用户ID
+    roles: 角色代码列表
+    perm_ver: 签发时的权限版本戳（permission_cache.get_stamp），角色变化后与当前版本不一致
+    is_superuser / is_staff: 超级用户、管理员标记
+    sid: 会话ID，即登录时 refresh token 的 jti，刷新得到的令牌沿用同一 sid
+
+登出时按 sid 写入注销缓存，该会话签发的所有令牌立即失效（缓存时间为 refresh token 有效期）。
+注销缓存必须在进程间共享，无状态认证下使用进程内缓存时启动即报错（check_revocation_cache）。
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer, TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import permission_cache
+
+REVOKED_KEY = 'jwt:revoked:{}'
+
+
+def set_user_claims(token, user):
+    """写入用户上下文声明"""
+    token['roles'] = list(user.roles.values_list('code', flat=True))
+    token['perm_ver'] = permission_cache.get_stamp(user.pk)
+    token['is_superuser'] = user.is_superuser
+    token['is_staff'] = user.is_staff
+    return token
+
+
+def issue_tokens(user):
+    """为用户签发 refresh/access 令牌"""
+    refresh = RefreshToken.for_user(user)
+    refresh['sid'] = refresh[api_settings.JTI_CLAIM]
+    set_user_claims(refresh, user)
+    return refresh
+
+
+def get_session_id(token):
+    return token.get('sid') or token.get(api_settings.JTI_CLAIM)
+
+
+def revoke(token):
+    """注销令牌所属会话"""
+    permission_cache.get_cache().set(
+        REVOKED_KEY.format(get_session_id(token)), True,
+        int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def is_revoked(token):
+    return bool(permission_cache.get_cache().get(REVOKED_KEY.format(get_session_id(token))))
+
+
+def check_revocation_cache():
+    """无状态认证只按注销缓存判断登出；进程内缓存中的注销对其他进程无效"""
+    if getattr(settings, 'JWT_STATELESS_AUTH', False) and not permission_cache.is_shared():
+        raise ImproperlyConfigured(
+            'JWT_STATELESS_AUTH 需要进程间共享的缓存（配置 REDIS_URL），'
+            '进程内缓存（LocMem/Dummy）中的登出注销只在处理登出的进程内生效'
+        )
+
+
+class RiskTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """签发携带用户上下文的令牌（settings.SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER']）"""
+
+    @classmethod
+    def get_token(cls, user):
+        return issue_tokens(user)
+
+
+class RiskTokenRefreshSerializer(TokenRefreshSerializer):
+    """刷新令牌：拒绝已注销会话，并按用户当前角色重写声明"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise InvalidToken(_('令牌已注销'))
+
+        data = super().validate(attrs)
+
+        from .models import User
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+        if user is None:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        data['access'] = str(set_user_claims(AccessToken(data['access']), user))
+        if 'refresh' in data:
+            data['refresh'] = str(set_user_claims(RefreshToken(data['refresh']), user))
+        return data
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, RoleViewSet, PermissionViewSet, LoginView, LogoutView
+from .views import UserViewSet, RoleViewSet, PermissionViewSet, LoginView, LogoutView, QuotaView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -10,5 +10,6 @@ router.register(r'permissions', PermissionViewSet, basename='permission')
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('quota/', QuotaView.as_view(), name='quota'),
     path('', include(router.urls)),
 ]
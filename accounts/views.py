@@ -1,8 +1,10 @@
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.db import models
 from django.shortcuts import get_object_or_404
 from .models import User, Role, Permission
 from .serializers import (
@@ -10,11 +12,14 @@ from .serializers import (
     RoleSerializer, PermissionSerializer, LoginSerializer, ChangePasswordSerializer
 )
 from .permissions import IsSuperUser, IsAdminOrReadOnly
+from . import tokens
 
 
 class LoginView(views.APIView):
     """用户登录"""
     
+    permission_classes = [AllowAny]
+    
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -37,7 +42,7 @@ class LoginView(views.APIView):
             )
         
         # 生成Token
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens.issue_tokens(user)
         
         return Response({
             'access': str(refresh.access_token),
@@ -49,17 +54,34 @@ class LoginView(views.APIView):
 class LogoutView(views.APIView):
     """用户登出"""
     
+    permission_classes = [AllowAny]
+    
     def post(self, request):
         try:
+            # 注销会话：该会话签发的 refresh/access 令牌立即失效
             refresh_token = request.data.get('refresh')
             if refresh_token:
-                token = RefreshToken(refresh_token)
-                token.blacklist()
+                tokens.revoke(RefreshToken(refresh_token))
+            if request.auth is not None:
+                tokens.revoke(request.auth)
             return Response({'message': '登出成功'})
         except Exception as e:
             return Response({'message': '登出成功'})
 
 
+class QuotaView(views.APIView):
+    """当前用户的接口调用配额"""
+    
+    def get(self, request):
+        quotas = []
+        for throttle in self.get_throttles():
+            if hasattr(throttle, 'get_quota'):
+                quota = throttle.get_quota(request, self)
+                if quota is not None:
+                    quotas.append(quota)
+        return Response(quotas)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     """用户视图集"""
     
@@ -97,7 +119,11 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         """获取当前用户信息"""
-        serializer = self.get_serializer(request.user)
+        user = request.user
+        if not isinstance(user, User):
+            # 无状态认证时 request.user 为令牌声明构造的用户
+            user = get_object_or_404(User, pk=user.pk)
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -133,7 +159,7 @@ class UserViewSet(viewsets.ModelViewSet):
 class RoleViewSet(viewsets.ModelViewSet):
     """角色视图集"""
     
-    queryset = Role.objects.prefetch_related('permissions').all()
+    queryset = Role.objects.prefetch_related('permissions').order_by('id')
     serializer_class = RoleSerializer
     permission_classes = [IsAdminOrReadOnly]
     
@@ -151,7 +177,7 @@ class RoleViewSet(viewsets.ModelViewSet):
 class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
     """权限视图集（只读）"""
     
-    queryset = Permission.objects.all()
+    queryset = Permission.objects.order_by('id')
     serializer_class = PermissionSerializer
     permission_classes = [IsSuperUser]
     
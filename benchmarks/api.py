@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+接口基准测试
+
+在测试数据库中生成合成数据后逐个请求 benchmarks.endpoints.ENDPOINTS，
+输出各接口的延迟分位数与 SQL 条数，超出 budgets.json 预算时以非零状态退出。
+结果写入 benchmarks/results/api-<时间>.json，可用 --compare 与历史结果对比。
+
+用法:
+    python benchmarks/api.py --portfolios 50 --days 60
+    python benchmarks/api.py --existing            # 使用已配置数据库中的现有数据
+    python benchmarks/api.py --compare benchmarks/results/api-20240601-120000.json
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'risk_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework.throttling import SimpleRateThrottle  # noqa: E402
+
+from benchmarks import endpoints  # noqa: E402
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+BENCHMARK_PASSWORD = 'benchmark-pass-123'
+# 限流仍然生效（计入请求开销），但速率足够高，不会拦截基准请求
+THROTTLE_RATES = {'anon': '100000/s', 'user': '100000/s'}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def book_size():
+    from risk.models import Holding, Portfolio, RiskAlert, RiskIndicator, Trade
+
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (Portfolio, RiskIndicator, Holding, Trade, RiskAlert)
+    }
+
+
+def get_client():
+    from accounts import tokens
+    from accounts.models import User
+
+    user = User.objects.filter(email=BENCHMARK_EMAIL).first()
+    if user is None:
+        user = User.objects.create_superuser(email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD)
+    # 接口异常时记为 500 继续运行，而不是中断整个基准
+    client = APIClient(raise_request_exception=False)
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens.issue_tokens(user).access_token}')
+    return client
+
+
+def compare(results, previous_file):
+    with open(previous_file, encoding='utf-8') as f:
+        previous = json.load(f)['results']
+    print(f"\n与 {previous_file} 对比:")
+    for name, result in results.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+        queries = result['queries'] - old['queries']
+        print(f"  {name:<24} p95 {change:+6.1f}%  SQL {queries:+d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接口延迟与 SQL 条数基准')
+    parser.add_argument('--portfolios', type=int, default=50)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--trades-per-day', type=float, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=20, help='每个接口的请求次数')
+    parser.add_argument('--only', nargs='*', help='只运行指定名称的接口')
+    parser.add_argument('--existing', action='store_true',
+                        help='不创建测试数据库，直接使用已配置数据库中的数据')
+    parser.add_argument('--budgets', default=str(endpoints.BUDGETS_FILE))
+    parser.add_argument('--no-latency-check', action='store_true', help='只检查 SQL 条数预算')
+    parser.add_argument('--output', default=str(ROOT / 'benchmarks' / 'results'))
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    if not args.existing:
+        connection.creation.create_test_db(verbosity=0)
+        call_command(
+            'generate_synthetic_book', portfolios=args.portfolios, days=args.days,
+            trades_per_day=args.trades_per_day, seed=args.seed, verbosity=0,
+        )
+
+    client = get_client()
+    fixtures = endpoints.get_fixtures(BENCHMARK_EMAIL, BENCHMARK_PASSWORD)
+    results = {}
+    with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, THROTTLE_RATES):
+        print(f"{'接口':<24} {'状态':>4} {'SQL':>5} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+        for name, method, url, params in endpoints.build_requests(fixtures, args.only):
+            # 登录要计算密码哈希，少量请求即可
+            iterations = min(args.iterations, 5) if name == 'login' else args.iterations
+            result = endpoints.measure(client, method, url, params, iterations)
+            results[name] = result
+            print(
+                f"{name:<24} {result['status']:>4} {result['queries']:>5} "
+                f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}"
+            )
+
+    violations = endpoints.check(
+        results, endpoints.load_budgets(args.budgets), latency=not args.no_latency_check
+    )
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'database': connection.vendor,
+        'book': book_size(),
+        'iterations': args.iterations,
+        'results': results,
+        'violations': violations,
+    }
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    path = output / f"api-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\n结果已写入 {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if violations:
+        print("\n超出预算:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("全部接口在预算内")
+
+
+if __name__ == '__main__':
+    main()
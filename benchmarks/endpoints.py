@@ -0,0 +1,158 @@
+"""
+接口基准：延迟分位数与 SQL 条数
+
+ENDPOINTS 列出 risk、accounts、tasks 各路由下的读接口（列表、筛选、搜索、历史、最新、仪表盘、统计），
+以 generate_synthetic_book 生成的数据为准逐个请求，记录每次请求的耗时与 SQL 条数。
+
+budgets.json 为各接口的预算:
+    max_queries: 单次请求 SQL 条数上限（含缓存未命中的首次请求），与数据量无关，N+1 查询会直接超出
+    p95_ms: 95 分位延迟上限（毫秒），只在 benchmarks/api.py 中检查
+
+tests.py 中的 QueryBudgetTest 用小规模数据检查 SQL 条数预算，随单元测试运行。
+依赖 Celery 结果后端的接口（任务状态、进度推送、手动执行）不在此列。
+"""
+import datetime
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+BUDGETS_FILE = Path(__file__).resolve().parent / 'budgets.json'
+
+# (名称, 方法, 路由名, 路由参数, 查询参数/请求体)
+# 参数中的 {portfolio}、{date} 等由 get_fixtures 的结果填充
+ENDPOINTS = [
+    # risk
+    ('portfolio-list', 'get', 'portfolio-list', None, None),
+    ('portfolio-filter', 'get', 'portfolio-list', None, {'status': 'active', 'type': 'stock'}),
+    ('portfolio-search', 'get', 'portfolio-list', None, {'search': '{portfolio_code}'}),
+    ('portfolio-detail', 'get', 'portfolio-detail', {'pk': '{portfolio}'}, None),
+    ('portfolio-risk-summary', 'get', 'portfolio-risk-summary', {'pk': '{portfolio}'}, None),
+    ('indicator-list', 'get', 'indicator-list', None, None),
+    ('indicator-filter', 'get', 'indicator-list', None,
+     {'portfolio': '{portfolio}', 'start_date': '{start_date}', 'end_date': '{date}'}),
+    ('indicator-latest', 'get', 'indicator-latest', None, None),
+    ('indicator-history', 'get', 'indicator-history', None, {'portfolio': '{portfolio}'}),
+    ('trade-list', 'get', 'trade-list', None, None),
+    ('trade-filter', 'get', 'trade-list', None,
+     {'portfolio': '{portfolio}', 'start_date': '{start_date}', 'end_date': '{date}', 'type': 'buy'}),
+    ('trade-search', 'get', 'trade-list', None, {'search': '{security_code}'}),
+    ('trade-summary', 'get', 'trade-summary', None, {'start_date': '{start_date}', 'end_date': '{date}'}),
+    ('trade-abnormal', 'get', 'trade-abnormal', None, None),
+    ('holding-list', 'get', 'holding-list', None, None),
+    ('holding-filter', 'get', 'holding-list', None, {'portfolio': '{portfolio}', 'date': '{date}'}),
+    ('alert-list', 'get', 'alert-list', None, None),
+    ('alert-filter', 'get', 'alert-list', None, {'status': 'resolved', 'severity': 'error'}),
+    ('alert-pending', 'get', 'alert-pending', None, None),
+    ('alert-statistics', 'get', 'alert-statistics', None, None),
+    ('risk-dashboard', 'get', 'risk-dashboard', None, None),
+    # accounts
+    ('login', 'post', 'login', None, {'email': '{email}', 'password': '{password}'}),
+    ('user-list', 'get', 'user-list', None, None),
+    ('user-me', 'get', 'user-me', None, None),
+    ('role-list', 'get', 'role-list', None, None),
+    ('permission-list', 'get', 'permission-list', None, None),
+    ('quota', 'get', 'quota', None, None),
+    # tasks
+    ('task-list', 'get', 'task-list', None, None),
+    ('pipeline-runs', 'get', 'pipeline-runs', None, None),
+]
+
+
+def load_budgets(path=BUDGETS_FILE):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_fixtures(email, password):
+    """从已有数据中取请求参数"""
+    from risk.models import Portfolio, RiskIndicator, Trade
+
+    portfolio = Portfolio.objects.order_by('id').first()
+    date = RiskIndicator.objects.order_by('-indicator_date').values_list('indicator_date', flat=True).first()
+    if portfolio is None or date is None:
+        raise RuntimeError('没有可用的组合数据，请先运行 generate_synthetic_book')
+    trade = Trade.objects.filter(portfolio=portfolio).order_by('id').first()
+    return {
+        'portfolio': portfolio.pk,
+        'portfolio_code': portfolio.code,
+        'date': date.isoformat(),
+        'start_date': (date - datetime.timedelta(days=30)).isoformat(),
+        'security_code': trade.security_code if trade else '',
+        'email': email,
+        'password': password,
+    }
+
+
+def _fill(template, fixtures):
+    if not template:
+        return template
+    return {key: str(value).format(**fixtures) for key, value in template.items()}
+
+
+def build_requests(fixtures, names=None):
+    """[(名称, 方法, URL, 参数)]"""
+    requests = []
+    for name, method, url_name, kwargs, params in ENDPOINTS:
+        if names and name not in names:
+            continue
+        url = reverse(url_name, kwargs=_fill(kwargs, fixtures))
+        requests.append((name, method, url, _fill(params, fixtures)))
+    return requests
+
+
+def call(client, method, url, params):
+    if method == 'get':
+        return client.get(url, params)
+    return client.generic(method.upper(), url, json.dumps(params or {}), content_type='application/json')
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client, method, url, params, iterations=20):
+    """请求 iterations 次，返回延迟分位数与 SQL 条数（首次请求可能未命中缓存，SQL 条数取最大值）"""
+    timings = []
+    queries = []
+    status_code = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = call(client, method, url, params)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+        status_code = response.status_code
+    return {
+        'status': status_code,
+        'iterations': iterations,
+        'queries': max(queries),
+        'queries_warm': min(queries),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def check(results, budgets, latency=True):
+    """与预算比较，返回超出预算的说明列表"""
+    violations = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            violations.append(f"{name}: budgets.json 中缺少预算")
+            continue
+        if result['status'] >= 400:
+            violations.append(f"{name}: 返回状态码 {result['status']}")
+        if result['queries'] > budget['max_queries']:
+            violations.append(f"{name}: SQL {result['queries']} 条，预算 {budget['max_queries']} 条")
+        if latency and result['p95_ms'] > budget['p95_ms']:
+            violations.append(f"{name}: p95 {result['p95_ms']}ms，预算 {budget['p95_ms']}ms")
+    return violations
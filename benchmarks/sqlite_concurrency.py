@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+SQLite 并发读写基准
+
+对比默认回滚日志模式与 settings.SQLITE_PRAGMAS（WAL 等）下，
+多个读进程（模拟 Web worker）与写进程（模拟 Celery 任务）同时访问同一库文件时的吞吐量。
+
+用法:
+    python benchmarks/sqlite_concurrency.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'risk_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from risk_project.sqlite import apply_pragmas  # noqa: E402
+
+# 默认模式只设置与 Django 相同的锁等待时间（sqlite3.connect 的 timeout=5）
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000}
+ROWS = 20000
+
+
+def prepare(path, pragmas):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn.cursor(), pragmas)
+    conn.execute(
+        'CREATE TABLE trade (id INTEGER PRIMARY KEY, portfolio_id INTEGER, amount REAL, created REAL)'
+    )
+    conn.execute('CREATE INDEX trade_portfolio ON trade (portfolio_id)')
+    conn.executemany(
+        'INSERT INTO trade (portfolio_id, amount, created) VALUES (?, ?, ?)',
+        ((random.randint(1, 200), random.random() * 1e6, time.time()) for _ in range(ROWS)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def reader(path, pragmas, deadline, counter, errors):
+    conn = sqlite3.connect(path, timeout=5)
+    apply_pragmas(conn.cursor(), pragmas)
+    done = failed = 0
+    while time.time() < deadline:
+        try:
+            conn.execute(
+                'SELECT COUNT(*), SUM(amount) FROM trade WHERE portfolio_id = ?',
+                (random.randint(1, 200),),
+            ).fetchone()
+            done += 1
+        except sqlite3.OperationalError:
+            failed += 1
+    conn.close()
+    with counter.get_lock():
+        counter.value += done
+    with errors.get_lock():
+        errors.value += failed
+
+
+def writer(path, pragmas, deadline, counter, errors, batch=20):
+    conn = sqlite3.connect(path, timeout=5)
+    apply_pragmas(conn.cursor(), pragmas)
+    done = failed = 0
+    while time.time() < deadline:
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT INTO trade (portfolio_id, amount, created) VALUES (?, ?, ?)',
+                    [(random.randint(1, 200), random.random() * 1e6, time.time()) for _ in range(batch)],
+                )
+            done += 1
+        except sqlite3.OperationalError:
+            failed += 1
+    conn.close()
+    with counter.get_lock():
+        counter.value += done
+    with errors.get_lock():
+        errors.value += failed
+
+
+def run(name, pragmas, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        prepare(path, pragmas)
+
+        reads, writes = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+        errors = multiprocessing.Value('i', 0)
+        deadline = time.time() + seconds
+        processes = [
+            multiprocessing.Process(target=reader, args=(path, pragmas, deadline, reads, errors))
+            for _ in range(readers)
+        ] + [
+            multiprocessing.Process(target=writer, args=(path, pragmas, deadline, writes, errors))
+            for _ in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    result = {
+        'mode': name,
+        'reads_per_sec': round(reads.value / seconds, 1),
+        'writes_per_sec': round(writes.value / seconds, 1),
+        'errors': errors.value,
+    }
+    print(
+        f"{name:<8} 读 {result['reads_per_sec']:>10}/s  "
+        f"写事务 {result['writes_per_sec']:>8}/s  锁超时 {result['errors']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 并发读写基准')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"读进程 {args.readers}，写进程 {args.writers}，每种模式运行 {args.seconds} 秒")
+    baseline = run('default', DEFAULT_PRAGMAS, args.readers, args.writers, args.seconds)
+    tuned = run('tuned', settings.SQLITE_PRAGMAS, args.readers, args.writers, args.seconds)
+    for key in ('reads_per_sec', 'writes_per_sec'):
+        if baseline[key]:
+            print(f"{key}: {tuned[key] / baseline[key]:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
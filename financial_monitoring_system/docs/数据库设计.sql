@@ -102,7 +102,7 @@ CREATE TABLE IF NOT EXISTS alert_rule (
     status VARCHAR(10) DEFAULT 'active',    -- 状态: active, inactive
     notify_channels TEXT,                   -- 通知渠道 (JSON: ["lark", "email"])
     notify_users TEXT,                      -- 通知用户 (JSON: ["user1", "user2"])
-    cooldown_minutes INTEGER DEFAULT 10,    -- 冷却时间(分钟)
+    cooldown_minutes INTEGER DEFAULT 10,    -- 冷却时间(分钟): 恢复后该时长内再次触发时重开原告警记录
     enabled INTEGER DEFAULT 1,              -- 是否启用
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -257,6 +257,27 @@ CREATE TABLE IF NOT EXISTS sync_log (
 CREATE INDEX idx_sync_log_source ON sync_log(data_source_id);
 CREATE INDEX idx_sync_log_time ON sync_log(start_time DESC);
 
+-- ============================================================
+-- 13. 告警状态表 (告警状态机持久化, 每个 规则+指标 一行)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS alert_state (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_id INTEGER NOT NULL,               -- 告警规则ID
+    metric_code VARCHAR(50) NOT NULL,       -- 指标编码
+    state VARCHAR(10) NOT NULL DEFAULT 'inactive',  -- 状态: inactive, pending, firing, resolved
+    state_since DATETIME,                   -- 进入当前状态的时间
+    pending_since DATETIME,                 -- 开始满足条件的时间
+    resolved_at DATETIME,                   -- 最近一次恢复时间
+    last_value DOUBLE,                      -- 最近一次评估的指标值
+    alert_record_id INTEGER,                -- 当前关联的告警记录 (同组告警共用一条)
+    group_key VARCHAR(100),                 -- 分组键
+    flapping INTEGER DEFAULT 0,             -- 是否处于抖动抑制
+    transitions TEXT,                       -- 抖动检测窗口内的状态切换时间 (JSON)
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (rule_id, metric_code),
+    FOREIGN KEY (rule_id) REFERENCES alert_rule(id)
+);
+
 -- ============================================================
 -- 触发器: 更新时间戳
 -- ============================================================
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+邮件通知压测
+
+在独立线程中启动 aiosmtpd 模拟 SMTP 服务 (需要登录, 统计连接数和收到的邮件数),
+分别用旧方式 (协程内调用 smtplib, 每封邮件连接并登录一次) 和通知分发器 (aiosmtplib 连接池) 发送同一批邮件,
+同时用一个每 10ms 唤醒一次的协程测量事件循环的最大阻塞时间 (即接口在此期间的最大响应延迟)。
+
+    python scripts/benchmark_email.py -n 1000
+    python scripts/benchmark_email.py -n 1000 --latency 5    # 模拟服务器每条命令 5ms 延迟
+"""
+import argparse
+import asyncio
+import smtplib
+import socket
+import sys
+import time
+import warnings
+from email.header import Header
+from email.mime.text import MIMEText
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "backend"))
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP, AuthResult
+from loguru import logger
+
+from app.config import settings
+from app.services.notify_dispatcher import NotifyDispatcher
+from app.services.notify_service import NotifyService
+
+
+class CountingHandler:
+    """统计收到的邮件"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.messages = 0
+        self.connections = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        return "250 Message accepted for delivery"
+
+
+class FakeSmtpServer(Controller):
+    """aiosmtpd 模拟服务: 接受任意账号登录 (明文, 仅用于本地压测)"""
+
+    def factory(self):
+        handler = self.handler
+        handler.connections += 1
+        return SMTP(
+            handler,
+            authenticator=lambda *args: AuthResult(success=True),
+            auth_require_tls=False,
+        )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def watch_loop(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """返回事件循环的最大阻塞时间(秒)"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_baseline(config: dict, count: int):
+    """旧方式: 在协程内同步调用 smtplib"""
+    for i in range(count):
+        msg = MIMEText("benchmark", "plain", "utf-8")
+        msg["Subject"] = Header(f"告警 {i}", "utf-8")
+        msg["From"] = config["from_address"]
+        msg["To"] = ",".join(config["to_addresses"])
+        server = smtplib.SMTP(config["smtp_host"], config["smtp_port"])
+        server.login(config["username"], config["password"])
+        server.sendmail(config["from_address"], config["to_addresses"], msg.as_string())
+        server.quit()
+
+
+async def run_dispatcher(config: dict, count: int):
+    """通知分发器: aiosmtplib 连接池 + 批量发送"""
+    dispatcher = NotifyDispatcher(NotifyService())
+    dispatcher.start()
+    for i in range(count):
+        dispatcher.submit("email", config, f"告警 {i}", "benchmark")
+    await dispatcher.join(timeout=300)
+    await dispatcher.stop()
+
+
+async def main(args):
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    warnings.filterwarnings("ignore", message="Session.login_data")
+    settings.notify.concurrency["email"] = args.concurrency
+    settings.notify.smtp_max_connections = args.concurrency
+    settings.notify.rate_limits.pop("email", None)
+
+    handler = CountingHandler(args.latency / 1000)
+    server = FakeSmtpServer(handler, hostname="127.0.0.1", port=free_port())
+    server.start()
+    config = {
+        "smtp_host": "127.0.0.1",
+        "smtp_port": server.port,
+        "username": "monitor",
+        "password": "secret",
+        "start_tls": False,
+        "from_address": "monitor@example.com",
+        "to_addresses": ["ops@example.com"],
+    }
+
+    print(f"🚀 发送 {args.count} 封邮件 -> {server.hostname}:{server.port} (并发 {args.concurrency})")
+    print(f"{'方式':<16}{'收到':>8}{'耗时(s)':>10}{'封/秒':>10}{'连接数':>8}{'最大阻塞(ms)':>14}")
+    for name, run in (
+        ("smtplib 逐封连接", run_baseline),
+        ("通知分发器", run_dispatcher),
+    ):
+        handler.messages = handler.connections = 0
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(watch_loop(stop))
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        await run(config, args.count)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        stall = await watcher
+        print(f"{name:<16}{handler.messages:>8}{elapsed:>10.2f}{handler.messages / elapsed:>10.0f}"
+              f"{handler.connections:>8}{stall * 1000:>14.1f}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="邮件通知压测")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="邮件封数")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发连接数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务器每条命令的延迟(毫秒)")
+    asyncio.run(main(parser.parse_args()))
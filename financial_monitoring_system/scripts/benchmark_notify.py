@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+通知发送压测
+
+在本地启动一个模拟 webhook 服务 (HTTP/1.1 keep-alive, 统计建立的连接数, 可按比例返回 500),
+分别用旧方式 (每条消息新建 httpx.AsyncClient) 和通知分发器发送同一批消息, 对比吞吐和连接数。
+
+    python scripts/benchmark_notify.py -n 2000
+    python scripts/benchmark_notify.py -n 2000 --tls            # 需要 openssl 命令生成自签名证书
+    python scripts/benchmark_notify.py -n 500 --fail-rate 0.2   # 验证失败重试
+    python scripts/benchmark_notify.py -n 500 --digest           # 模拟告警风暴, 对比开启告警汇总后的请求数
+"""
+import argparse
+import asyncio
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "backend"))
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+from app.services.notify_digest import NotifyDigest
+from app.services.notify_dispatcher import HttpClientPool, NotifyDispatcher
+from app.services.notify_service import NotifyService
+
+
+class FakeWebhookServer:
+    """模拟 webhook 服务"""
+
+    def __init__(self, fail_rate: float = 0.0, latency: float = 0.0):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.failures = 0
+        self.server = None
+
+    async def start(self, ssl_context=None) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=ssl_context)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reset(self):
+        self.connections = self.requests = self.failures = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                self.requests += 1
+                # 按比例返回失败 (确定性分布, 便于复现)
+                fail = self.fail_rate and (self.requests * self.fail_rate) % 1 + self.fail_rate >= 1
+                if fail:
+                    self.failures += 1
+                    status, body = b"500 Internal Server Error", b'{"ok":false}'
+                else:
+                    status, body = b"200 OK", b'{"ok":true}'
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_certificate(directory: str):
+    """用 openssl 生成自签名证书, 返回 (服务端 SSLContext, 证书路径)"""
+    cert, key = f"{directory}/cert.pem", f"{directory}/key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context, cert
+
+
+async def run_baseline(url: str, count: int, concurrency: int, verify) -> int:
+    """旧方式: 每条消息新建客户端, 失败固定间隔重试"""
+    semaphore = asyncio.Semaphore(concurrency)
+    sent = 0
+
+    async def send(i: int):
+        nonlocal sent
+        async with semaphore:
+            for attempt in range(settings.notify.max_retry_times):
+                try:
+                    async with httpx.AsyncClient(verify=verify) as client:
+                        response = await client.post(url, json={"title": f"告警 {i}", "content": "benchmark"})
+                        response.raise_for_status()
+                    sent += 1
+                    return
+                except httpx.HTTPError:
+                    await asyncio.sleep(settings.notify.retry_base_delay)
+
+    await asyncio.gather(*(send(i) for i in range(count)))
+    return sent
+
+
+async def run_dispatcher(url: str, count: int, verify) -> int:
+    """通知分发器: 长连接 + 队列 + 指数退避重试"""
+    dispatcher = NotifyDispatcher(NotifyService(HttpClientPool(verify=verify)))
+    dispatcher.start()
+    for i in range(count):
+        dispatcher.submit("webhook", {"url": url}, f"告警 {i}", "benchmark")
+    await dispatcher.join(timeout=300)
+    sent = dispatcher.stats["sent"]
+    await dispatcher.stop()
+    return sent
+
+
+async def run_digest(url: str, count: int, verify, spread: float) -> int:
+    """告警风暴: spread 秒内陆续到达 count 条告警 (其中 5% 为 P1), 经告警汇总后发送"""
+    dispatcher = NotifyDispatcher(NotifyService(HttpClientPool(verify=verify)))
+    digest = NotifyDigest(dispatcher)
+    dispatcher.start()
+    for i in range(count):
+        severity = "P1" if i % 20 == 0 else "P2"
+        digest.add("webhook", {"url": url}, f"告警 {i}", f"告警 {i}\n指标: M{i}\n当前值: {i}", "error", severity)
+        await asyncio.sleep(spread / count)
+    digest.flush_all()
+    await dispatcher.join(timeout=300)
+    sent = dispatcher.stats["sent"]
+    await dispatcher.stop()
+    print(f"  告警汇总: {count} 条告警 -> {sent} 次请求 "
+          f"(立即发送 {digest.stats['immediate']}, 汇总 {digest.stats['digests_sent']} 条)")
+    return sent
+
+
+async def main(args):
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    settings.notify.retry_base_delay = 0.05
+    settings.notify.concurrency["webhook"] = args.concurrency
+    settings.notify.max_connections_per_host = args.concurrency
+    if not args.rate_limit:
+        settings.notify.rate_limits.pop("webhook", None)
+
+    server = FakeWebhookServer(args.fail_rate, args.latency / 1000)
+    with tempfile.TemporaryDirectory() as directory:
+        ssl_context, verify = None, True
+        if args.tls:
+            ssl_context, verify = make_certificate(directory)
+        port = await server.start(ssl_context)
+        url = f"{'https' if args.tls else 'http'}://127.0.0.1:{port}/webhook"
+
+        print(f"🚀 发送 {args.count} 条消息 -> {url} (并发 {args.concurrency}, 失败率 {args.fail_rate:.0%})")
+        print(f"{'方式':<16}{'成功':>8}{'耗时(s)':>10}{'条/秒':>10}{'连接数':>8}{'请求数':>8}")
+        runs = [
+            ("每条新建客户端", lambda: run_baseline(url, args.count, args.concurrency, verify)),
+            ("通知分发器", lambda: run_dispatcher(url, args.count, verify)),
+        ]
+        if args.digest:
+            settings.notify.digest_window_seconds = args.digest_window
+            runs.append(("告警汇总", lambda: run_digest(url, args.count, verify, args.storm_seconds)))
+        for name, run in runs:
+            server.reset()
+            started = time.perf_counter()
+            sent = await run()
+            elapsed = time.perf_counter() - started
+            print(f"{name:<16}{sent:>8}{elapsed:>10.2f}{sent / elapsed:>10.0f}"
+                  f"{server.connections:>8}{server.requests:>8}")
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="通知发送压测")
+    parser.add_argument("-n", "--count", type=int, default=2000, help="消息条数")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发发送数")
+    parser.add_argument("--tls", action="store_true", help="使用 HTTPS (自签名证书)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="模拟服务返回 500 的比例")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务响应延迟(毫秒)")
+    parser.add_argument("--rate-limit", action="store_true", help="启用 settings.notify.rate_limits 限流")
+    parser.add_argument("--digest", action="store_true", help="增加告警汇总对比 (告警在 --storm-seconds 内陆续到达)")
+    parser.add_argument("--storm-seconds", type=float, default=5.0, help="告警风暴持续时长(秒)")
+    parser.add_argument("--digest-window", type=float, default=1.0, help="汇总窗口(秒)")
+    asyncio.run(main(parser.parse_args()))
@@ -2,7 +2,7 @@
 系统配置管理
 """
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import os
 import json
 import yaml
@@ -26,6 +26,17 @@ class DatabaseConfig(BaseModel):
     name: str = "financial_monitoring.db"
     pool_size: int = 5
     max_overflow: int = 10
+    # SQLite 连接参数，每个新连接建立时执行（见 app.database）
+    sqlite_pragmas: Dict[str, Union[str, int]] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # 64 MiB
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    }
+    sqlite_checkpoint_mode: str = "TRUNCATE"
+    sqlite_maintenance_interval: int = 3600  # PRAGMA optimize 与 WAL 检查点间隔(秒)
     
     @property
     def url(self) -> str:
@@ -59,14 +70,54 @@ class SchedulerConfig(BaseModel):
     check_interval: int = 60  # 告警检查间隔(秒)
     data_sync_interval: int = 300  # 数据同步间隔(秒)
     report_generate_time: str = "07:00"  # 报告生成时间
+    event_driven_alerts: bool = True  # 数据写入后立即评估相关规则, 定时全量检查保留兜底
     timezone: str = "Asia/Shanghai"
 
 
+class MetricStoreConfig(BaseModel):
+    """指标内存缓存配置 (见 app.services.metric_store)"""
+    capacity: int = 720  # 每个指标保留的最近数据点数
+    max_metrics: int = 2000  # 缓存的指标数上限, 超出时淘汰最久未访问的指标
+    warm_on_startup: bool = True
+
+
+class AlertConfig(BaseModel):
+    """告警状态机默认参数 (见 app.services.alert_state, 规则 condition_config 中同名字段可覆盖)"""
+    for_seconds: int = 0  # 条件持续满足多久后才告警
+    flap_window_minutes: int = 30  # 抖动检测窗口
+    flap_threshold: int = 6  # 窗口内 firing/resolved 切换次数达到该值视为抖动, 0 表示不检测
+    stale_minutes: int = 60  # 启用规则超过该时长没有评估结果 (指标无数据) 时视为恢复, 0 表示不检查
+
+
 class NotifyConfig(BaseModel):
     """通知配置"""
     default_channels: List[str] = ["lark"]
     max_retry_times: int = 3
-    retry_interval: int = 60
+    retry_interval: int = 60  # 重试退避上限(秒)
+    # 通知分发 (见 app.services.notify_dispatcher)
+    retry_base_delay: float = 1.0  # 首次重试的退避基数(秒), 之后按 2 的幂增长并加随机抖动
+    queue_size: int = 10000  # 每个渠道类型的待发送队列上限, 满时丢弃新消息
+    timeout: float = 10.0  # 单次请求超时(秒)
+    max_connections_per_host: int = 10
+    # 各渠道类型的并发发送数
+    concurrency: Dict[str, int] = {
+        "lark": 4, "wecom": 4, "dingtalk": 4, "telegram": 4, "webhook": 8, "email": 2,
+    }
+    # 各渠道单个目标 (同一机器人/地址) 每分钟最多发送条数, 参照各平台限流
+    rate_limits: Dict[str, int] = {
+        "lark": 100, "wecom": 20, "dingtalk": 20, "telegram": 60, "webhook": 600, "email": 120,
+    }
+    # 可批量发送的渠道每批最多条数 (同一 SMTP 连接的排队消息合并为一批, 见 NotifyService.deliver_batch)
+    batch_size: int = 50
+    # SMTP 连接池 (见 app.services.smtp_pool)
+    smtp_max_connections: int = 4  # 每个 SMTP 服务器 (地址 + 账号) 最多保持的连接数
+    smtp_idle_timeout: float = 60.0  # 空闲连接超过该时长(秒)后重新连接, 应小于服务器的空闲断开时间
+    smtp_max_messages: int = 100  # 单个连接最多发送邮件数, 达到后重新连接
+    # 告警汇总 (见 app.services.notify_digest): 同一渠道同一接收方的告警在窗口内合并为一条
+    digest_enabled: bool = True
+    digest_window_seconds: float = 30.0  # 首条告警到达后等待的时长, 到期发送汇总
+    digest_max_items: int = 20  # 窗口内累计达到该条数时立即发送汇总
+    digest_immediate_severities: List[str] = ["P1"]  # 这些级别的告警不等待, 立即发送
 
 
 class Settings(BaseSettings):
@@ -75,6 +126,8 @@ class Settings(BaseSettings):
     database: DatabaseConfig = DatabaseConfig()
     redis: Optional[RedisConfig] = None
     scheduler: SchedulerConfig = SchedulerConfig()
+    metric_store: MetricStoreConfig = MetricStoreConfig()
+    alert: AlertConfig = AlertConfig()
     notify: NotifyConfig = NotifyConfig()
     
     class Config:
@@ -4,7 +4,7 @@
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -32,6 +32,27 @@ else:
         echo=DEBUG if hasattr(settings.app, 'debug') else False,
     )
 
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    新建 SQLite 连接时设置 WAL、mmap 等参数（settings.database.sqlite_pragmas）
+
+    默认回滚日志模式下写事务独占库文件，采集/告警任务写入时接口读取会被阻塞；
+    WAL 模式下读写互不阻塞，busy_timeout 让并发写入等待而不是直接报 database is locked。
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in settings.database.sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+if DATABASE_TYPE == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+
 # 异步会话工厂
 async_session_factory = async_sessionmaker(
     async_engine,
@@ -79,6 +100,16 @@ async def get_db_context() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def maintain_sqlite() -> dict:
+    """SQLite 维护: 更新查询规划统计 (PRAGMA optimize) 并执行 WAL 检查点"""
+    mode = settings.database.sqlite_checkpoint_mode
+    async with async_engine.connect() as conn:
+        await conn.execute(text("PRAGMA optimize"))
+        result = await conn.execute(text(f"PRAGMA wal_checkpoint({mode})"))
+        busy, log, checkpointed = result.one()
+    return {"busy": bool(busy), "log": log, "checkpointed": checkpointed}
+
+
 def init_db():
     """初始化数据库表"""
     Base.metadata.create_all(bind=engine)
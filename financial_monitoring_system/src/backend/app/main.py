@@ -38,6 +38,23 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("✅ 数据库表创建完成")
     
+    # 预热指标内存缓存
+    if settings.metric_store.warm_on_startup:
+        from app.services.metric_store import metric_store
+        try:
+            await metric_store.warm()
+        except Exception as e:
+            logger.error(f"❌ 指标缓存预热失败: {e}")
+    
+    # 启动通知分发
+    from app.services.notify_dispatcher import notify_dispatcher
+    notify_dispatcher.start()
+    
+    # 启动事件驱动告警评估
+    if settings.scheduler.event_driven_alerts:
+        from app.services.alert_engine import realtime_evaluator
+        realtime_evaluator.start()
+    
     # 启动定时任务调度器
     start_scheduler()
     logger.info("✅ 定时任务调度器已启动")
@@ -47,7 +64,15 @@ async def lifespan(app: FastAPI):
     # 关闭时
     logger.info("🛑 正在关闭系统...")
     stop_scheduler()
+    if settings.scheduler.event_driven_alerts:
+        from app.services.alert_engine import realtime_evaluator
+        from app.services.event_bus import event_bus
+        realtime_evaluator.stop()
+        await event_bus.drain()
     logger.info("✅ 定时任务调度器已停止")
+    from app.services.notify_digest import notify_digest
+    notify_digest.flush_all()
+    await notify_dispatcher.stop()
     logger.info("👋 系统已关闭")
 
 
@@ -107,7 +107,7 @@ class AlertRule(Base):
     status = Column(String(10), default='active')  # active, inactive
     notify_channels = Column(JSON)  # 通知渠道
     notify_users = Column(JSON)  # 通知用户
-    cooldown_minutes = Column(Integer, default=10)  # 冷却时间
+    cooldown_minutes = Column(Integer, default=10)  # 冷却时间: 恢复后该时长内再次触发时重开原记录 (见 alert_state)
     enabled = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -151,6 +151,30 @@ class AlertRecord(Base):
     )
 
 
+class AlertState(Base):
+    """告警状态表 (每个 规则+指标 一行, 告警状态机的持久化)"""
+    __tablename__ = "alert_state"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    rule_id = Column(Integer, ForeignKey("alert_rule.id"), nullable=False)
+    metric_code = Column(String(50), nullable=False)
+    state = Column(String(10), nullable=False, default='inactive')  # inactive, pending, firing, resolved
+    state_since = Column(DateTime)  # 进入当前状态的时间
+    pending_since = Column(DateTime)
+    resolved_at = Column(DateTime)  # 最近一次恢复时间 (冷却期内再次触发时重开原记录)
+    last_value = Column(Float)
+    alert_record_id = Column(Integer)  # 当前关联的告警记录 (同组告警共用一条)
+    group_key = Column(String(100))
+    flapping = Column(Boolean, default=False)
+    transitions = Column(JSON)  # 抖动检测窗口内的状态切换时间
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 索引
+    __table_args__ = (
+        UniqueConstraint("rule_id", "metric_code", name="uq_alert_state_rule_metric"),
+    )
+
+
 class NotifyChannel(Base):
     """通知渠道配置表"""
     __tablename__ = "notify_channel"
@@ -9,6 +9,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db, init_db
 from app.models import SystemConfig, SystemLog, DataSource, MetricDefinition
 from app.schemas import BaseResponse
+from app.services.alert_engine import realtime_evaluator
+from app.services.alert_state import alert_states
+from app.services.metric_store import metric_store
+from app.services.notify_digest import notify_digest
+from app.services.notify_dispatcher import notify_dispatcher
 
 
 router = APIRouter()
@@ -82,6 +87,11 @@ async def get_system_stats(db: AsyncSession = Depends(get_db)):
         "metrics": {
             "total": total_metrics or 0
         },
+        "metric_store": metric_store.stats(),
+        "alert_evaluator": realtime_evaluator.stats(),
+        "alert_states": alert_states.snapshot(),
+        "notify": notify_dispatcher.snapshot(),
+        "notify_digest": notify_digest.snapshot(),
         "recent_logs": [
             {
                 "time": log.log_time.isoformat(),
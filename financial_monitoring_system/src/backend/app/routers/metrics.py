@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models import MetricDefinition, MetricData
 from app.schemas import MetricDataResponse, MetricDataPoint, BaseResponse
+from app.services.metric_store import metric_store
 
 
 router = APIRouter()
@@ -117,26 +118,20 @@ async def get_realtime_metrics(
     metric_codes: List[str] = Query(..., description="指标编码列表"),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取实时指标最新值"""
-    latest_data = []
-    
-    for code in metric_codes:
-        # 获取每个指标的最新数据
-        result = await db.execute(
-            select(MetricData)
-            .where(MetricData.metric_code == code)
-            .order_by(MetricData.data_time.desc())
-            .limit(1)
-        )
-        data = result.scalar_one_or_none()
-        
-        if data:
-            latest_data.append({
-                "metric_code": code,
-                "timestamp": data.data_time.isoformat(),
-                "value": data.value,
-                "status": data.status
-            })
+    """获取实时指标最新值 (读取指标内存缓存, 仅缓存中没有的指标回源)"""
+    await metric_store.ensure(db, metric_codes)
+    points = metric_store.latest_many(metric_codes)
+    
+    latest_data = [
+        {
+            "metric_code": code,
+            "timestamp": points[code].data_time.isoformat(),
+            "value": points[code].value,
+            "status": points[code].status
+        }
+        for code in metric_codes
+        if code in points
+    ]
     
     return {"metrics": latest_data}
 
@@ -3,7 +3,8 @@
 """
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, func
+from pydantic import BaseModel
+from sqlalchemy import select, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
@@ -12,6 +13,7 @@ from app.schemas import (
     NotifyChannelCreate, NotifyChannelUpdate, 
     NotifyChannelResponse
 )
+from app.services.notify_dispatcher import notify_dispatcher
 
 
 router = APIRouter()
@@ -135,8 +137,20 @@ async def test_channel(
     if not channel:
         raise HTTPException(status_code=404, detail="渠道不存在")
     
-    # TODO: 实际发送测试消息
-    # 根据channel_type调用不同的发送方法
+    # 直接发送一次 (不经队列、不重试), 以便返回实际结果
+    try:
+        # 与分发器共用同一通知服务 (连接池随分发器停止而关闭)
+        await notify_dispatcher.service.deliver(
+            channel.channel_type,
+            channel.config,
+            "测试消息",
+            f"这是一条来自金融风控监控系统的测试消息 ({channel.name})",
+        )
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"测试消息发送失败: {e}"
+        }
     
     return {
         "success": True,
@@ -222,11 +236,14 @@ async def send_notification(
     if not channel:
         raise HTTPException(status_code=404, detail="通知渠道不存在或已禁用")
     
-    # TODO: 根据channel_type调用不同的发送方法
-    # 这里应该调用通知服务发送消息
+    queued = await notify_dispatcher.service.send(
+        channel.channel_type, channel.config, request.title, request.content, request.level
+    )
+    if not queued:
+        raise HTTPException(status_code=503, detail="通知队列已满, 请稍后重试")
     
     return {
         "success": True,
-        "message": "通知发送成功",
+        "message": "通知已提交发送",
         "channel": channel.name
     }
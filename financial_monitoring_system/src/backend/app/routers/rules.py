@@ -9,11 +9,38 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models import AlertRule, MetricDefinition
 from app.schemas import AlertRuleCreate, AlertRuleUpdate, AlertRuleResponse
+from app.services.alert_engine import evaluation_lock, rule_index
+from app.services.alert_state import alert_states
+from app.services.rule_compiler import RuleSyntaxError, compile_condition, rule_cache
+from app.services.window_conditions import WINDOW_CONDITIONS, WindowConfigError, validate_window
 
 
 router = APIRouter()
 
 
+async def retire_states(db: AsyncSession, rule_id: int, keep_metric: str = None):
+    """移除规则的告警状态 (keep_metric 对应的除外) 并提交, 关联的告警记录按组内情况恢复"""
+    async with evaluation_lock:
+        try:
+            await alert_states.retire(db, alert_states.rule_keys(rule_id, keep_metric))
+            await db.commit()
+        except Exception:
+            alert_states.discard()
+            raise
+        alert_states.release(db)
+
+
+def validate_condition(condition_type: str, condition_config: dict, metric_code: str):
+    """保存前编译一次条件配置, 不合法时返回 400"""
+    try:
+        if condition_type in WINDOW_CONDITIONS:
+            validate_window(condition_type, condition_config)
+        else:
+            compile_condition(condition_type, condition_config, metric_code)
+    except (RuleSyntaxError, WindowConfigError) as e:
+        raise HTTPException(status_code=400, detail=f"条件配置错误: {e}")
+
+
 @router.get("/")
 async def list_rules(
     metric_code: Optional[str] = None,
@@ -94,6 +121,8 @@ async def create_rule(
     if existing:
         raise HTTPException(status_code=400, detail="规则编码已存在")
     
+    validate_condition(request.condition_type, request.condition_config, request.metric_code)
+    
     rule = AlertRule(
         code=request.code,
         name=request.name,
@@ -112,6 +141,7 @@ async def create_rule(
     db.add(rule)
     await db.commit()
     await db.refresh(rule)
+    rule_index.invalidate()
     
     return rule
 
@@ -133,11 +163,21 @@ async def update_rule(
     
     # 更新字段
     update_data = request.model_dump(exclude_unset=True)
+    if "condition_type" in update_data or "condition_config" in update_data:
+        validate_condition(
+            update_data.get("condition_type", rule.condition_type),
+            update_data.get("condition_config", rule.condition_config),
+            rule.metric_code,
+        )
     for key, value in update_data.items():
         setattr(rule, key, value)
     
     await db.commit()
     await db.refresh(rule)
+    # 禁用或更换指标后原状态不再参与评估
+    await retire_states(db, rule_id, rule.metric_code if rule.enabled else None)
+    rule_cache.invalidate(rule_id)
+    rule_index.invalidate()
     
     return rule
 
@@ -153,8 +193,11 @@ async def delete_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
     if not rule:
         raise HTTPException(status_code=404, detail="规则不存在")
     
+    await retire_states(db, rule_id)
     await db.delete(rule)
     await db.commit()
+    rule_cache.invalidate(rule_id)
+    rule_index.invalidate()
     
     return {"message": "规则已删除"}
 
@@ -176,6 +219,9 @@ async def toggle_rule(
     
     rule.enabled = enabled
     await db.commit()
+    if not enabled:
+        await retire_states(db, rule_id)
+    rule_index.invalidate()
     
     return {"message": f"规则已{'启用' if enabled else '禁用'}"}
 
@@ -221,8 +267,9 @@ async def get_rule_templates():
                 "description": "当指标变化率超过阈值时触发",
                 "condition_type": "change_rate",
                 "condition_config": {
-                    "period": "1h",
-                    "threshold": 0.1
+                    "periods": 12,
+                    "threshold": 10,
+                    "direction": "both"
                 }
             },
             {
@@ -232,8 +279,16 @@ async def get_rule_templates():
                 "condition_type": "trend",
                 "condition_config": {
                     "direction": "up",
-                    "consecutive": 3,
-                    "threshold": 0.05
+                    "consecutive": 3
+                }
+            },
+            {
+                "code": "combine",
+                "name": "组合条件告警",
+                "description": "多个条件组合, 支持 AND/OR/NOT、跨指标比较与窗口函数",
+                "condition_type": "combine",
+                "condition_config": {
+                    "expression": "value > 100 AND (change_rate(5) > 10 OR metric('NAV_DIFF') < 0.5)"
                 }
             }
         ]
@@ -8,7 +8,9 @@ from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from loguru import logger
 
-from app.config import SCHEDULER_CHECK_INTERVAL, SCHEDULER_SYNC_INTERVAL
+from app.config import (
+    SCHEDULER_CHECK_INTERVAL, SCHEDULER_SYNC_INTERVAL, DATABASE_TYPE, settings,
+)
 
 
 # 全局调度器实例
@@ -53,6 +55,16 @@ def start_scheduler():
         replace_existing=True
     )
     
+    # 添加 SQLite 维护任务 (默认每小时)
+    if DATABASE_TYPE == "sqlite":
+        scheduler.add_job(
+            sqlite_maintenance_task,
+            IntervalTrigger(seconds=settings.database.sqlite_maintenance_interval),
+            id="sqlite_maintenance",
+            name="SQLite维护",
+            replace_existing=True
+        )
+    
     scheduler.start()
     logger.info("✅ 定时任务调度器已启动")
 
@@ -112,6 +124,20 @@ async def health_check_task():
         logger.error(f"❌ 系统健康检查失败: {e}")
 
 
+async def sqlite_maintenance_task():
+    """SQLite 维护任务"""
+    logger.info("🗄️ 执行SQLite维护...")
+    try:
+        from app.database import maintain_sqlite
+        result = await maintain_sqlite()
+        if result["busy"]:
+            logger.warning(f"⚠️ WAL检查点未完成，存在长时间运行的读事务: {result}")
+        else:
+            logger.info(f"✅ SQLite维护完成: {result}")
+    except Exception as e:
+        logger.error(f"❌ SQLite维护失败: {e}")
+
+
 # 手动触发任务的接口
 async def trigger_data_collection():
     """手动触发数据采集"""
@@ -163,7 +163,7 @@ class AlertRuleCreate(BaseModel):
     severity: str
     notify_channels: List[str]
     notify_users: Optional[List[str]] = None
-    cooldown_minutes: int = 10
+    cooldown_minutes: int = Field(default=10, ge=0, description="恢复后该时长内再次触发时重新激活原告警记录 (仍会通知), 超过后新建记录; 持续告警期间不重复通知")
 
 
 class AlertRuleUpdate(BaseModel):
@@ -176,7 +176,7 @@ class AlertRuleUpdate(BaseModel):
     status: Optional[str] = None
     notify_channels: Optional[List[str]] = None
     notify_users: Optional[List[str]] = None
-    cooldown_minutes: Optional[int] = None
+    cooldown_minutes: Optional[int] = Field(default=None, ge=0, description="恢复后该时长内再次触发时重新激活原告警记录 (仍会通知), 超过后新建记录; 持续告警期间不重复通知")
     enabled: Optional[bool] = None
 
 
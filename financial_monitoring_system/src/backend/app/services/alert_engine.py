@@ -1,19 +1,51 @@
 """
 告警引擎服务
+
+两条评估路径共用 AlertEngine.process_rules:
+    事件驱动: DataCollector 写入后发布 metrics.updated, RealtimeEvaluator 经 RuleIndex
+              找到引用这些指标的规则立即评估, 告警延迟取决于采集而不是检查周期
+    定时全量: alert_check_task 按 SCHEDULER_CHECK_INTERVAL 评估全部规则, 作为兜底
 """
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import asyncio
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Any
+
+import numpy as np
 from loguru import logger
 
+from app.config import settings
 from app.database import get_db_context
-from app.models import AlertRule, AlertRecord, MetricData
+from app.models import AlertRule, AlertRecord, NotifyChannel
+from app.services.alert_state import alert_states
+from app.services.event_bus import METRICS_UPDATED, MetricsUpdated, event_bus
+from app.services.metric_store import MetricPoint, metric_store
+from app.services.notify_digest import notify_digest
+from app.services.rule_compiler import (
+    EvalContext, RuleSyntaxError, compile_condition, rule_cache,
+)
+from app.services.window_conditions import (
+    WINDOW_CONDITIONS, WindowConfigError, evaluate_window, evaluate_windows, rule_windows,
+)
+
+# 事件驱动评估与定时全量检查互斥, 避免同一规则在两条路径上重复告警
+evaluation_lock = asyncio.Lock()
+
+# 告警级别 -> 通知消息级别
+SEVERITY_LEVELS = {"P1": "error", "P2": "error", "P3": "warning", "P4": "info"}
 
 
 class AlertEngine:
     """告警引擎"""
     
     async def check_all_rules(self):
-        """检查所有规则"""
+        """
+        检查所有规则
+
+        批量评估: 指标最新值与窗口取自内存缓存 (缺失部分一次性回源),
+        规则在内存中判断, 查询次数不随规则数量增长
+        """
         async with get_db_context() as db:
             from sqlalchemy import select
             
@@ -22,125 +54,153 @@ class AlertEngine:
                 select(AlertRule).where(AlertRule.enabled == True)
             )
             rules = result.scalars().all()
+            rule_index.rebuild(rules)
             
-            for rule in rules:
+            async with evaluation_lock:
+                # 清理已停用规则及长时间无数据的告警状态
                 try:
-                    await self.check_rule(db, rule)
-                except Exception as e:
-                    logger.error(f"检查规则 {rule.code} 失败: {e}")
-            
-            await db.commit()
+                    await alert_states.prune(db, rules)
+                    await db.commit()
+                except Exception:
+                    alert_states.discard()
+                    raise
+                alert_states.release(db)
+                if not rules:
+                    return
+                triggered_count = await self.process_rules(db, rules)
+            logger.info(f"规则检查完成: {len(rules)} 条规则, 触发 {triggered_count} 条")
     
-    async def check_rule(self, db, rule: AlertRule):
-        """检查单个规则"""
-        # 获取指标最新值
-        metric_code = rule.metric_code
-        latest_data = await self.get_latest_value(db, metric_code)
+    async def process_rules(self, db, rules: List[AlertRule]) -> int:
+        """
+        评估一批规则并推进告警状态机 (见 app.services.alert_state)
+
+        只有状态切换才写库; 新建或重开告警记录时发送通知, 返回通知数
+        """
+        results = await self.evaluate_rules(db, rules)
+        try:
+            notifications = await alert_states.apply(db, self, rules, results)
+            await db.commit()
+        except Exception:
+            alert_states.discard()
+            raise
+        alert_states.release(db)
         
-        if not latest_data:
-            logger.debug(f"指标 {metric_code} 无数据, 跳过检查")
-            return
+        for rule, value, threshold in notifications:
+            try:
+                await self.send_notification(db, rule, value, threshold)
+            except Exception as e:
+                logger.error(f"规则 {rule.code} 通知发送失败: {e}")
+        return len(notifications)
+    
+    async def evaluate_rules(self, db, rules: List[AlertRule]) -> Dict[int, tuple]:
+        """
+        批量评估规则, 返回 {rule.id: (是否触发, 当前值, 阈值)}
+
+        threshold / range / combine 使用编译缓存中的判断函数, 同一轮共用一个求值上下文;
+        change_rate / trend 按窗口长度分组向量化计算。指标无数据或编译失败的规则不在结果中
+        """
+        compiled = {}
+        for rule in rules:
+            if rule.condition_type in WINDOW_CONDITIONS:
+                continue
+            try:
+                compiled[rule.id] = rule_cache.get(rule)
+            except RuleSyntaxError as e:
+                logger.error(f"规则 {rule.code} 条件编译失败: {e}")
         
-        value = latest_data.value
-        condition_config = rule.condition_config
+        # 最新值: 各规则自身指标及组合条件引用的指标
+        metric_codes = {rule.metric_code for rule in rules}
+        window_codes, combine_window = set(), 0
+        for item in compiled.values():
+            metric_codes |= item.metrics
+            if item.window:
+                window_codes |= item.window_metrics
+                combine_window = max(combine_window, item.window)
+        latest_values = await self.get_latest_values(db, metric_codes)
+        if window_codes:
+            await metric_store.ensure(db, window_codes, n=combine_window)
         
-        # 检查是否触发告警
-        triggered, threshold = self.evaluate_condition(
-            value, 
-            rule.condition_type, 
-            condition_config
-        )
+        window_rules, longest = rule_windows(rules)
+        window_results = {}
+        if window_rules:
+            windows = await self.get_windows(
+                db, {rule.metric_code for rule in window_rules}, longest
+            )
+            window_results = evaluate_windows(window_rules, windows)
         
-        if triggered:
-            # 检查冷却时间
-            if await self.is_in_cooldown(db, rule, metric_code):
-                logger.debug(f"规则 {rule.code} 在冷却期内, 跳过")
-                return
-            
-            # 创建告警记录
-            await self.create_alert(db, rule, value, threshold)
-            
-            # 发送通知
-            await self.send_notification(db, rule, value, threshold)
+        ctx = EvalContext()
+        results = {}
+        for rule in rules:
+            latest_data = latest_values.get(rule.metric_code)
+            if latest_data is None:
+                logger.debug(f"指标 {rule.metric_code} 无数据, 跳过检查")
+                continue
+            try:
+                if rule.id in window_results:
+                    triggered, threshold = window_results[rule.id]
+                elif rule.id in compiled:
+                    triggered, threshold = compiled[rule.id].evaluate(
+                        ctx.bind(rule.metric_code, latest_data.value)
+                    )
+                else:
+                    continue
+            except Exception as e:
+                logger.error(f"检查规则 {rule.code} 失败: {e}")
+                continue
+            results[rule.id] = (triggered, latest_data.value, threshold)
+        return results
     
-    async def get_latest_value(self, db, metric_code: str) -> MetricData:
-        """获取指标最新值"""
-        from sqlalchemy import select
-        
-        result = await db.execute(
-            select(MetricData)
-            .where(MetricData.metric_code == metric_code)
-            .order_by(MetricData.data_time.desc())
-            .limit(1)
-        )
-        return result.scalar_one_or_none()
+    async def get_latest_values(self, db, metric_codes) -> Dict[str, MetricPoint]:
+        """
+        批量获取指标最新值, 返回 {metric_code: MetricPoint}
+
+        从指标内存缓存读取, 仅缓存中没有的指标回源 (一次窗口函数查询)
+        """
+        metric_codes = list(metric_codes)
+        await metric_store.ensure(db, metric_codes)
+        return metric_store.latest_many(metric_codes)
+    
+    async def get_windows(self, db, metric_codes, n: int) -> Dict[str, np.ndarray]:
+        """批量获取指标最近 n 个点的数值 (时间升序), 缓存中历史不足的指标一次性回源"""
+        metric_codes = list(metric_codes)
+        await metric_store.ensure(db, metric_codes, n=n)
+        windows = {}
+        for code in metric_codes:
+            window = metric_store.window(code, n=n)
+            if window is not None:
+                windows[code] = window[1]
+        return windows
+    
+    async def check_rule(self, db, rule: AlertRule):
+        """检查单个规则"""
+        async with evaluation_lock:
+            return await self.process_rules(db, [rule])
     
     def evaluate_condition(
         self, 
         value: float, 
         condition_type: str, 
-        config: Dict
+        config: Dict,
+        window=None,
+        metric_code: str = None,
     ) -> (bool, float):
-        """评估条件"""
-        if condition_type == "threshold":
-            # 阈值告警
-            operator = config.get("operator", ">")
-            threshold = config.get("threshold", 0)
-            
-            if operator == ">":
-                return value > threshold, threshold
-            elif operator == ">=":
-                return value >= threshold, threshold
-            elif operator == "<":
-                return value < threshold, threshold
-            elif operator == "<=":
-                return value <= threshold, threshold
-            elif operator == "==":
-                return value == threshold, threshold
-        
-        elif condition_type == "range":
-            # 范围告警
-            min_val = config.get("min", float("-inf"))
-            max_val = config.get("max", float("inf"))
-            
-            out_of_range = value < min_val or value > max_val
-            return out_of_range, f"{min_val}-{max_val}"
-        
-        elif condition_type == "change_rate":
-            # 变化率告警
-            threshold = config.get("threshold", 0)
-            # TODO: 计算变化率并比较
-        
-        elif condition_type == "trend":
-            # 趋势告警
-            direction = config.get("direction", "up")
-            consecutive = config.get("consecutive", 3)
-            # TODO: 分析趋势
-        
-        return False, None
-    
-    async def is_in_cooldown(self, db, rule: AlertRule, metric_code: str) -> bool:
-        """检查是否在冷却期内"""
-        from sqlalchemy import select, and_
-        
-        # 获取该指标最近的告警
-        cooldown_minutes = rule.cooldown_minutes
-        threshold = datetime.utcnow() - timedelta(minutes=cooldown_minutes)
-        
-        result = await db.execute(
-            select(AlertRecord)
-            .where(
-                and_(
-                    AlertRecord.metric_code == metric_code,
-                    AlertRecord.rule_id == rule.id,
-                    AlertRecord.alert_time >= threshold,
-                    AlertRecord.status == "active"
-                )
-            )
-        )
-        
-        recent_alert = result.scalar_one_or_none()
-        return recent_alert is not None
+        """
+        评估单个条件 (不经编译缓存)
+
+        change_rate / trend 需要传入最近若干个点的数值 window;
+        combine 中引用的其他指标与窗口从指标内存缓存读取, 省略指标编码的窗口函数
+        以 metric_code 为本规则指标
+        """
+        if condition_type in WINDOW_CONDITIONS:
+            try:
+                return evaluate_window(condition_type, config, window)
+            except WindowConfigError:
+                return False, None
+        try:
+            compiled = compile_condition(condition_type, config, metric_code)
+        except RuleSyntaxError:
+            return False, None
+        return compiled.evaluate(EvalContext().bind(metric_code, value))
     
     async def create_alert(
         self, 
@@ -159,7 +219,7 @@ class AlertEngine:
             metric_code=rule.metric_code,
             alert_time=datetime.utcnow(),
             alert_value=value,
-            threshold_value=float(threshold) if threshold else None,
+            threshold_value=float(threshold) if isinstance(threshold, (int, float)) else None,
             severity=rule.severity,
             message=message,
             status="active",
@@ -168,6 +228,7 @@ class AlertEngine:
         
         db.add(alert)
         logger.info(f"🔔 告警已创建: {rule.name} - {message}")
+        return alert
     
     def generate_alert_message(
         self, 
@@ -204,11 +265,159 @@ class AlertEngine:
         value: float, 
         threshold: Any
     ):
-        """发送告警通知"""
-        # TODO: 实现通知发送
-        # 根据notify_channels调用不同的通知服务
+        """发送告警通知 (经告警汇总交给通知分发器排队, 不等待发送结果)"""
+        from sqlalchemy import select, or_
         
         message = self.generate_alert_message(rule, value, threshold)
-        channels = rule.notify_channels or []
+        names = rule.notify_channels or settings.notify.default_channels
+        
+        # notify_channels 中可以是渠道编码, 也可以是渠道类型 (该类型下所有启用的渠道)
+        result = await db.execute(
+            select(NotifyChannel).where(
+                NotifyChannel.status == "active",
+                or_(NotifyChannel.code.in_(names), NotifyChannel.channel_type.in_(names)),
+            )
+        )
+        channels = result.scalars().all()
+        if not channels:
+            logger.warning(f"规则 {rule.code} 没有可用的通知渠道: {names}")
+            return
         
-        logger.info(f"📨 准备发送通知到 {channels}: {message[:100]}...")
+        title = message.split("\n", 1)[0]
+        level = SEVERITY_LEVELS.get(rule.severity, "info")
+        for channel in channels:
+            notify_digest.add(channel.channel_type, channel.config, title, message, level, rule.severity)
+        logger.info(f"📨 告警通知已入队: {rule.code} -> {[channel.code for channel in channels]}")
+
+
+class RuleIndex:
+    """
+    指标 -> 规则索引
+
+    组合条件按其引用的全部指标登记。定时全量检查时重建; 规则经 rules 路由变更后标记失效,
+    下次事件到来时重新加载
+    """
+    
+    def __init__(self):
+        self._by_metric: Dict[str, List[AlertRule]] = defaultdict(list)
+        self.stale = True
+    
+    def rebuild(self, rules: Iterable[AlertRule]):
+        by_metric = defaultdict(list)
+        for rule in rules:
+            codes = {rule.metric_code}
+            if rule.condition_type not in WINDOW_CONDITIONS:
+                try:
+                    compiled = rule_cache.get(rule)
+                    codes |= compiled.metrics | compiled.window_metrics
+                except RuleSyntaxError:
+                    pass
+            for code in codes:
+                by_metric[code].append(rule)
+        self._by_metric = by_metric
+        self.stale = False
+    
+    async def ensure(self, db):
+        """索引失效时从数据库重新加载启用的规则"""
+        if not self.stale:
+            return
+        from sqlalchemy import select
+        
+        result = await db.execute(
+            select(AlertRule).where(AlertRule.enabled == True)
+        )
+        self.rebuild(result.scalars().all())
+    
+    def invalidate(self):
+        self.stale = True
+    
+    def rules_for(self, metric_codes: Iterable[str]) -> List[AlertRule]:
+        """引用了这些指标的规则 (去重)"""
+        rules = {}
+        for code in metric_codes:
+            for rule in self._by_metric.get(code, ()):
+                rules[rule.id] = rule
+        return list(rules.values())
+
+
+class RealtimeEvaluator:
+    """
+    事件驱动评估: 订阅 metrics.updated, 只评估受影响的规则
+
+    评估进行中到达的事件合并到下一批, 同一时刻只有一个评估任务;
+    记录从数据写入 (事件发布) 到告警落库的延迟
+    """
+    
+    def __init__(self, engine: AlertEngine = None, samples: int = 1000):
+        self.engine = engine or AlertEngine()
+        self._pending: Dict[str, float] = {}  # metric_code -> 最早发布时刻
+        self._worker: asyncio.Task = None
+        self._latencies = deque(maxlen=samples)
+        self.events = 0
+        self.evaluations = 0
+        self.rules_evaluated = 0
+        self.alerts = 0
+    
+    def start(self):
+        event_bus.subscribe(METRICS_UPDATED, self.on_metrics_updated)
+        logger.info("✅ 事件驱动告警评估已启动")
+    
+    def stop(self):
+        event_bus.unsubscribe(METRICS_UPDATED, self.on_metrics_updated)
+    
+    async def on_metrics_updated(self, event: MetricsUpdated):
+        self.events += 1
+        for code in event.metric_codes:
+            self._pending[code] = min(self._pending.get(code, event.published_at), event.published_at)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            # 由启动评估的事件处理任务等待本批完成, 便于 event_bus.drain 收尾
+            await asyncio.shield(self._worker)
+    
+    async def _run(self):
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await self.evaluate(batch.keys(), min(batch.values()))
+            except Exception as e:
+                logger.error(f"❌ 事件驱动告警评估失败: {e}")
+    
+    async def evaluate(self, metric_codes: Iterable[str], published_at: float = None) -> int:
+        """评估引用了这些指标的规则, 返回创建的告警数"""
+        async with get_db_context() as db:
+            await rule_index.ensure(db)
+            rules = rule_index.rules_for(metric_codes)
+            if not rules:
+                return 0
+            async with evaluation_lock:
+                created = await self.engine.process_rules(db, rules)
+        
+        self.evaluations += 1
+        self.rules_evaluated += len(rules)
+        self.alerts += created
+        if published_at is not None:
+            latency = time.monotonic() - published_at
+            self._latencies.append(latency)
+            if created:
+                logger.info(f"🔔 事件触发评估: {len(rules)} 条规则, 触发 {created} 条, 写入到告警 {latency * 1000:.1f}ms")
+        return created
+    
+    def stats(self) -> Dict:
+        latencies = np.array(self._latencies) * 1000 if self._latencies else None
+        return {
+            "events": self.events,
+            "evaluations": self.evaluations,
+            "rules_evaluated": self.rules_evaluated,
+            "alerts": self.alerts,
+            "latency_ms": {
+                "samples": len(self._latencies),
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+                "max": round(float(latencies.max()), 2),
+            } if latencies is not None else None,
+        }
+
+
+# 全局实例
+rule_index = RuleIndex()
+realtime_evaluator = RealtimeEvaluator()
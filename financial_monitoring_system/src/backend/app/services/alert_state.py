@@ -0,0 +1,362 @@
+"""
+告警状态机
+
+每个 (规则, 指标) 一个状态, 只在状态切换时写库并通知:
+
+    inactive/resolved --条件满足--> pending --持续 for_seconds--> firing --恢复--> resolved
+
+    for_seconds       条件需持续满足的时长, 0 表示立即进入 firing
+    clear_threshold   阈值规则的恢复阈值 (滞回), 如 "> 100" 告警、"<= 95" 才恢复;
+                      未配置时条件不再满足即恢复
+    抖动抑制          flap_window_minutes 内 firing/resolved 切换次数达到 flap_threshold 时
+                      进入抖动状态, 期间不再新建/恢复告警记录, 切换次数回落到一半以下后按当前状态补齐
+    分组              同一 group_key (默认同一指标, 可在 condition_config.group 中指定) 的规则同时触发时
+                      共用一条告警记录, 后加入的规则追加到记录消息中, 组内全部恢复后记录才恢复
+    重开              恢复后 cooldown_minutes 内再次触发时重新激活原记录而不是新建 (仍发送通知);
+                      cooldown_minutes 不再在告警后抑制新告警, 持续满足条件期间本来就只通知一次
+    清理              规则被禁用 / 删除 / 更换指标后其状态移除, 关联记录按组内情况恢复;
+                      启用的规则超过 stale_minutes 未得到评估结果 (指标无数据) 时视为恢复
+
+以上参数默认取 settings.alert, 规则的 condition_config 中同名字段可覆盖。
+状态保存在 alert_state 表, 首次评估时加载, 重启后延续。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.models import AlertRecord, AlertRule, AlertState
+from app.services.rule_compiler import OPERATORS
+
+
+class AlertStateManager:
+    """告警状态机 (进程内, 持久化到 alert_state)"""
+
+    def __init__(self):
+        self._states: Dict[Tuple[int, str], AlertState] = {}
+        self._group_records: Dict[str, int] = {}  # group_key -> 组内未恢复的告警记录 id
+        self._changed: Dict[Tuple[int, str], AlertState] = {}
+        self._seen: Dict[Tuple[int, str], datetime] = {}  # 最近一次得到评估结果的时间
+        self._loaded_at: datetime = None
+        self.loaded = False
+        self.stats = {
+            "transitions": 0,
+            "records_created": 0,
+            "records_grouped": 0,
+            "records_reopened": 0,
+            "records_resolved": 0,
+            "suppressed": 0,
+        }
+
+    async def load(self, db):
+        """从 alert_state 加载状态 (首次评估时)"""
+        if self.loaded:
+            return
+        from sqlalchemy import select
+
+        result = await db.execute(select(AlertState))
+        for state in result.scalars().all():
+            self._states[(state.rule_id, state.metric_code)] = state
+            if state.state == "firing" and state.alert_record_id and not state.flapping:
+                self._group_records[state.group_key] = state.alert_record_id
+        self._loaded_at = datetime.utcnow()
+        self.loaded = True
+        logger.info(f"✅ 告警状态已加载: {len(self._states)} 条")
+
+    def _option(self, rule: AlertRule, name: str):
+        return (rule.condition_config or {}).get(name, getattr(settings.alert, name))
+
+    def _state(self, rule: AlertRule) -> AlertState:
+        key = (rule.id, rule.metric_code)
+        state = self._states.get(key)
+        if state is None:
+            state = AlertState(
+                rule_id=rule.id,
+                metric_code=rule.metric_code,
+                state="inactive",
+                flapping=False,
+                transitions=[],
+            )
+            self._states[key] = state
+        state.group_key = (rule.condition_config or {}).get("group") or f"metric:{rule.metric_code}"
+        return state
+
+    def is_cleared(self, rule: AlertRule, triggered: bool, value: float) -> bool:
+        """firing 状态是否恢复 (阈值规则支持恢复阈值)"""
+        config = rule.condition_config or {}
+        if rule.condition_type == "threshold" and config.get("clear_threshold") is not None:
+            compare = OPERATORS.get(config.get("operator", ">"))
+            if compare is not None:
+                return not compare(value, config["clear_threshold"])
+        return not triggered
+
+    def _transition(self, state: AlertState, new_state: str, now: datetime, value: float):
+        state.state = new_state
+        state.state_since = now
+        state.last_value = value
+        if new_state == "pending":
+            state.pending_since = now
+        elif new_state == "resolved":
+            state.resolved_at = now
+        self._changed[(state.rule_id, state.metric_code)] = state
+        self.stats["transitions"] += 1
+
+    def _track_flapping(self, rule: AlertRule, state: AlertState, now: datetime, changed: bool) -> str:
+        """
+        更新抖动检测窗口, 返回 "enter" / "exit" / None
+
+        只统计 firing 与 resolved 之间的切换
+        """
+        window = timedelta(minutes=self._option(rule, "flap_window_minutes"))
+        threshold = self._option(rule, "flap_threshold")
+        since = (now - window).isoformat()
+        transitions = [t for t in (state.transitions or []) if t >= since]
+        if changed:
+            transitions.append(now.isoformat())
+        if transitions != (state.transitions or []):
+            state.transitions = transitions
+            self._changed[(state.rule_id, state.metric_code)] = state
+
+        if not threshold:
+            return None
+        if not state.flapping and len(transitions) >= threshold:
+            state.flapping = True
+            return "enter"
+        if state.flapping and len(transitions) < max(threshold // 2, 1):
+            state.flapping = False
+            return "exit"
+        return None
+
+    async def apply(self, db, engine, rules: List[AlertRule], results: Dict[int, tuple], now: datetime = None) -> List[tuple]:
+        """
+        按评估结果推进状态机, 新建 / 合并 / 重开 / 恢复告警记录 (不提交)
+
+        results: AlertEngine.evaluate_rules 的结果 {rule.id: (是否触发, 当前值, 阈值)}
+        返回需要发送通知的 [(rule, value, threshold)]
+        """
+        from sqlalchemy import update
+
+        await self.load(db)
+        now = now or datetime.utcnow()
+        firing, resolved = [], []
+
+        for rule in rules:
+            if rule.id not in results:
+                continue
+            triggered, value, threshold = results[rule.id]
+            state = self._state(rule)
+            self._seen[(rule.id, rule.metric_code)] = now
+            before = state.state
+
+            if before in ("inactive", "resolved"):
+                if triggered:
+                    for_seconds = self._option(rule, "for_seconds")
+                    self._transition(state, "pending" if for_seconds else "firing", now, value)
+            elif before == "pending":
+                if not triggered:
+                    self._transition(state, "inactive", now, value)
+                elif now - state.pending_since >= timedelta(seconds=self._option(rule, "for_seconds")):
+                    self._transition(state, "firing", now, value)
+            elif before == "firing":
+                if self.is_cleared(rule, triggered, value):
+                    self._transition(state, "resolved", now, value)
+
+            became_firing = state.state == "firing" and before != "firing"
+            became_resolved = state.state == "resolved" and before == "firing"
+            flapping = self._track_flapping(rule, state, now, became_firing or became_resolved)
+
+            if flapping == "enter":
+                logger.warning(f"⚠️ 规则 {rule.code} 状态频繁切换, 暂停新建/恢复告警")
+            elif flapping == "exit":
+                # 抖动结束, 按当前状态补齐告警记录
+                logger.info(f"规则 {rule.code} 状态恢复稳定")
+                if state.state == "firing":
+                    firing.append((rule, state, value, threshold, True))
+                elif state.alert_record_id:
+                    resolved.append(state)
+                continue
+
+            if state.flapping:
+                if became_firing or became_resolved:
+                    self.stats["suppressed"] += 1
+                continue
+            if became_firing:
+                firing.append((rule, state, value, threshold, False))
+            elif became_resolved:
+                resolved.append(state)
+
+        notifications = []
+        created: List[Tuple[AlertState, AlertRecord]] = []
+        batch_groups: Dict[str, AlertRecord] = {}
+        for rule, state, value, threshold, reconcile in firing:
+            cooldown = timedelta(minutes=rule.cooldown_minutes or 0)
+            record_id = self._group_records.get(state.group_key)
+            recently_resolved = state.resolved_at is not None and now - state.resolved_at < cooldown
+
+            if state.alert_record_id and (reconcile or recently_resolved) \
+                    and record_id in (None, state.alert_record_id):
+                # 恢复后冷却期内再次触发 (或抖动结束), 重新激活原记录
+                await db.execute(
+                    update(AlertRecord)
+                    .where(AlertRecord.id == state.alert_record_id)
+                    .values(status="active", resolved_at=None, resolved_by=None, alert_value=value)
+                )
+                self._group_records[state.group_key] = state.alert_record_id
+                self.stats["records_reopened"] += 1
+                notifications.append((rule, value, threshold))
+            elif record_id is not None or state.group_key in batch_groups:
+                # 同组已有未恢复的告警, 合并到该记录
+                line = f"\n关联: {rule.name} ({rule.metric_code}) 当前值 {value:.4f}"
+                if record_id is not None and state.alert_record_id == record_id:
+                    # 已在该组内 (组内其他规则持续告警期间重新触发)
+                    pass
+                elif record_id is not None:
+                    state.alert_record_id = record_id
+                    await db.execute(
+                        update(AlertRecord)
+                        .where(AlertRecord.id == record_id)
+                        .values(message=AlertRecord.message + line)
+                    )
+                else:
+                    record = batch_groups[state.group_key]
+                    record.message += line
+                    created.append((state, record))
+                self.stats["records_grouped"] += 1
+            else:
+                record = await engine.create_alert(db, rule, value, threshold)
+                batch_groups[state.group_key] = record
+                created.append((state, record))
+                self.stats["records_created"] += 1
+                notifications.append((rule, value, threshold))
+
+        if created:
+            await db.flush()
+            for state, record in created:
+                state.alert_record_id = record.id
+                self._group_records[state.group_key] = record.id
+
+        for state in resolved:
+            await self._resolve_record(db, state, now, "指标已恢复正常")
+
+        db.add_all(self._changed.values())
+        return notifications
+
+    async def _resolve_record(self, db, state: AlertState, now: datetime, message: str) -> bool:
+        """恢复状态关联的告警记录; 同组仍有 firing 的规则时保留记录, 返回是否已恢复"""
+        from sqlalchemy import update
+
+        record_id = state.alert_record_id
+        if not record_id:
+            return False
+        others = any(
+            other.alert_record_id == record_id and other.state == "firing"
+            for other in self._states.values() if other is not state
+        )
+        if others:
+            return False
+        await db.execute(
+            update(AlertRecord)
+            .where(AlertRecord.id == record_id, AlertRecord.status.in_(["active", "acknowledged"]))
+            .values(status="resolved", resolved_at=now, resolved_by="system", resolved_message=message)
+        )
+        if self._group_records.get(state.group_key) == record_id:
+            del self._group_records[state.group_key]
+        self.stats["records_resolved"] += 1
+        return True
+
+    async def retire(self, db, keys: Iterable[Tuple[int, str]], now: datetime = None,
+                     message: str = "告警规则已停用") -> int:
+        """
+        移除 (规则, 指标) 的状态 (规则被禁用 / 删除 / 更换指标时调用, 不提交)
+
+        firing 状态关联的告警记录在组内没有其他 firing 规则时恢复; 返回移除的状态数
+        """
+        from sqlalchemy import delete
+
+        await self.load(db)
+        now = now or datetime.utcnow()
+        retired = 0
+        for key in list(keys):
+            state = self._states.get(key)
+            if state is None:
+                continue
+            if state.state == "firing":
+                # 先退出 firing, 不再阻止同组记录恢复
+                state.state = "resolved"
+                await self._resolve_record(db, state, now, message)
+            del self._states[key]
+            self._changed.pop(key, None)
+            self._seen.pop(key, None)
+            await db.execute(
+                delete(AlertState).where(AlertState.rule_id == key[0], AlertState.metric_code == key[1])
+            )
+            retired += 1
+        return retired
+
+    def rule_keys(self, rule_id: int, keep_metric: str = None) -> List[Tuple[int, str]]:
+        """规则的状态键, keep_metric 对应的状态除外"""
+        return [key for key in self._states if key[0] == rule_id and key[1] != keep_metric]
+
+    async def prune(self, db, rules: List[AlertRule], now: datetime = None) -> int:
+        """
+        定时全量检查时清理状态 (不提交)
+
+        rules 为当前全部启用的规则: 其余规则的状态移除;
+        启用规则的 pending / firing 状态超过 stale_minutes 没有评估结果时视为恢复
+        """
+        await self.load(db)
+        now = now or datetime.utcnow()
+        enabled = {(rule.id, rule.metric_code): rule for rule in rules}
+        retired = await self.retire(db, [key for key in self._states if key not in enabled], now)
+        if retired:
+            logger.info(f"已清理 {retired} 条停用规则的告警状态")
+
+        stale = 0
+        for key, state in self._states.items():
+            if state.state not in ("pending", "firing"):
+                continue
+            rule = enabled[key]
+            minutes = self._option(rule, "stale_minutes")
+            seen = self._seen.get(key, self._loaded_at)
+            if not minutes or now - seen < timedelta(minutes=minutes):
+                continue
+            if state.state == "pending":
+                self._transition(state, "inactive", now, state.last_value)
+            else:
+                self._transition(state, "resolved", now, state.last_value)
+                await self._resolve_record(db, state, now, f"指标超过 {minutes} 分钟无数据, 自动恢复")
+            stale += 1
+        if stale:
+            logger.warning(f"⚠️ {stale} 条告警状态长时间无评估结果, 已自动恢复")
+        db.add_all(self._changed.values())
+        return retired + stale
+
+    def release(self, db):
+        """提交后把已写入的状态从会话中移出, 供后续会话继续使用"""
+        for state in self._changed.values():
+            if state in db:
+                db.expunge(state)
+        self._changed.clear()
+
+    def discard(self):
+        """本轮写库失败时丢弃内存状态, 下次评估从数据库重新加载"""
+        self._states.clear()
+        self._group_records.clear()
+        self._changed.clear()
+        self._seen.clear()
+        self.loaded = False
+
+    def snapshot(self) -> Dict:
+        counts = {}
+        for state in self._states.values():
+            counts[state.state] = counts.get(state.state, 0) + 1
+        return {
+            "states": counts,
+            "flapping": sum(1 for state in self._states.values() if state.flapping),
+            **self.stats,
+        }
+
+
+# 全局实例
+alert_states = AlertStateManager()
@@ -8,6 +8,8 @@ from loguru import logger
 
 from app.database import get_db_context
 from app.models import DataSource, MetricDefinition, MetricData, SyncLog
+from app.services.event_bus import METRICS_UPDATED, MetricsUpdated, event_bus
+from app.services.metric_store import metric_store
 
 
 class DataCollector:
@@ -65,10 +67,11 @@ class DataCollector:
             metrics_data = await self.process_data(db, source, raw_data)
             
             # 保存指标数据
+            data_time = datetime.utcnow()
             for metric_code, value in metrics_data.items():
                 metric_data = MetricData(
                     metric_code=metric_code,
-                    data_time=datetime.utcnow(),
+                    data_time=data_time,
                     value=value,
                     raw_data=raw_data.get(metric_code),
                     status="normal"
@@ -86,6 +89,18 @@ class DataCollector:
             source.error_message = None
             
             await db.commit()
+            
+            # 写库成功后同步到指标内存缓存
+            for metric_code, value in metrics_data.items():
+                metric_store.append(metric_code, data_time, value, "normal")
+            
+            # 通知订阅者 (事件驱动告警评估)
+            if metrics_data:
+                event_bus.publish(
+                    METRICS_UPDATED,
+                    MetricsUpdated(set(metrics_data), data_time, source.code),
+                )
+            
             logger.info(f"✅ 数据源 {source.name} 采集完成, 处理 {len(metrics_data)} 条指标")
             
         except Exception as e:
@@ -0,0 +1,72 @@
+"""
+进程内事件总线
+
+发布者调用 publish 后立即返回，订阅者的处理函数以独立任务在事件循环中执行，
+处理失败只记录日志，不影响发布者。多进程部署时各进程各自一套总线。
+
+主题:
+    metrics.updated    DataCollector 写入指标数据后发布 MetricsUpdated
+"""
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Set
+
+from loguru import logger
+
+METRICS_UPDATED = "metrics.updated"
+
+Handler = Callable[[object], Awaitable[None]]
+
+
+@dataclass
+class MetricsUpdated:
+    """指标数据已写入"""
+    metric_codes: Set[str]
+    data_time: datetime
+    source_code: str = None
+    # 发布时刻 (time.monotonic)，用于统计从写入到告警的延迟
+    published_at: float = field(default_factory=time.monotonic)
+
+
+class EventBus:
+    """进程内发布/订阅"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(self, topic: str, handler: Handler):
+        if handler not in self._handlers[topic]:
+            self._handlers[topic].append(handler)
+
+    def unsubscribe(self, topic: str, handler: Handler):
+        if handler in self._handlers[topic]:
+            self._handlers[topic].remove(handler)
+
+    def publish(self, topic: str, event) -> int:
+        """发布事件，返回收到事件的订阅者数量"""
+        handlers = list(self._handlers.get(topic, ()))
+        for handler in handlers:
+            task = asyncio.get_running_loop().create_task(self._dispatch(topic, handler, event))
+            # 保留引用，避免任务在完成前被回收
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(handlers)
+
+    async def _dispatch(self, topic: str, handler: Handler, event):
+        try:
+            await handler(event)
+        except Exception as e:
+            logger.error(f"❌ 事件处理失败 [{topic}] {getattr(handler, '__qualname__', handler)}: {e}")
+
+    async def drain(self):
+        """等待已发布事件处理完毕（关闭时调用）"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+# 全局事件总线
+event_bus = EventBus()
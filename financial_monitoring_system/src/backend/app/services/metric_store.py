@@ -0,0 +1,306 @@
+"""
+指标内存时序缓存
+
+每个 metric_code 保留最近 capacity 个数据点，存放在 NumPy 环形缓冲区中
+（时间 datetime64[us]、数值 float64、状态 int8）。DataCollector 写库后同步写入，
+启动时从数据库预热，告警引擎与实时接口读取最新值和短窗口时不再访问数据库。
+
+缓存为进程内结构，只在事件循环中访问，不加锁；多进程部署时每个进程各自预热。
+指标数超过 max_metrics 时按最近访问时间淘汰冷指标，被淘汰或不完整的指标在下次读取时回源加载。
+回源时不淘汰本次请求涉及的指标；单次请求涉及的指标数超过 max_metrics 时缓存暂时超出上限并记录警告。
+"""
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+
+STATUSES = ["normal", "abnormal", "missing"]
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+MetricPoint = namedtuple("MetricPoint", ["metric_code", "data_time", "value", "status"])
+
+
+class RingBuffer:
+    """单个指标的定长环形缓冲区，按写入顺序（时间递增）保存"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = np.empty(capacity, dtype="datetime64[us]")
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.statuses = np.empty(capacity, dtype=np.int8)
+        self.size = 0
+        self.head = 0  # 下一个写入位置
+        # 是否已从数据库回填历史；未回填时窗口不足 capacity 个点不代表没有更早的数据
+        self.backfilled = False
+
+    def append(self, data_time: datetime, value: float, status: str = "normal"):
+        self.times[self.head] = np.datetime64(data_time, "us")
+        self.values[self.head] = value
+        self.statuses[self.head] = STATUS_CODES.get(status, 0)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, times, values, statuses):
+        """批量追加（按时间升序），只保留最后 capacity 个点"""
+        times = np.asarray(times, dtype="datetime64[us]")[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        statuses = np.asarray(statuses, dtype=np.int8)[-self.capacity:]
+        count = len(times)
+        index = (self.head + np.arange(count)) % self.capacity
+        self.times[index] = times
+        self.values[index] = values
+        self.statuses[index] = statuses
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def _order(self, n: int) -> np.ndarray:
+        """最近 n 个点在缓冲区中的下标（时间升序）"""
+        n = min(n, self.size)
+        return np.arange(self.head - n, self.head) % self.capacity
+
+    def latest(self) -> Optional[Tuple[datetime, float, str]]:
+        if not self.size:
+            return None
+        index = (self.head - 1) % self.capacity
+        return (
+            self.times[index].astype(datetime),
+            float(self.values[index]),
+            STATUSES[self.statuses[index]],
+        )
+
+    def last(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """最近 n 个点 (times, values)，时间升序"""
+        index = self._order(n)
+        return self.times[index], self.values[index]
+
+    def since(self, start: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """start 之后的点 (times, values)，时间升序"""
+        times, values = self.last(self.size)
+        mask = times >= np.datetime64(start, "us")
+        return times[mask], values[mask]
+
+    def covers(self, n: int = None, start: datetime = None) -> bool:
+        """缓存中的数据是否足以回答该窗口请求"""
+        if self.backfilled or self.size == self.capacity:
+            return True
+        if start is not None:
+            return bool(self.size) and self.times[self._order(self.size)[0]] <= np.datetime64(start, "us")
+        return n is not None and self.size >= n
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes + self.statuses.nbytes
+
+
+class MetricStore:
+    """指标内存时序缓存（LRU）"""
+
+    def __init__(self, capacity: int = None, max_metrics: int = None):
+        self.capacity = capacity or settings.metric_store.capacity
+        self.max_metrics = max_metrics or settings.metric_store.max_metrics
+        self._series: "OrderedDict[str, RingBuffer]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, metric_code: str) -> bool:
+        return metric_code in self._series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def _get(self, metric_code: str) -> Optional[RingBuffer]:
+        series = self._series.get(metric_code)
+        if series is not None:
+            self._series.move_to_end(metric_code)
+        return series
+
+    def _get_or_create(self, metric_code: str) -> RingBuffer:
+        series = self._get(metric_code)
+        if series is None:
+            series = self._series[metric_code] = RingBuffer(self.capacity)
+            self._evict({metric_code})
+        return series
+
+    def _evict(self, pinned: set):
+        """按最近访问时间淘汰至 max_metrics 个指标，pinned 中的指标不淘汰"""
+        if len(self._series) <= self.max_metrics:
+            return
+        if len(pinned) > self.max_metrics:
+            logger.warning(
+                f"⚠️ 单次请求涉及 {len(pinned)} 个指标, 超过指标缓存上限 {self.max_metrics}, "
+                f"请调大 metric_store.max_metrics"
+            )
+        for code in list(self._series):
+            if len(self._series) <= self.max_metrics:
+                break
+            if code not in pinned:
+                del self._series[code]
+                logger.debug(f"指标缓存淘汰: {code}")
+
+    def append(self, metric_code: str, data_time: datetime, value: float, status: str = "normal"):
+        """写入一个新数据点（DataCollector 写库后调用）"""
+        series = self._get_or_create(metric_code)
+        if series.size and np.datetime64(data_time, "us") < series.times[(series.head - 1) % series.capacity]:
+            # 乱序数据只落库，缓存等下次回源时再对齐
+            series.backfilled = False
+            return
+        series.append(data_time, value, status)
+
+    def latest(self, metric_code: str) -> Optional[MetricPoint]:
+        series = self._get(metric_code)
+        point = series.latest() if series is not None else None
+        if point is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return MetricPoint(metric_code, *point)
+
+    def latest_many(self, metric_codes: Iterable[str]) -> Dict[str, MetricPoint]:
+        """批量取最新值，只返回缓存中存在的指标"""
+        result = {}
+        for code in metric_codes:
+            point = self.latest(code)
+            if point is not None:
+                result[code] = point
+        return result
+
+    def window(self, metric_code: str, n: int = None, start: datetime = None):
+        """
+        最近 n 个点或 start 之后的点 (times, values)
+
+        缓存不足以回答时返回 None，调用方应先 load 再读取
+        """
+        series = self._get(metric_code)
+        if series is None or not series.covers(n=n, start=start):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if start is not None:
+            return series.since(start)
+        return series.last(n or series.size)
+
+    def missing(self, metric_codes: Iterable[str], n: int = None, start: datetime = None) -> List[str]:
+        """缓存中没有或历史不足以回答该窗口的指标"""
+        result = []
+        for code in metric_codes:
+            series = self._series.get(code)
+            if series is None or ((n is not None or start is not None) and not series.covers(n=n, start=start)):
+                result.append(code)
+        return result
+
+    async def load(self, db, metric_codes: Iterable[str], pinned: Iterable[str] = ()) -> int:
+        """
+        从数据库回填指标最近 capacity 个点（一次窗口函数查询），返回加载的点数
+
+        已缓存的较新数据点（回填期间写入）保留在末尾；
+        超出 max_metrics 时淘汰冷指标，本次加载的指标及 pinned 中的指标不淘汰
+        """
+        from sqlalchemy import select, func
+        from app.models import MetricData
+
+        metric_codes = list(metric_codes)
+        if not metric_codes:
+            return 0
+
+        ranked = (
+            select(
+                MetricData.metric_code,
+                MetricData.data_time,
+                MetricData.value,
+                MetricData.status,
+                func.row_number().over(
+                    partition_by=MetricData.metric_code,
+                    order_by=(MetricData.data_time.desc(), MetricData.id.desc()),
+                ).label("rn"),
+            )
+            .where(MetricData.metric_code.in_(metric_codes))
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked.c.metric_code, ranked.c.data_time, ranked.c.value, ranked.c.status)
+            .where(ranked.c.rn <= self.capacity)
+            .order_by(ranked.c.metric_code, ranked.c.rn.desc())
+        )
+
+        rows_by_code: Dict[str, list] = {code: [] for code in metric_codes}
+        for code, data_time, value, status in result.all():
+            rows_by_code[code].append((data_time, value, STATUS_CODES.get(status, 0)))
+
+        loaded = 0
+        for code, rows in rows_by_code.items():
+            old = self._series.get(code)
+            series = RingBuffer(self.capacity)
+            if rows:
+                times, values, statuses = zip(*rows)
+                series.extend(times, values, statuses)
+                loaded += len(rows)
+            if old is not None and old.size:
+                # 保留数据库结果之后才写入缓存的点
+                last = series.times[(series.head - 1) % series.capacity] if series.size else None
+                index = old._order(old.size)
+                if last is not None:
+                    index = index[old.times[index] > last]
+                series.extend(old.times[index], old.values[index], old.statuses[index])
+            series.backfilled = True
+            self._series[code] = series
+            self._series.move_to_end(code)
+
+        self._evict(set(metric_codes) | set(pinned))
+        return loaded
+
+    async def ensure(self, db, metric_codes: Iterable[str], n: int = None, start: datetime = None) -> List[str]:
+        """确保指标（及所需窗口）在缓存中，返回本次回源的指标"""
+        metric_codes = list(metric_codes)
+        missing = self.missing(metric_codes, n=n, start=start)
+        if missing:
+            # 已缓存的指标同属本次请求，回源后不能被淘汰
+            await self.load(db, missing, pinned=metric_codes)
+        return missing
+
+    async def warm(self) -> int:
+        """启动预热: 加载最近有数据的指标（至多 max_metrics 个）"""
+        from sqlalchemy import select, func
+        from app.database import get_db_context
+        from app.models import MetricData
+
+        async with get_db_context() as db:
+            result = await db.execute(
+                select(MetricData.metric_code)
+                .group_by(MetricData.metric_code)
+                .order_by(func.max(MetricData.data_time).desc())
+                .limit(self.max_metrics)
+            )
+            # 最近活跃的指标最后加载，位于 LRU 末尾
+            codes = list(reversed(result.scalars().all()))
+            loaded = await self.load(db, codes)
+        logger.info(f"✅ 指标缓存预热完成: {len(codes)} 个指标, {loaded} 个数据点, {self.nbytes / 1024 / 1024:.1f} MiB")
+        return loaded
+
+    def invalidate(self, metric_code: str = None):
+        """清除缓存（数据被修改或删除时调用）"""
+        if metric_code is None:
+            self._series.clear()
+        else:
+            self._series.pop(metric_code, None)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self._series.values())
+
+    def stats(self) -> Dict:
+        return {
+            "metrics": len(self._series),
+            "max_metrics": self.max_metrics,
+            "capacity": self.capacity,
+            "memory_bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# 全局缓存实例
+metric_store = MetricStore()
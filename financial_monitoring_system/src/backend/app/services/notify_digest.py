@@ -0,0 +1,155 @@
+"""
+告警汇总
+
+告警风暴时大量规则在几秒内同时触发, 逐条推送会很快触及飞书 / 企业微信等机器人的限流。
+告警通知先进入汇总缓冲区, 按 (渠道类型, 渠道配置) 即同一渠道同一接收方分组:
+
+    - 组内首条告警到达后等待 digest_window_seconds, 到期把窗口内的告警合并为一条汇总消息发送
+    - 窗口内累计达到 digest_max_items 条时立即发送, 不再等待
+    - 窗口内只有一条时按原消息发送
+    - digest_immediate_severities 中的级别 (默认 P1) 不进入缓冲区, 立即发送
+
+汇总消息与单条消息一样交给通知分发器排队发送。参数见 settings.notify。
+"""
+import asyncio
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config import settings
+from app.services.notify_dispatcher import notify_dispatcher
+
+# 消息级别优先级, 汇总消息取组内最高级别
+LEVEL_ORDER = {"info": 0, "warning": 1, "error": 2}
+SEVERITY_NAMES = {"P1": "紧急", "P2": "严重", "P3": "警告", "P4": "提示"}
+# 汇总消息中最多列出的告警条数
+MAX_LINES = 30
+
+
+@dataclass
+class DigestItem:
+    title: str
+    content: str
+    level: str
+    severity: Optional[str]
+    received_at: datetime = field(default_factory=datetime.utcnow)
+
+
+@dataclass
+class DigestBuffer:
+    channel_type: str
+    config: Dict[str, Any]
+    items: List[DigestItem] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class NotifyDigest:
+    """告警汇总缓冲区 (进程内单例)"""
+
+    def __init__(self, dispatcher=None):
+        self.dispatcher = dispatcher or notify_dispatcher
+        self._buffers: Dict[tuple, DigestBuffer] = {}
+        self.stats = {
+            "received": 0,
+            "immediate": 0,
+            "digests_sent": 0,
+            "items_digested": 0,
+            "dropped": 0,  # 分发器拒收 (队列已满 / 未启动) 的告警条数
+        }
+
+    def add(
+        self,
+        channel_type: str,
+        config: Dict[str, Any],
+        title: str,
+        content: str,
+        level: str = "info",
+        severity: str = None,
+    ) -> bool:
+        """提交一条告警通知, 需要立即发送时直接交给分发器, 否则进入汇总缓冲区"""
+        self.stats["received"] += 1
+        if not settings.notify.digest_enabled or severity in settings.notify.digest_immediate_severities:
+            self.stats["immediate"] += 1
+            if not self.dispatcher.submit(channel_type, config, title, content, level):
+                self.stats["dropped"] += 1
+                return False
+            return True
+
+        key = (channel_type, json.dumps(config, sort_keys=True, default=str))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = DigestBuffer(channel_type, config)
+            buffer.timer = asyncio.get_running_loop().call_later(
+                settings.notify.digest_window_seconds, self.flush, key
+            )
+        buffer.items.append(DigestItem(title, content, level, severity))
+        if len(buffer.items) >= settings.notify.digest_max_items:
+            self.flush(key)
+        return True
+
+    def flush(self, key: tuple):
+        """发送一组缓冲的告警"""
+        buffer = self._buffers.pop(key, None)
+        if buffer is None:
+            return
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+
+        items = buffer.items
+        if len(items) == 1:
+            item = items[0]
+            if not self.dispatcher.submit(buffer.channel_type, buffer.config, item.title, item.content, item.level):
+                self.stats["dropped"] += 1
+            return
+
+        title, content, level = self.render(items)
+        if not self.dispatcher.submit(buffer.channel_type, buffer.config, title, content, level):
+            logger.error(f"❌ 告警汇总入队失败, 丢弃: {buffer.channel_type} {len(items)} 条")
+            self.stats["dropped"] += len(items)
+            return
+        self.stats["digests_sent"] += 1
+        self.stats["items_digested"] += len(items)
+        logger.info(f"📨 告警汇总已入队: {buffer.channel_type} {len(items)} 条")
+
+    def flush_all(self):
+        """发送全部缓冲的告警 (关闭时调用)"""
+        for key in list(self._buffers):
+            self.flush(key)
+
+    def render(self, items: List[DigestItem]) -> tuple:
+        """把一组告警渲染为一条汇总消息, 返回 (标题, 内容, 级别)"""
+        level = max((item.level for item in items), key=lambda value: LEVEL_ORDER.get(value, 0))
+        counts = Counter(item.severity for item in items if item.severity)
+        summary = ", ".join(
+            f"{SEVERITY_NAMES.get(severity, severity)} {counts[severity]}" for severity in sorted(counts)
+        )
+
+        title = f"告警汇总: {len(items)} 条告警"
+        lines = [
+            f"{items[0].received_at:%H:%M:%S} - {items[-1].received_at:%H:%M:%S} (UTC) 共 {len(items)} 条"
+            + (f" ({summary})" if summary else ""),
+            "",
+        ]
+        for i, item in enumerate(items[:MAX_LINES], 1):
+            # 单条消息首行即标题, 其余各行压缩为一行
+            details = [line.strip() for line in item.content.splitlines() if line.strip()]
+            if details and details[0] == item.title:
+                details = details[1:]
+            lines.append(f"{i}. {' | '.join([item.title] + details)}")
+        if len(items) > MAX_LINES:
+            lines.append(f"... 另有 {len(items) - MAX_LINES} 条未列出")
+        return title, "\n".join(lines), level
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "buffered": sum(len(buffer.items) for buffer in self._buffers.values()),
+        }
+
+
+# 全局实例
+notify_digest = NotifyDigest()
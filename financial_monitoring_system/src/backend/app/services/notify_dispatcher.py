@@ -0,0 +1,316 @@
+"""
+通知分发
+
+告警路径只调用 submit 把消息放入队列后立即返回, 发送在后台完成:
+
+    - 每种渠道类型一条通道: 有界队列 + concurrency 个发送协程 (各渠道互不阻塞)
+    - 同一目标 (机器人 / 地址) 按 rate_limits 令牌桶限流, 超限的消息延后重新入队而不占用发送协程
+    - 失败按指数退避加随机抖动重试 (retry_base_delay * 2^n, 上限 retry_interval), 最多 max_retry_times 次
+    - HTTP 请求复用 HttpClientPool 中按主机划分的长连接, 不再每条消息新建连接和 TLS 握手
+    - 邮件等可批量发送的渠道, 同一目标已排队的消息 (最多 batch_size 条) 合并为一批, 在一个连接上发完
+
+参数见 settings.notify。
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+
+
+class HttpClientPool:
+    """按主机划分的 httpx.AsyncClient 连接池"""
+
+    def __init__(self, max_connections: int = None, timeout: float = None, **client_kwargs):
+        self.max_connections = max_connections or settings.notify.max_connections_per_host
+        self.timeout = timeout or settings.notify.timeout
+        self.client_kwargs = client_kwargs
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._clients[host] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+                **self.client_kwargs,
+            )
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = await self.client(url).request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict:
+        return {"hosts": len(self._clients)}
+
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+class TokenBucket:
+    """令牌桶: rate 条/秒, 最多积攒 burst 条"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """预订一个令牌, 返回需要等待的秒数 (令牌可透支, 排队者按预订顺序错开)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+@dataclass
+class NotifyJob:
+    channel_type: str
+    config: Dict[str, Any]
+    title: str
+    content: str
+    level: str = "info"
+    target: str = ""
+    attempts: int = 0
+    reserved: bool = False  # 已预订限流令牌, 到期后直接发送
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class NotifyDispatcher:
+    """通知分发器 (进程内单例, 随应用启动 / 停止)"""
+
+    def __init__(self, service=None):
+        self._service = service
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers = []
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._delayed = set()  # 等待重试 / 限流的定时器
+        self._running = False
+        # 未完成的通知数 (排队、发送中、等待重试 / 限流), 归零时 join 返回
+        self._outstanding = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.stats = defaultdict(int)
+        self._latencies = []
+
+    @property
+    def service(self):
+        if self._service is None:
+            from app.services.notify_service import NotifyService
+            self._service = NotifyService()
+        return self._service
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for channel_type in settings.notify.concurrency:
+            self._queue(channel_type)
+        logger.info("✅ 通知分发器已启动")
+
+    def _queue(self, channel_type: str) -> asyncio.Queue:
+        queue = self._queues.get(channel_type)
+        if queue is None:
+            queue = self._queues[channel_type] = asyncio.Queue(maxsize=settings.notify.queue_size)
+            concurrency = settings.notify.concurrency.get(channel_type, 2)
+            loop = asyncio.get_running_loop()
+            for _ in range(concurrency):
+                self._workers.append(loop.create_task(self._worker(channel_type, queue)))
+        return queue
+
+    def submit(
+        self,
+        channel_type: str,
+        config: Dict[str, Any],
+        title: str,
+        content: str,
+        level: str = "info",
+    ) -> bool:
+        """放入发送队列后立即返回; 队列已满或分发器未启动时返回 False"""
+        if not self._running:
+            logger.warning(f"通知分发器未启动, 丢弃通知: {channel_type} {title}")
+            self.stats["dropped"] += 1
+            return False
+        job = NotifyJob(
+            channel_type, config, title, content, level,
+            target=self.service.target(channel_type, config),
+        )
+        if not self._put(job):
+            return False
+        self._outstanding += 1
+        self._idle.clear()
+        return True
+
+    def _finish(self):
+        """一条通知处理结束 (发送成功、最终失败或重新入队时被丢弃)"""
+        self._outstanding -= 1
+        if self._outstanding <= 0:
+            self._outstanding = 0
+            self._idle.set()
+
+    def _put(self, job: NotifyJob) -> bool:
+        try:
+            self._queue(job.channel_type).put_nowait(job)
+        except asyncio.QueueFull:
+            logger.error(f"❌ 通知队列已满, 丢弃通知: {job.channel_type} {job.title}")
+            self.stats["dropped"] += 1
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def _put_later(self, job: NotifyJob, delay: float):
+        loop = asyncio.get_running_loop()
+
+        def put():
+            self._delayed.discard(handle)
+            if not (self._running and self._put(job)):
+                self._finish()
+
+        handle = loop.call_later(delay, put)
+        self._delayed.add(handle)
+
+    def _bucket(self, job: NotifyJob) -> Optional[TokenBucket]:
+        per_minute = settings.notify.rate_limits.get(job.channel_type)
+        if not per_minute:
+            return None
+        key = (job.channel_type, job.target)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(per_minute / 60)
+        return bucket
+
+    def backoff(self, attempts: int) -> float:
+        """第 attempts 次失败后的等待时间: [0, min(上限, 基数 * 2^(attempts-1))] 内均匀随机"""
+        cap = min(settings.notify.retry_interval, settings.notify.retry_base_delay * 2 ** (attempts - 1))
+        return random.uniform(0, cap)
+
+    async def _worker(self, channel_type: str, queue: asyncio.Queue):
+        batch = channel_type in getattr(self.service, "BATCH_CHANNELS", ())
+        while True:
+            jobs = [await queue.get()]
+            # 可批量发送的渠道顺带取走已排队的消息, batch_key 相同的合并为一批
+            while batch and len(jobs) < settings.notify.batch_size and not queue.empty():
+                jobs.append(queue.get_nowait())
+            try:
+                await self._process(channel_type, jobs)
+            except Exception as e:
+                logger.error(f"❌ 通知处理异常: {e}")
+            finally:
+                for _ in jobs:
+                    queue.task_done()
+
+    async def _process(self, channel_type: str, jobs: List[NotifyJob]):
+        batches = defaultdict(list)
+        for job in jobs:
+            if not job.reserved:
+                bucket = self._bucket(job)
+                wait = bucket.reserve() if bucket else 0
+                if wait:
+                    job.reserved = True
+                    self.stats["throttled"] += 1
+                    self._put_later(job, wait)
+                    continue
+            job.reserved = False
+            job.attempts += 1
+            batches[self.service.batch_key(channel_type, job.config)].append(job)
+
+        for group in batches.values():
+            if len(group) == 1:
+                job = group[0]
+                try:
+                    await self.service.deliver(channel_type, job.config, job.title, job.content, job.level)
+                    errors = [None]
+                except Exception as e:
+                    errors = [e]
+            else:
+                try:
+                    errors = await self.service.deliver_batch(
+                        channel_type, [(job.config, job.title, job.content, job.level) for job in group]
+                    )
+                except Exception as e:
+                    errors = [e] * len(group)
+            for job, error in zip(group, errors):
+                self._done(job, error)
+
+    def _done(self, job: NotifyJob, error: Optional[Exception]):
+        if error is None:
+            self.stats["sent"] += 1
+            self._latencies.append(time.monotonic() - job.created_at)
+            if len(self._latencies) > 1000:
+                del self._latencies[:500]
+            self._finish()
+        elif job.attempts < settings.notify.max_retry_times:
+            delay = self.backoff(job.attempts)
+            logger.warning(
+                f"通知发送失败 (尝试 {job.attempts}/{settings.notify.max_retry_times}), "
+                f"{delay:.1f}s 后重试: {job.channel_type} {error}"
+            )
+            self.stats["retried"] += 1
+            self._put_later(job, delay)
+        else:
+            logger.error(f"❌ 通知发送最终失败: {job.channel_type} {job.title}: {error}")
+            self.stats["failed"] += 1
+            self._finish()
+
+    async def join(self, timeout: float = None):
+        """等待队列中及等待重试的通知处理完毕"""
+        await asyncio.wait_for(self._idle.wait(), timeout)
+
+    async def stop(self, timeout: float = 10):
+        """停止分发: 尽量发完已入队的通知, 超时后放弃"""
+        if not self._running:
+            return
+        try:
+            await self.join(timeout)
+        except asyncio.TimeoutError:
+            logger.warning("通知分发器停止时仍有未发送的通知")
+        self._running = False
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        if self._outstanding:
+            self.stats["dropped"] += self._outstanding
+        self._outstanding = 0
+        self._idle.set()
+        await self.service.close()
+        logger.info("⏹️ 通知分发器已停止")
+
+    def snapshot(self) -> Dict:
+        latencies = sorted(self._latencies)
+        return {
+            **self.stats,
+            "pending": sum(queue.qsize() for queue in self._queues.values()) + len(self._delayed),
+            "outstanding": self._outstanding,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+            "connections": self._service.stats() if self._service is not None else None,
+        }
+
+
+# 全局实例
+notify_dispatcher = NotifyDispatcher()
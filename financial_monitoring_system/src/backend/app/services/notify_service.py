@@ -1,19 +1,29 @@
 """
 通知服务
+
+send 只把消息交给通知分发器排队 (重试、限流、并发由分发器负责), 不阻塞调用方;
+deliver 同步完成一次发送, 失败抛出异常, 供分发器和渠道测试调用。
+HTTP 类渠道共用 HttpClientPool 中的长连接, 邮件经 SmtpPool 异步发送并复用已认证的 SMTP 连接。
 """
-import asyncio
-from typing import List, Dict, Any, Optional
+from datetime import datetime
+from email.header import Header
+from email.mime.text import MIMEText
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
 
-import httpx
+from app.services.notify_dispatcher import HttpClientPool, notify_dispatcher
+from app.services.smtp_pool import SmtpPool
 
 
 class NotifyService:
     """通知服务"""
     
-    def __init__(self):
-        self.max_retry = 3
-        self.retry_interval = 5  # 秒
+    # 支持批量发送的渠道类型, 分发器会把 batch_key 相同的排队消息合并后调用 deliver_batch
+    BATCH_CHANNELS = {"email"}
+    
+    def __init__(self, http: HttpClientPool = None, smtp: SmtpPool = None):
+        self.http = http or HttpClientPool()
+        self.smtp = smtp or SmtpPool()
     
     async def send(
         self,
@@ -23,26 +33,82 @@ class NotifyService:
         content: str,
         level: str = "info"
     ):
-        """发送通知"""
-        method = f"send_{channel_type}"
-        send_func = getattr(self, method, None)
-        
-        if not send_func:
+        """发送通知 (入队后立即返回)"""
+        if not hasattr(self, f"send_{channel_type}"):
             logger.error(f"不支持的通知类型: {channel_type}")
             return False
+        return notify_dispatcher.submit(channel_type, config, title, content, level)
+    
+    async def deliver(
+        self,
+        channel_type: str,
+        config: Dict[str, Any],
+        title: str,
+        content: str,
+        level: str = "info"
+    ):
+        """发送一次, 失败时抛出异常"""
+        send_func = getattr(self, f"send_{channel_type}", None)
+        if not send_func:
+            raise ValueError(f"不支持的通知类型: {channel_type}")
+        await send_func(config, title, content, level)
+    
+    async def deliver_batch(
+        self,
+        channel_type: str,
+        messages: List[Tuple[Dict[str, Any], str, str, str]]
+    ) -> List[Optional[Exception]]:
+        """
+        发送一批 batch_key 相同的消息 [(渠道配置, 标题, 内容, 级别)]
+        
+        返回与 messages 对应的异常 (成功为 None)。邮件各按自身配置构建 (收件人、发件人可不同),
+        在同一 SMTP 连接上依次发送; 其他渠道逐条发送
+        """
+        if channel_type == "email":
+            emails, errors = [], []
+            for config, title, content, level in messages:
+                try:
+                    emails.append(self.build_email(config, title, content))
+                    errors.append(None)
+                except ValueError as e:
+                    errors.append(e)
+            results = iter(await self.smtp.send_many(messages[0][0], emails) if emails else ())
+            return [error or next(results) for error in errors]
         
-        for attempt in range(self.max_retry):
+        results = []
+        for config, title, content, level in messages:
             try:
-                await send_func(config, title, content, level)
-                logger.info(f"✅ 通知发送成功: {channel_type}")
-                return True
+                await self.deliver(channel_type, config, title, content, level)
+                results.append(None)
             except Exception as e:
-                logger.warning(f"通知发送失败 (尝试 {attempt + 1}/{self.max_retry}): {e}")
-                if attempt < self.max_retry - 1:
-                    await asyncio.sleep(self.retry_interval)
-        
-        logger.error(f"❌ 通知发送最终失败: {channel_type}")
-        return False
+                results.append(e)
+        return results
+    
+    def target(self, channel_type: str, config: Dict[str, Any]) -> str:
+        """发送目标标识 (同一机器人/地址), 用于按目标限流"""
+        keys = {
+            "lark": ("webhook_url",),
+            "wecom": ("key",),
+            "dingtalk": ("access_token",),
+            "telegram": ("bot_token", "chat_id"),
+            "webhook": ("url",),
+            "email": ("smtp_host", "smtp_port", "username", "to_addresses"),
+        }.get(channel_type, ())
+        return "|".join(str(config.get(key, "")) for key in keys)
+    
+    def batch_key(self, channel_type: str, config: Dict[str, Any]) -> tuple:
+        """可合并为一批发送的标识: 邮件按 SMTP 连接合并, 不区分收件人"""
+        if channel_type == "email":
+            return self.smtp.key(config)
+        return (self.target(channel_type, config),)
+    
+    def stats(self) -> Dict:
+        """连接池状态"""
+        return {"http": self.http.stats(), "smtp": self.smtp.stats()}
+    
+    async def close(self):
+        await self.http.close()
+        await self.smtp.close()
     
     async def send_lark(
         self, 
@@ -89,8 +155,7 @@ class NotifyService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            await client.post(webhook_url, json=payload)
+        await self.http.post(webhook_url, json=payload)
     
     async def send_wecom(
         self, 
@@ -116,8 +181,24 @@ class NotifyService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            await client.post(webhook_url, json=payload)
+        await self.http.post(webhook_url, json=payload)
+    
+    def build_email(
+        self,
+        config: Dict[str, Any],
+        title: str,
+        content: str
+    ) -> MIMEText:
+        """构建邮件"""
+        to_addresses = config.get("to_addresses", [])
+        if not to_addresses:
+            raise ValueError("缺少收件人地址")
+        
+        msg = MIMEText(content, 'plain', 'utf-8')
+        msg['Subject'] = Header(title, 'utf-8')
+        msg['From'] = config.get("from_address", "noreply@example.com")
+        msg['To'] = ",".join(to_addresses)
+        return msg
     
     async def send_email(
         self, 
@@ -126,42 +207,8 @@ class NotifyService:
         content: str, 
         level: str = "info"
     ):
-        """发送邮件通知"""
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.header import Header
-        
-        smtp_config = {
-            "host": config.get("smtp_host", "localhost"),
-            "port": config.get("smtp_port", 25),
-            "username": config.get("username"),
-            "password": config.get("password"),
-            "from_address": config.get("from_address", "noreply@example.com"),
-            "to_addresses": config.get("to_addresses", [])
-        }
-        
-        if not smtp_config["to_addresses"]:
-            raise ValueError("缺少收件人地址")
-        
-        # 构建邮件
-        msg = MIMEText(content, 'plain', 'utf-8')
-        msg['Subject'] = Header(title, 'utf-8')
-        msg['From'] = smtp_config["from_address"]
-        msg['To'] = ",".join(smtp_config["to_addresses"])
-        
-        # 发送邮件
-        try:
-            server = smtplib.SMTP(smtp_config["host"], smtp_config["port"])
-            if smtp_config.get("password"):
-                server.login(smtp_config["username"], smtp_config["password"])
-            server.sendmail(
-                smtp_config["from_address"],
-                smtp_config["to_addresses"],
-                msg.as_string()
-            )
-            server.quit()
-        except Exception as e:
-            raise ValueError(f"邮件发送失败: {e}")
+        """发送邮件通知 (复用 SMTP 连接池中已认证的连接)"""
+        await self.smtp.send(config, self.build_email(config, title, content))
     
     async def send_dingtalk(
         self, 
@@ -205,8 +252,7 @@ class NotifyService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            await client.post(webhook_url, json=payload)
+        await self.http.post(webhook_url, json=payload)
     
     async def send_telegram(
         self, 
@@ -231,8 +277,7 @@ class NotifyService:
             "parse_mode": "Markdown"
         }
         
-        async with httpx.AsyncClient() as client:
-            await client.post(url, json=payload)
+        await self.http.post(url, json=payload)
     
     async def send_webhook(
         self, 
@@ -256,6 +301,4 @@ class NotifyService:
             "timestamp": str(datetime.utcnow())
         }
         
-        async with httpx.AsyncClient() as client:
-            request = client.build_request(method, url, json=payload, headers=headers)
-            await client.send(request)
+        await self.http.request(method, url, json=payload, headers=headers)
@@ -0,0 +1,299 @@
+"""
+规则编译
+
+每条规则的 condition_config 只在首次评估（或规则更新后）编译一次，得到可直接调用的判断函数，
+按规则 id 与 updated_at 缓存；规则经 rules 路由修改或删除时主动失效。
+
+threshold / range 编译为比较闭包；combine 为组合条件表达式:
+
+    {"expression": "value > 100 AND (change_rate(5) > 10 OR metric('NAV_DIFF') < 0.5)"}
+
+    value                 本规则指标的最新值
+    metric('CODE')        其他指标的最新值
+    avg/min/max/sum/std(n[, 'CODE'])
+                          指标最近 n 个点的聚合值，省略 CODE 时为本规则指标
+    change_rate(n[, 'CODE'])  最新值相对 n 个周期前的变化百分比
+    delta(n[, 'CODE'])        最新值与 n 个周期前的差值
+    abs(x)
+    AND / OR / NOT、比较运算 (> >= < <= == !=)、四则运算、括号
+
+表达式按 Python 语法解析，只允许上述节点，编译为 lambda 后求值；
+窗口长度与指标编码须为字面量，以便评估前一次性准备所需的缓存数据，
+窗口长度不能超过指标缓存容量（settings.metric_store.capacity）。
+引用的指标无数据（或窗口不足、除数为 0）时整条规则本轮不触发。
+"""
+import ast
+import operator
+import re
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.metric_store import metric_store
+
+
+class RuleSyntaxError(ValueError):
+    """规则条件配置无法编译"""
+
+
+class MissingData(Exception):
+    """表达式引用的指标在缓存中没有足够数据"""
+
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+def _change_rate(values: np.ndarray) -> float:
+    base = values[0]
+    if base == 0:
+        raise MissingData("change_rate 基准值为 0")
+    return float((values[-1] - base) / abs(base) * 100)
+
+
+# 窗口函数: 最近 n 个点 -> 数值
+WINDOW_FUNCTIONS: Dict[str, Callable[[np.ndarray], float]] = {
+    "avg": lambda values: float(values.mean()),
+    "min": lambda values: float(values.min()),
+    "max": lambda values: float(values.max()),
+    "sum": lambda values: float(values.sum()),
+    "std": lambda values: float(values.std()),
+    "delta": lambda values: float(values[-1] - values[0]),
+    "change_rate": _change_rate,
+}
+# 以下函数的 n 表示周期数，需要 n + 1 个点
+PERIOD_FUNCTIONS = {"delta", "change_rate"}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+    ast.Constant, ast.Name, ast.Call, ast.Load,
+)
+_KEYWORDS = re.compile(r"\b(AND|OR|NOT)\b", re.IGNORECASE)
+_STRINGS = re.compile(r"""('[^']*'|"[^"]*")""")
+
+
+class EvalContext:
+    """
+    一轮评估共用的上下文
+
+    指标数据取自指标内存缓存，窗口聚合结果在本轮内按 (函数, 指标, n) 复用，
+    多条规则引用同一窗口时只计算一次
+    """
+    __slots__ = ("metric_code", "value", "store", "_memo")
+
+    def __init__(self, store=None):
+        self.store = store or metric_store
+        self.metric_code = None
+        self.value = None
+        self._memo: Dict[tuple, float] = {}
+
+    def bind(self, metric_code: str, value: float) -> "EvalContext":
+        self.metric_code = metric_code
+        self.value = value
+        return self
+
+    def latest(self, metric_code: str) -> float:
+        key = ("latest", metric_code)
+        if key not in self._memo:
+            point = self.store.latest(metric_code)
+            if point is None:
+                raise MissingData(metric_code)
+            self._memo[key] = point.value
+        return self._memo[key]
+
+    def agg(self, name: str, metric_code: Optional[str], n: int) -> float:
+        metric_code = metric_code or self.metric_code
+        key = (name, metric_code, n)
+        if key not in self._memo:
+            window = self.store.window(metric_code, n=n)
+            if window is None or len(window[1]) < n:
+                raise MissingData(metric_code)
+            self._memo[key] = WINDOW_FUNCTIONS[name](window[1][-n:])
+        return self._memo[key]
+
+
+class CompiledRule:
+    """编译后的规则: evaluate(ctx) -> (是否触发, 阈值)"""
+    __slots__ = ("evaluate", "metrics", "window_metrics", "window", "version")
+
+    def __init__(self, evaluate, metrics: Set[str] = (), window_metrics: Set[str] = (), window: int = 0):
+        self.evaluate = evaluate
+        self.metrics = set(metrics)  # 引用的其他指标（最新值）
+        self.window_metrics = set(window_metrics)  # 需要窗口数据的指标
+        self.window = window  # 最长窗口（点数）
+        self.version = None
+
+
+def compile_condition(condition_type: str, config: Dict, metric_code: str = None) -> CompiledRule:
+    """编译 threshold / range / combine 条件，配置不合法时抛出 RuleSyntaxError"""
+    config = config or {}
+    if condition_type == "threshold":
+        op = config.get("operator", ">")
+        if op not in OPERATORS:
+            raise RuleSyntaxError(f"不支持的比较运算符: {op}")
+        compare, threshold = OPERATORS[op], config.get("threshold", 0)
+        return CompiledRule(lambda ctx: (compare(ctx.value, threshold), threshold))
+
+    if condition_type == "range":
+        min_val = config.get("min", float("-inf"))
+        max_val = config.get("max", float("inf"))
+        label = f"{min_val}-{max_val}"
+        return CompiledRule(lambda ctx: (ctx.value < min_val or ctx.value > max_val, label))
+
+    if condition_type == "combine":
+        expression = config.get("expression")
+        if not expression or not isinstance(expression, str):
+            raise RuleSyntaxError("组合条件缺少 expression")
+        return compile_expression(expression, metric_code)
+
+    raise RuleSyntaxError(f"不支持的条件类型: {condition_type}")
+
+
+def compile_expression(expression: str, metric_code: str = None) -> CompiledRule:
+    """把组合条件表达式编译为 lambda ctx: bool"""
+    # AND / OR / NOT 转为 Python 关键字（跳过字符串字面量）
+    source = "".join(
+        part if _STRINGS.fullmatch(part) else _KEYWORDS.sub(lambda m: m.group(1).lower(), part)
+        for part in _STRINGS.split(expression)
+    )
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise RuleSyntaxError(f"表达式语法错误: {e.msg}") from e
+
+    transformer = _Transformer(metric_code)
+    body = transformer.visit(tree).body
+    lambda_node = ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg="ctx")], vararg=None,
+            kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[],
+        ),
+        body=body,
+    )
+    code = compile(ast.fix_missing_locations(ast.Expression(lambda_node)), "<rule>", "eval")
+    predicate = eval(code, {"__builtins__": {}, "abs": abs})
+
+    def evaluate(ctx: EvalContext) -> Tuple[bool, Any]:
+        try:
+            return bool(predicate(ctx)), None
+        except (MissingData, ZeroDivisionError):
+            return False, None
+
+    return CompiledRule(
+        evaluate,
+        metrics=transformer.metrics,
+        window_metrics=transformer.window_metrics,
+        window=transformer.window,
+    )
+
+
+class _Transformer(ast.NodeTransformer):
+    """校验表达式节点，并把 value / metric() / 窗口函数改写为对 ctx 的调用"""
+
+    def __init__(self, metric_code: str = None):
+        self.metric_code = metric_code
+        self.metrics: Set[str] = set()
+        self.window_metrics: Set[str] = set()
+        self.window = 0
+
+    def generic_visit(self, node):
+        if not isinstance(node, ALLOWED_NODES):
+            raise RuleSyntaxError(f"表达式中不允许使用 {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise RuleSyntaxError(f"不支持的常量: {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id != "value":
+            raise RuleSyntaxError(f"未知名称: {node.id}")
+        return ast.Attribute(value=ast.Name(id="ctx", ctx=ast.Load()), attr="value", ctx=ast.Load())
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise RuleSyntaxError("不支持的函数调用")
+        name, args = node.func.id, node.args
+
+        if name == "abs":
+            if len(args) != 1:
+                raise RuleSyntaxError("abs() 需要 1 个参数")
+            return ast.Call(func=node.func, args=[self.visit(args[0])], keywords=[])
+
+        if name == "metric":
+            if len(args) != 1:
+                raise RuleSyntaxError("metric() 需要 1 个参数")
+            code = self._literal_code(args[0])
+            self.metrics.add(code)
+            return self._ctx_call("latest", [ast.Constant(code)])
+
+        if name in WINDOW_FUNCTIONS:
+            if not 1 <= len(args) <= 2:
+                raise RuleSyntaxError(f"{name}() 需要 1 或 2 个参数")
+            n = args[0].value if isinstance(args[0], ast.Constant) else None
+            if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+                raise RuleSyntaxError(f"{name}() 的窗口长度须为正整数")
+            if name in PERIOD_FUNCTIONS:
+                n += 1
+            capacity = settings.metric_store.capacity
+            if n > capacity:
+                raise RuleSyntaxError(f"{name}() 的窗口长度超过指标缓存容量 {capacity}")
+            code = self._literal_code(args[1]) if len(args) == 2 else None
+            if code is None and self.metric_code is None:
+                raise RuleSyntaxError(f"{name}() 未指定指标编码")
+            self.window_metrics.add(code or self.metric_code)
+            self.window = max(self.window, n)
+            return self._ctx_call("agg", [ast.Constant(name), ast.Constant(code), ast.Constant(n)])
+
+        raise RuleSyntaxError(f"未知函数: {name}")
+
+    @staticmethod
+    def _literal_code(node) -> str:
+        if not isinstance(node, ast.Constant) or not isinstance(node.value, str) or not node.value:
+            raise RuleSyntaxError("指标编码须为字符串字面量")
+        return node.value
+
+    @staticmethod
+    def _ctx_call(method: str, args):
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id="ctx", ctx=ast.Load()), attr=method, ctx=ast.Load()),
+            args=args,
+            keywords=[],
+        )
+
+
+class RuleCache:
+    """编译结果缓存，按规则 id 存放，updated_at 变化时重新编译"""
+
+    def __init__(self):
+        self._rules: Dict[int, CompiledRule] = {}
+
+    def get(self, rule) -> CompiledRule:
+        compiled = self._rules.get(rule.id)
+        if compiled is None or compiled.version != rule.updated_at:
+            compiled = compile_condition(rule.condition_type, rule.condition_config, rule.metric_code)
+            compiled.version = rule.updated_at
+            self._rules[rule.id] = compiled
+        return compiled
+
+    def invalidate(self, rule_id: int = None):
+        if rule_id is None:
+            self._rules.clear()
+        else:
+            self._rules.pop(rule_id, None)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+
+# 全局编译缓存
+rule_cache = RuleCache()
@@ -0,0 +1,161 @@
+"""
+SMTP 连接池
+
+邮件经 aiosmtplib 异步发送, 不阻塞事件循环。每个 SMTP 服务器 (地址 + 端口 + 账号) 一个池:
+
+    - 连接建立时完成 STARTTLS / 登录, 之后保持复用, 不再每封邮件重新连接和认证
+    - 最多 smtp_max_connections 个连接, 超出时等待空闲连接
+    - 空闲超过 smtp_idle_timeout 或已发送 smtp_max_messages 封的连接关闭后重建
+    - 一批邮件在同一连接上依次发送, 单封被拒不影响同批其他邮件; 连接断开时剩余邮件返回异常由调用方重试
+
+参数见 settings.notify, 连接 / 命令超时取 settings.notify.timeout。
+"""
+import asyncio
+import time
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+import aiosmtplib
+from loguru import logger
+
+from app.config import settings
+
+
+class _ServerPool:
+    """单个 SMTP 服务器的连接池"""
+
+    def __init__(self, options: Dict, max_connections: int):
+        self.options = options
+        self.slots = asyncio.Semaphore(max_connections)
+        self.idle: List[Tuple[aiosmtplib.SMTP, float, int]] = []  # (连接, 最后使用时间, 已发送数)
+        self.connections = 0  # 累计建立的连接数
+
+    async def connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(**self.options)
+        await smtp.connect()
+        self.connections += 1
+        return smtp
+
+
+class SmtpPool:
+    """按 SMTP 服务器划分的 aiosmtplib 连接池"""
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        idle_timeout: float = None,
+        max_messages: int = None,
+        timeout: float = None,
+    ):
+        self.max_connections = max_connections or settings.notify.smtp_max_connections
+        self.idle_timeout = idle_timeout or settings.notify.smtp_idle_timeout
+        self.max_messages = max_messages or settings.notify.smtp_max_messages
+        self.timeout = timeout or settings.notify.timeout
+        self._pools: Dict[tuple, _ServerPool] = {}
+        self._closing = set()  # 后台关闭中的连接任务
+
+    @staticmethod
+    def key(config: Dict) -> tuple:
+        """连接标识: 相同标识的邮件共用连接, 可在同一连接上批量发送"""
+        return (
+            config.get("smtp_host", "localhost"),
+            config.get("smtp_port", 25),
+            config.get("username"),
+            config.get("password"),
+            bool(config.get("use_tls")),
+        )
+
+    def _pool(self, config: Dict) -> _ServerPool:
+        key = self.key(config)
+        pool = self._pools.get(key)
+        if pool is None:
+            options = {
+                "hostname": key[0],
+                "port": key[1],
+                "timeout": self.timeout,
+                "use_tls": key[4],
+                # None 表示服务器支持时自动 STARTTLS
+                "start_tls": config.get("start_tls"),
+            }
+            if key[3]:
+                # 提供账号时 connect() 完成后自动登录
+                options.update(username=key[2], password=key[3])
+            pool = self._pools[key] = _ServerPool(options, self.max_connections)
+        return pool
+
+    async def _acquire(self, pool: _ServerPool) -> Tuple[aiosmtplib.SMTP, int]:
+        now = time.monotonic()
+        while pool.idle:
+            smtp, last_used, sent = pool.idle.pop()
+            if smtp.is_connected and now - last_used < self.idle_timeout:
+                return smtp, sent
+            await self._close(smtp)
+        return await pool.connect(), 0
+
+    def _release(self, pool: _ServerPool, smtp: aiosmtplib.SMTP, sent: int):
+        if smtp.is_connected and sent < self.max_messages:
+            pool.idle.append((smtp, time.monotonic(), sent))
+        else:
+            task = asyncio.get_running_loop().create_task(self._close(smtp))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError):
+            smtp.close()
+
+    async def send_many(self, config: Dict, messages: List[Message]) -> List[Optional[Exception]]:
+        """在同一连接上发送一批邮件, 返回与 messages 对应的异常 (成功为 None)"""
+        pool = self._pool(config)
+        results: List[Optional[Exception]] = []
+        async with pool.slots:
+            try:
+                smtp, sent = await self._acquire(pool)
+            except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"SMTP 连接失败 {pool.options['hostname']}:{pool.options['port']}: {e}")
+                return [e] * len(messages)
+
+            try:
+                for message in messages:
+                    if sent >= self.max_messages:
+                        # 达到单连接上限, 换新连接继续
+                        await self._close(smtp)
+                        smtp, sent = await pool.connect(), 0
+                    try:
+                        await smtp.send_message(message)
+                        results.append(None)
+                    except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException) as e:
+                        # 单封被拒, 连接仍可用
+                        results.append(e)
+                    sent += 1
+            except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                # 连接断开 / 超时, 本批剩余邮件交由调用方重试
+                logger.warning(f"SMTP 连接中断 {pool.options['hostname']}:{pool.options['port']}: {e}")
+                smtp.close()
+                results.extend([e] * (len(messages) - len(results)))
+            self._release(pool, smtp, sent)
+        return results
+
+    async def send(self, config: Dict, message: Message):
+        """发送一封邮件, 失败时抛出异常"""
+        error = (await self.send_many(config, [message]))[0]
+        if error is not None:
+            raise error
+
+    def stats(self) -> Dict:
+        return {
+            "servers": len(self._pools),
+            "connections_opened": sum(pool.connections for pool in self._pools.values()),
+            "idle": sum(len(pool.idle) for pool in self._pools.values()),
+        }
+
+    async def close(self):
+        pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            while pool.idle:
+                await self._close(pool.idle.pop()[0])
+        await asyncio.gather(*self._closing, return_exceptions=True)
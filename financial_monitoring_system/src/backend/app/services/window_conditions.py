@@ -0,0 +1,169 @@
+"""
+滚动窗口条件: 变化率 (change_rate) 与趋势 (trend)
+
+condition_config:
+    change_rate: {"periods": 1, "threshold": 5, "direction": "both"}
+        最新值相对 periods 个周期前的变化百分比, direction 为 up (涨幅 >= threshold)、
+        down (跌幅 >= threshold) 或 both (绝对变化 >= threshold); 基准值为 0 时不触发
+    trend: {"consecutive": 3, "direction": "up"}
+        最近 consecutive 个周期连续上涨 / 下跌 (需要 consecutive + 1 个点)
+
+评估时按 (条件类型, 窗口长度) 分组, 同组规则涉及的指标窗口拼成一个矩阵一次计算,
+各指标窗口取自指标内存缓存, 由调用方一次性准备, 新增此类规则不会增加查询次数。
+配置在规则保存时经 validate_window 校验; 评估时配置不合法的规则被剔除, 不影响同批其他规则。
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+
+WINDOW_CONDITIONS = ("change_rate", "trend")
+DIRECTIONS = {"up": 0, "down": 1, "both": 2}
+# 条件类型 -> (窗口参数名, 默认值)
+WINDOW_PARAMS = {"change_rate": ("periods", 1), "trend": ("consecutive", 3)}
+
+
+class WindowConfigError(ValueError):
+    """窗口条件配置不合法"""
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and bool(np.isfinite(value))
+
+
+def validate_window(condition_type: str, config: Dict):
+    """校验 change_rate / trend 配置, 不合法时抛出 WindowConfigError"""
+    if config is not None and not isinstance(config, dict):
+        raise WindowConfigError("condition_config 须为对象")
+    config = config or {}
+    name, default = WINDOW_PARAMS[condition_type]
+    periods = config.get(name, default)
+    if not isinstance(periods, int) or isinstance(periods, bool) or periods < 1:
+        raise WindowConfigError(f"{name} 须为正整数: {periods!r}")
+    capacity = settings.metric_store.capacity
+    if periods + 1 > capacity:
+        raise WindowConfigError(f"{name} 不能超过指标缓存容量 {capacity - 1}: {periods}")
+    if condition_type == "change_rate" and not _is_number(config.get("threshold", 0)):
+        raise WindowConfigError(f"threshold 须为数值: {config.get('threshold')!r}")
+    direction = config.get("direction")
+    if direction is not None and direction not in DIRECTIONS:
+        raise WindowConfigError(f"direction 须为 {'/'.join(DIRECTIONS)}: {direction!r}")
+
+
+def window_length(condition_type: str, config: Dict) -> int:
+    """规则需要的数据点数"""
+    if condition_type == "change_rate":
+        return max(int(config.get("periods", 1)), 1) + 1
+    if condition_type == "trend":
+        return max(int(config.get("consecutive", 3)), 1) + 1
+    return 1
+
+
+def evaluate_windows(rules, windows: Dict[str, np.ndarray]) -> Dict[int, Tuple[bool, Optional[float]]]:
+    """
+    批量评估窗口规则
+
+    rules: change_rate / trend 规则
+    windows: {metric_code: 最近若干个点的数值 (时间升序)}, 长度不少于各规则窗口长度
+    返回 {rule.id: (是否触发, 阈值)}, 数据点不足的规则不触发
+    """
+    groups = defaultdict(list)
+    for rule in rules:
+        config = rule.condition_config or {}
+        groups[(rule.condition_type, window_length(rule.condition_type, config))].append(rule)
+
+    results = {}
+    for (condition_type, length), group in groups.items():
+        codes = sorted({rule.metric_code for rule in group
+                        if rule.metric_code in windows and len(windows[rule.metric_code]) >= length})
+        for rule in group:
+            results[rule.id] = (False, None)
+        if not codes:
+            continue
+
+        rows = {code: row for row, code in enumerate(codes)}
+        matrix = np.stack([windows[code][-length:] for code in codes])
+        group = [rule for rule in group if rule.metric_code in rows]
+        index = np.fromiter((rows[rule.metric_code] for rule in group), dtype=np.intp, count=len(group))
+        configs = [rule.condition_config or {} for rule in group]
+
+        if condition_type == "change_rate":
+            default_direction = "both"
+            thresholds = np.fromiter((float(c.get("threshold", 0)) for c in configs), dtype=np.float64, count=len(group))
+        else:
+            default_direction = "up"
+            thresholds = None
+        directions = np.fromiter(
+            (DIRECTIONS.get(c.get("direction", default_direction), DIRECTIONS[default_direction]) for c in configs),
+            dtype=np.int8, count=len(group),
+        )
+
+        if condition_type == "change_rate":
+            triggered = _change_rate(matrix, index, thresholds, directions)
+        else:
+            triggered = _trend(matrix, index, directions)
+
+        for i, rule in enumerate(group):
+            threshold = float(thresholds[i]) if thresholds is not None else None
+            results[rule.id] = (bool(triggered[i]), threshold)
+    return results
+
+
+def _change_rate(matrix: np.ndarray, index: np.ndarray, thresholds: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    base, last = matrix[:, 0], matrix[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(base != 0, (last - base) / np.abs(base) * 100, np.nan)[index]
+    # NaN 参与比较恒为 False
+    return (
+        ((directions == DIRECTIONS["up"]) & (rates >= thresholds))
+        | ((directions == DIRECTIONS["down"]) & (rates <= -thresholds))
+        | ((directions == DIRECTIONS["both"]) & (np.abs(rates) >= thresholds))
+    )
+
+
+def _trend(matrix: np.ndarray, index: np.ndarray, directions: np.ndarray) -> np.ndarray:
+    diffs = np.diff(matrix, axis=1)
+    rising = (diffs > 0).all(axis=1)[index]
+    falling = (diffs < 0).all(axis=1)[index]
+    return np.where(directions == DIRECTIONS["down"], falling, rising)
+
+
+def evaluate_window(condition_type: str, config: Dict, values: np.ndarray) -> Tuple[bool, Optional[float]]:
+    """评估单条窗口规则 (与批量评估共用同一套计算), 配置不合法时抛出 WindowConfigError"""
+    validate_window(condition_type, config)
+    config = config or {}
+    length = window_length(condition_type, config)
+    if values is None or len(values) < length:
+        return False, None
+    matrix = np.asarray(values, dtype=np.float64)[-length:].reshape(1, length)
+    index = np.zeros(1, dtype=np.intp)
+    if condition_type == "change_rate":
+        threshold = float(config.get("threshold", 0))
+        direction = DIRECTIONS.get(config.get("direction", "both"), DIRECTIONS["both"])
+        triggered = _change_rate(matrix, index, np.array([threshold]), np.array([direction], dtype=np.int8))
+        return bool(triggered[0]), threshold
+    direction = DIRECTIONS.get(config.get("direction", "up"), DIRECTIONS["up"])
+    triggered = _trend(matrix, index, np.array([direction], dtype=np.int8))
+    return bool(triggered[0]), None
+
+
+def rule_windows(rules: List) -> Tuple[List, int]:
+    """筛出配置合法的窗口规则, 并返回其中最长的窗口长度"""
+    window_rules = []
+    for rule in rules:
+        if rule.condition_type not in WINDOW_CONDITIONS:
+            continue
+        try:
+            validate_window(rule.condition_type, rule.condition_config)
+        except WindowConfigError as e:
+            logger.error(f"规则 {rule.code} 条件配置错误, 跳过: {e}")
+            continue
+        window_rules.append(rule)
+    longest = max(
+        (window_length(rule.condition_type, rule.condition_config or {}) for rule in window_rules),
+        default=0,
+    )
+    return window_rules, longest
@@ -0,0 +1,57 @@
+"""
+测试公共配置
+
+app.database 在导入时按 settings 创建引擎; 测试改用内存 SQLite,
+在导入 app.models 之前注册替代的 app.database 模块。
+"""
+import sys
+import types
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+engine = create_async_engine(
+    "sqlite+aiosqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+)
+session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def get_db_context():
+    async with session_factory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+database = types.ModuleType("app.database")
+database.Base = declarative_base()
+database.async_engine = engine
+database.async_session_factory = session_factory
+database.get_db_context = get_db_context
+sys.modules["app.database"] = database
+
+import app  # noqa: E402
+
+app.database = database
+
+
+@pytest_asyncio.fixture
+async def db():
+    """每个测试一个空库"""
+    from app import models  # noqa: F401
+
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.drop_all)
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,231 @@
+"""
+告警状态机测试
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from app.models import AlertRecord, AlertRule, AlertState, MetricDefinition
+from app.services.alert_engine import AlertEngine
+from app.services.alert_state import AlertStateManager
+
+T0 = datetime(2024, 1, 2, 9, 30)
+
+
+@pytest_asyncio.fixture
+async def states():
+    return AlertStateManager()
+
+
+async def add_rules(db, *configs, metric_code="M1"):
+    if not await db.scalar(select(MetricDefinition.id).where(MetricDefinition.code == metric_code)):
+        db.add(MetricDefinition(code=metric_code, name=metric_code))
+    rules = [
+        AlertRule(
+            code=f"R{metric_code}{i}", name=f"规则{i}", metric_code=metric_code, condition_type="threshold",
+            condition_config={"operator": ">", "threshold": 100, **config},
+            severity="P3", cooldown_minutes=10, enabled=True,
+        )
+        for i, config in enumerate(configs)
+    ]
+    db.add_all(rules)
+    await db.commit()
+    return rules
+
+
+async def step(states, db, rules, value, now):
+    """评估一轮 (与 AlertEngine.process_rules 相同的提交方式), 返回通知数"""
+    engine = AlertEngine()
+    results = {}
+    for rule in rules:
+        triggered, threshold = engine.evaluate_condition(value, rule.condition_type, rule.condition_config)
+        results[rule.id] = (triggered, value, threshold)
+    notifications = await states.apply(db, engine, rules, results, now)
+    await db.commit()
+    states.release(db)
+    return len(notifications)
+
+
+async def records(db):
+    return (await db.execute(select(AlertRecord).order_by(AlertRecord.id))).scalars().all()
+
+
+def state_of(states, rule):
+    return states._states[(rule.id, rule.metric_code)].state
+
+
+@pytest.mark.asyncio
+async def test_pending_firing_resolved(db, states):
+    rule, = await add_rules(db, {"for_seconds": 300})
+
+    assert await step(states, db, [rule], 101, T0) == 0
+    assert state_of(states, rule) == "pending"
+    assert await step(states, db, [rule], 102, T0 + timedelta(minutes=2)) == 0
+    assert await records(db) == []
+
+    assert await step(states, db, [rule], 103, T0 + timedelta(minutes=5)) == 1
+    assert state_of(states, rule) == "firing"
+    record, = await records(db)
+    assert record.status == "active"
+
+    # firing 期间不重复通知
+    assert await step(states, db, [rule], 104, T0 + timedelta(minutes=6)) == 0
+    await step(states, db, [rule], 90, T0 + timedelta(minutes=7))
+    assert state_of(states, rule) == "resolved"
+    await db.refresh(record)
+    assert record.status == "resolved"
+
+
+@pytest.mark.asyncio
+async def test_pending_cancelled_before_for_seconds(db, states):
+    rule, = await add_rules(db, {"for_seconds": 300})
+    await step(states, db, [rule], 101, T0)
+    await step(states, db, [rule], 99, T0 + timedelta(minutes=1))
+    assert state_of(states, rule) == "inactive"
+    await step(states, db, [rule], 101, T0 + timedelta(minutes=5))
+    assert state_of(states, rule) == "pending"
+    assert await records(db) == []
+
+
+@pytest.mark.asyncio
+async def test_clear_threshold(db, states):
+    rule, = await add_rules(db, {"clear_threshold": 95})
+    await step(states, db, [rule], 101, T0)
+    assert state_of(states, rule) == "firing"
+    # 低于告警阈值但未低于恢复阈值, 保持 firing
+    await step(states, db, [rule], 97, T0 + timedelta(minutes=1))
+    assert state_of(states, rule) == "firing"
+    await step(states, db, [rule], 94, T0 + timedelta(minutes=2))
+    assert state_of(states, rule) == "resolved"
+
+
+@pytest.mark.asyncio
+async def test_reopen_within_cooldown(db, states):
+    rule, = await add_rules(db, {})
+    await step(states, db, [rule], 101, T0)
+    await step(states, db, [rule], 90, T0 + timedelta(minutes=1))
+    assert await step(states, db, [rule], 101, T0 + timedelta(minutes=2)) == 1
+    record, = await records(db)
+    assert record.status == "active"
+
+
+@pytest.mark.asyncio
+async def test_flap_enter_and_exit(db, states):
+    rule, = await add_rules(db, {"flap_threshold": 4, "flap_window_minutes": 10})
+    values = [101, 90, 101, 90]
+    for i, value in enumerate(values):
+        await step(states, db, [rule], value, T0 + timedelta(minutes=i))
+    state = states._states[(rule.id, rule.metric_code)]
+    assert state.flapping
+    assert states.stats["suppressed"] == 1
+    # 抖动期间不新建 / 恢复记录
+    for i in range(4, 8):
+        assert await step(states, db, [rule], 101 if i % 2 == 0 else 90, T0 + timedelta(minutes=i)) == 0
+    assert len(await records(db)) == 1
+
+    # 窗口内切换减少后退出抖动, 按当前状态 (firing) 补齐记录
+    assert await step(states, db, [rule], 101, T0 + timedelta(minutes=20)) == 1
+    assert not state.flapping
+    record, = await records(db)
+    assert record.status == "active"
+
+
+@pytest.mark.asyncio
+async def test_group_resolves_when_all_members_clear(db, states):
+    first, second = await add_rules(db, {}, {"threshold": 105})
+    await step(states, db, [first, second], 110, T0)
+    record, = await records(db)
+    assert "关联" in record.message
+    assert states.stats["records_grouped"] == 1
+
+    # 只有一条规则恢复时记录保持 active
+    await step(states, db, [first, second], 103, T0 + timedelta(minutes=1))
+    await db.refresh(record)
+    assert record.status == "active"
+    await step(states, db, [first, second], 90, T0 + timedelta(minutes=2))
+    await db.refresh(record)
+    assert record.status == "resolved"
+
+
+@pytest.mark.asyncio
+async def test_disabled_rule_does_not_block_group(db, states):
+    """停用规则的 firing 状态被清理, 不再阻止同组记录恢复"""
+    first, second = await add_rules(db, {}, {"threshold": 105})
+    await step(states, db, [first, second], 110, T0)
+    record, = await records(db)
+
+    # 第二条规则被禁用, 定时全量检查只剩第一条
+    second.enabled = False
+    await states.prune(db, [first], T0 + timedelta(minutes=1))
+    await db.commit()
+    states.release(db)
+    assert (second.id, second.metric_code) not in states._states
+    assert await db.scalar(select(func.count(AlertState.id)).where(AlertState.rule_id == second.id)) == 0
+    await db.refresh(record)
+    assert record.status == "active"
+
+    await step(states, db, [first], 90, T0 + timedelta(minutes=2))
+    await db.refresh(record)
+    assert record.status == "resolved"
+
+
+@pytest.mark.asyncio
+async def test_retire_resolves_orphaned_record(db, states):
+    rule, = await add_rules(db, {})
+    await step(states, db, [rule], 110, T0)
+    await states.retire(db, states.rule_keys(rule.id))
+    await db.commit()
+    record, = await records(db)
+    assert record.status == "resolved"
+    assert states.snapshot()["states"] == {}
+
+
+@pytest.mark.asyncio
+async def test_stale_state_resolved(db, states):
+    rule, = await add_rules(db, {"stale_minutes": 30})
+    await step(states, db, [rule], 110, T0)
+    await states.prune(db, [rule], T0 + timedelta(minutes=10))
+    assert state_of(states, rule) == "firing"
+    # 指标 30 分钟以上无数据
+    await states.prune(db, [rule], T0 + timedelta(minutes=31))
+    await db.commit()
+    assert state_of(states, rule) == "resolved"
+    record, = await records(db)
+    assert record.status == "resolved"
+
+
+@pytest.mark.asyncio
+async def test_oscillating_metric_write_volume(db, states):
+    """
+    指标在阈值附近反复波动 240 个周期 (其中一次重启), 原冷却期逻辑产生 76 条告警记录,
+    状态机只产生 2 条 (滞回规则与其分组各一条), 状态表每个规则只有一行
+    """
+    rules = await add_rules(
+        db,
+        {"clear_threshold": 95},
+        {"group": "g2"},
+        {"threshold": 99, "clear_threshold": 90},
+        {"threshold": 99, "for_seconds": 300},
+    )
+    engine = AlertEngine()
+    rng = random.Random(1)
+    cooldown_records, last_alert = 0, {}
+    for i in range(240):
+        now = T0 + timedelta(minutes=i)
+        value = 100 + rng.uniform(-1.5, 1.5) if i < 200 else 80
+        for rule in rules:
+            triggered, _ = engine.evaluate_condition(value, rule.condition_type, rule.condition_config)
+            if triggered and (rule.id not in last_alert or now - last_alert[rule.id] >= timedelta(minutes=10)):
+                cooldown_records += 1
+                last_alert[rule.id] = now
+        await step(states, db, rules, value, now)
+        if i == 120:
+            states.discard()  # 模拟重启, 从 alert_state 重新加载
+
+    assert cooldown_records == 76
+    assert len(await records(db)) == 2
+    assert all(record.status == "resolved" for record in await records(db))
+    assert await db.scalar(select(func.count(AlertState.id))) == len(rules)
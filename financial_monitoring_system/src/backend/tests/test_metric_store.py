@@ -0,0 +1,51 @@
+"""
+指标内存缓存测试
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.metric_store import MetricStore
+
+
+async def add_points(db, codes, count=3):
+    from app.models import MetricData, MetricDefinition
+
+    start = datetime(2024, 1, 2, 9, 30)
+    for code in codes:
+        db.add(MetricDefinition(code=code, name=code))
+        for i in range(count):
+            db.add(MetricData(metric_code=code, data_time=start + timedelta(minutes=i), value=float(i)))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_load_keeps_requested_metrics_beyond_capacity(db, caplog):
+    """单次请求涉及的指标超过 max_metrics 时不淘汰本次加载的指标"""
+    codes = [f"M{i}" for i in range(5)]
+    await add_points(db, codes)
+    store = MetricStore(capacity=10, max_metrics=3)
+
+    await store.ensure(db, codes)
+    assert len(store) == 5
+    assert set(store.latest_many(codes)) == set(codes)
+
+    # 下一次请求回源时淘汰上一批中最久未访问的指标
+    await add_points(db, ["N0"])
+    await store.ensure(db, ["N0", "M4"])
+    assert len(store) == 3
+    assert "N0" in store and "M4" in store
+
+
+@pytest.mark.asyncio
+async def test_ensure_pins_cached_metrics(db):
+    """回源时不淘汰本次请求中已缓存的指标"""
+    await add_points(db, ["A", "B", "C"])
+    store = MetricStore(capacity=10, max_metrics=2)
+    await store.ensure(db, ["A"])
+    await store.ensure(db, ["B"])
+
+    # A 最久未访问, 但属于本次请求
+    await store.ensure(db, ["A", "C"])
+    assert "A" in store and "C" in store and "B" not in store
+    assert store.latest("A").value == 2.0
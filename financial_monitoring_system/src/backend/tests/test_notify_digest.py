@@ -0,0 +1,72 @@
+"""
+告警汇总测试
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.config import settings
+from app.services.notify_digest import DigestItem, NotifyDigest
+
+
+class FakeDispatcher:
+    """记录提交的通知, accept=False 时模拟队列已满"""
+
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.submitted = []
+
+    def submit(self, channel_type, config, title, content, level="info"):
+        if self.accept:
+            self.submitted.append((channel_type, title, level))
+        return self.accept
+
+
+@pytest.fixture(autouse=True)
+def digest_settings(monkeypatch):
+    monkeypatch.setattr(settings.notify, "digest_enabled", True)
+    monkeypatch.setattr(settings.notify, "digest_window_seconds", 0.05)
+    monkeypatch.setattr(settings.notify, "digest_max_items", 10)
+    monkeypatch.setattr(settings.notify, "digest_immediate_severities", ["P1"])
+
+
+def add(digest, i, severity="P3"):
+    return digest.add("webhook", {"url": "http://hook"}, f"告警 {i}", f"告警 {i}\n当前值: {i}", "warning", severity)
+
+
+@pytest.mark.asyncio
+async def test_window_merges_alerts():
+    dispatcher = FakeDispatcher()
+    digest = NotifyDigest(dispatcher)
+    for i in range(3):
+        assert add(digest, i)
+    assert add(digest, 3, "P1")
+    assert dispatcher.submitted == [("webhook", "告警 3", "warning")]
+
+    await asyncio.sleep(0.1)
+    assert dispatcher.submitted[1] == ("webhook", "告警汇总: 3 条告警", "warning")
+    assert digest.snapshot() == {
+        "received": 4, "immediate": 1, "digests_sent": 1, "items_digested": 3, "dropped": 0, "buffered": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_rejected_submit_counted_as_dropped():
+    digest = NotifyDigest(FakeDispatcher(accept=False))
+    assert not add(digest, 0, "P1")
+    for i in range(1, 4):
+        add(digest, i)
+    digest.flush_all()
+    digest.add("email", {"to_addresses": ["ops@example.com"]}, "告警 9", "告警 9", "warning", "P3")
+    digest.flush_all()
+
+    assert digest.stats["dropped"] == 5
+    assert digest.stats["digests_sent"] == 0
+    assert digest.stats["items_digested"] == 0
+
+
+def test_received_at_is_utc():
+    before = datetime.utcnow()
+    item = DigestItem("告警", "内容", "info", "P3")
+    assert before <= item.received_at <= datetime.utcnow()
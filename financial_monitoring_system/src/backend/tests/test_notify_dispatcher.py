@@ -0,0 +1,103 @@
+"""
+通知分发器测试
+"""
+import pytest
+
+from app.config import settings
+from app.services.notify_dispatcher import NotifyDispatcher
+
+
+class FakeService:
+    """按标题控制失败次数的通知服务"""
+
+    BATCH_CHANNELS = {"email"}
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.delivered = []
+        self.closed = False
+
+    def target(self, channel_type, config):
+        return config.get("url")
+
+    def batch_key(self, channel_type, config):
+        return (config.get("url"),)
+
+    async def deliver(self, channel_type, config, title, content, level):
+        if self.failures.get(title, 0):
+            self.failures[title] -= 1
+            raise RuntimeError(f"发送失败: {title}")
+        self.delivered.append(title)
+
+    async def deliver_batch(self, channel_type, messages):
+        errors = []
+        for config, title, content, level in messages:
+            try:
+                await self.deliver(channel_type, config, title, content, level)
+                errors.append(None)
+            except RuntimeError as e:
+                errors.append(e)
+        return errors
+
+    def stats(self):
+        return {"http": {"hosts": 0}}
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(settings.notify, "retry_base_delay", 0.01)
+    monkeypatch.setattr(settings.notify, "max_retry_times", 3)
+    monkeypatch.setattr(settings.notify, "rate_limits", {})
+
+
+@pytest.mark.asyncio
+async def test_join_waits_for_retries():
+    service = FakeService({"A": 2, "B": 5})
+    dispatcher = NotifyDispatcher(service)
+    dispatcher.start()
+    for title in ("A", "B", "C"):
+        assert dispatcher.submit("webhook", {"url": "http://hook"}, title, "content")
+
+    await dispatcher.join(timeout=5)
+    assert sorted(service.delivered) == ["A", "C"]
+    assert dispatcher.stats["sent"] == 2
+    assert dispatcher.stats["failed"] == 1
+    assert dispatcher.stats["retried"] == 4
+
+    snapshot = dispatcher.snapshot()
+    assert snapshot["outstanding"] == 0
+    assert snapshot["pending"] == 0
+    assert snapshot["connections"] == {"http": {"hosts": 0}}
+
+    await dispatcher.stop()
+    assert service.closed
+
+
+@pytest.mark.asyncio
+async def test_join_after_batch_delivery():
+    service = FakeService({"m1": 1})
+    dispatcher = NotifyDispatcher(service)
+    dispatcher.start()
+    for i in range(5):
+        dispatcher.submit("email", {"url": "smtp"}, f"m{i}", "content")
+
+    await dispatcher.join(timeout=5)
+    assert sorted(service.delivered) == [f"m{i}" for i in range(5)]
+    assert dispatcher.stats["sent"] == 5
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_counts_unsent_as_dropped():
+    dispatcher = NotifyDispatcher(FakeService({"A": 5}))
+    dispatcher.start()
+    dispatcher.submit("webhook", {"url": "http://hook"}, "A", "content")
+
+    await dispatcher.stop(timeout=0)
+    assert dispatcher.stats["dropped"] == 1
+    assert dispatcher.snapshot()["outstanding"] == 0
+    await dispatcher.join(timeout=1)
+    assert not dispatcher.submit("webhook", {"url": "http://hook"}, "B", "content")
@@ -0,0 +1,86 @@
+"""
+规则编译测试
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.services.metric_store import MetricStore
+from app.services.rule_compiler import EvalContext, RuleSyntaxError, compile_expression
+
+
+@pytest.mark.parametrize("expression", [
+    "value.__class__",
+    "value.real > 0",
+    "metric('A').__class__.__bases__",
+    "().__class__",
+    "[value][0] > 1",
+    "value[0] > 1",
+    "value ** 2 > 10",
+    "(lambda: 1)() > 0",
+    "open('/etc/passwd')",
+    "__import__('os')",
+    "eval('1') > 0",
+    "avg(n=5) > 0",
+    "avg(value) > 0",
+    "metric(CODE) > 0",
+    "avg(5, 'A' + 'B') > 0",
+    "'text'",
+    "True",
+    "x > 1",
+    "value if value else 0",
+])
+def test_unsafe_or_unknown_expression_rejected(expression):
+    with pytest.raises(RuleSyntaxError):
+        compile_expression(expression, "M1")
+
+
+def test_window_longer_than_store_rejected():
+    capacity = settings.metric_store.capacity
+    compile_expression(f"avg({capacity}) > 0", "M1")
+    with pytest.raises(RuleSyntaxError):
+        compile_expression(f"avg({capacity + 1}) > 0", "M1")
+    # 周期函数需要 n + 1 个点
+    with pytest.raises(RuleSyntaxError):
+        compile_expression(f"change_rate({capacity}) > 0", "M1")
+
+
+def test_window_without_metric_code_rejected():
+    with pytest.raises(RuleSyntaxError):
+        compile_expression("avg(3) > 0")
+    compile_expression("avg(3, 'M1') > 0")
+
+
+def test_expression_evaluates():
+    store = MetricStore(capacity=10, max_metrics=10)
+    start = datetime(2024, 1, 2, 9, 30)
+    for i, value in enumerate([100.0, 102.0, 110.0]):
+        store.append("M1", start + timedelta(minutes=i), value)
+    store.append("NAV_DIFF", start, 0.2)
+
+    compiled = compile_expression("value > 100 AND (change_rate(2) > 5 OR metric('NAV_DIFF') < 0.5)", "M1")
+    assert compiled.metrics == {"NAV_DIFF"}
+    assert compiled.window_metrics == {"M1"}
+    assert compiled.window == 3
+    assert compiled.evaluate(EvalContext(store).bind("M1", 110.0)) == (True, None)
+    assert compiled.evaluate(EvalContext(store).bind("M1", 90.0)) == (False, None)
+    # 引用的指标无数据时不触发
+    missing = compile_expression("metric('NONE') > 0", "M1")
+    assert missing.evaluate(EvalContext(store).bind("M1", 1.0)) == (False, None)
+
+
+def test_evaluate_condition_uses_rule_metric():
+    """不经编译缓存评估时, 省略指标编码的窗口函数读取本规则指标"""
+    from app.services.alert_engine import AlertEngine
+    from app.services.metric_store import metric_store
+
+    start = datetime(2024, 1, 2, 9, 30)
+    for i, value in enumerate([1.0, 2.0, 3.0]):
+        metric_store.append("EVAL_M1", start + timedelta(minutes=i), value)
+    try:
+        config = {"expression": "avg(3) >= 2"}
+        assert AlertEngine().evaluate_condition(3.0, "combine", config, metric_code="EVAL_M1") == (True, None)
+        assert AlertEngine().evaluate_condition(3.0, "combine", config) == (False, None)
+    finally:
+        metric_store.invalidate("EVAL_M1")
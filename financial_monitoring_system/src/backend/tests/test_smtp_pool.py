@@ -0,0 +1,144 @@
+"""
+SMTP 连接池测试 (aiosmtpd 模拟服务)
+"""
+import socket
+from email.mime.text import MIMEText
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.services.notify_service import NotifyService
+from app.services.smtp_pool import SmtpPool
+
+
+class RecordingHandler:
+    """记录收到的邮件; 拒绝 nobody@, 收到发往 disconnect@ 的邮件时断开连接"""
+
+    def __init__(self):
+        self.messages = []  # (客户端地址, 发件人, 收件人)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("nobody@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if any(address.startswith("disconnect@") for address in envelope.rcpt_tos):
+            server.transport.close()
+            return "250 OK"
+        self.messages.append((session.peer, envelope.mail_from, list(envelope.rcpt_tos)))
+        return "250 Message accepted for delivery"
+
+    @property
+    def connections(self) -> int:
+        return len({peer for peer, _, _ in self.messages})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    controller = Controller(RecordingHandler(), hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+def smtp_config(server, **extra):
+    return {"smtp_host": server.hostname, "smtp_port": server.port, "start_tls": False, **extra}
+
+
+def email(to: str, subject: str = "告警") -> MIMEText:
+    msg = MIMEText("content", "plain", "utf-8")
+    msg["Subject"] = subject
+    msg["From"] = "monitor@example.com"
+    msg["To"] = to
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_connection_reused(server):
+    pool = SmtpPool(max_connections=2, idle_timeout=60, max_messages=100, timeout=5)
+    config = smtp_config(server)
+    for i in range(3):
+        await pool.send(config, email(f"user{i}@example.com"))
+    assert await pool.send_many(config, [email("a@example.com"), email("b@example.com")]) == [None, None]
+
+    assert len(server.handler.messages) == 5
+    assert server.handler.connections == 1
+    assert pool.stats() == {"servers": 1, "connections_opened": 1, "idle": 1}
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_max_messages_rollover(server):
+    pool = SmtpPool(max_connections=1, idle_timeout=60, max_messages=2, timeout=5)
+    results = await pool.send_many(smtp_config(server), [email(f"user{i}@example.com") for i in range(5)])
+
+    assert results == [None] * 5
+    assert len(server.handler.messages) == 5
+    assert server.handler.connections == 3
+    assert pool.stats()["connections_opened"] == 3
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_refused_recipient_does_not_fail_batch(server):
+    pool = SmtpPool(max_connections=1, idle_timeout=60, max_messages=100, timeout=5)
+    messages = [email("a@example.com"), email("nobody@example.com"), email("b@example.com")]
+    results = await pool.send_many(smtp_config(server), messages)
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], aiosmtplib.SMTPRecipientsRefused)
+    assert [rcpt for _, _, rcpt in server.handler.messages] == [["a@example.com"], ["b@example.com"]]
+    assert server.handler.connections == 1
+    assert pool.stats()["idle"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_fails_remaining(server):
+    pool = SmtpPool(max_connections=1, idle_timeout=60, max_messages=100, timeout=5)
+    config = smtp_config(server)
+    messages = [email("a@example.com"), email("disconnect@example.com"), email("b@example.com"), email("c@example.com")]
+    results = await pool.send_many(config, messages)
+
+    assert results[0] is None
+    assert all(isinstance(error, aiosmtplib.SMTPException) for error in results[1:])
+    assert len(server.handler.messages) == 1
+    assert pool.stats()["idle"] == 0
+
+    # 断开的连接不再复用, 重试时新建连接
+    assert await pool.send_many(config, messages[2:]) == [None, None]
+    assert server.handler.connections == 2
+    assert pool.stats()["connections_opened"] == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_uses_each_job_config(server):
+    service = NotifyService(smtp=SmtpPool(max_connections=1, idle_timeout=60, max_messages=100, timeout=5))
+    configs = [
+        smtp_config(server, to_addresses=["ops@example.com"], from_address="monitor@example.com"),
+        smtp_config(server, to_addresses=["risk@example.com", "cto@example.com"], from_address="risk@example.com"),
+        smtp_config(server, to_addresses=[]),
+    ]
+    # 收件人不同: 分别限流, 但共用同一 SMTP 连接批量发送
+    assert service.target("email", configs[0]) != service.target("email", configs[1])
+    assert len({service.batch_key("email", config) for config in configs}) == 1
+
+    errors = await service.deliver_batch("email", [(config, "告警", "内容", "error") for config in configs])
+    assert errors[:2] == [None, None]
+    assert isinstance(errors[2], ValueError)
+    assert [(sender, rcpt) for _, sender, rcpt in server.handler.messages] == [
+        ("monitor@example.com", ["ops@example.com"]),
+        ("risk@example.com", ["risk@example.com", "cto@example.com"]),
+    ]
+    assert server.handler.connections == 1
+    await service.close()
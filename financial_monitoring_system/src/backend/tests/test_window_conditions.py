@@ -0,0 +1,50 @@
+"""
+窗口条件测试
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.window_conditions import (
+    WindowConfigError, evaluate_windows, rule_windows, validate_window,
+)
+
+
+def make_rule(rule_id, condition_type, config, metric_code="M1"):
+    return SimpleNamespace(
+        id=rule_id, code=f"R{rule_id}", metric_code=metric_code,
+        condition_type=condition_type, condition_config=config,
+    )
+
+
+@pytest.mark.parametrize("condition_type, config", [
+    ("change_rate", {"periods": "1h", "threshold": 5}),
+    ("change_rate", {"periods": 0}),
+    ("change_rate", {"periods": 1, "threshold": "5%"}),
+    ("change_rate", {"periods": 1, "direction": "sideways"}),
+    ("change_rate", {"periods": 100000}),
+    ("trend", {"consecutive": 2.5}),
+    ("trend", {"consecutive": True}),
+    ("trend", ["up"]),
+])
+def test_invalid_config_rejected(condition_type, config):
+    with pytest.raises(WindowConfigError):
+        validate_window(condition_type, config)
+
+
+def test_valid_config_accepted():
+    validate_window("change_rate", {"periods": 5, "threshold": 2.5, "direction": "down", "for_seconds": 60})
+    validate_window("trend", None)
+
+
+def test_bad_rule_excluded_from_batch():
+    """配置错误的规则被剔除, 同批其他规则照常评估"""
+    good = make_rule(1, "trend", {"consecutive": 2})
+    bad = make_rule(2, "change_rate", {"periods": "1h", "threshold": 5})
+    window_rules, longest = rule_windows([good, bad])
+    assert window_rules == [good]
+    assert longest == 3
+
+    results = evaluate_windows(window_rules, {"M1": np.array([1.0, 2.0, 3.0])})
+    assert results == {1: (True, None)}
@@ -5,3 +5,7 @@ class RiskConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'risk'
     verbose_name = '风险监控'
+
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
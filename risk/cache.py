@@ -0,0 +1,363 @@
+"""
+风险数据缓存层
+
+视图与定时任务共用的读穿透缓存。数据集的有效性由命名空间版本号判定：
+数据写入时只需递增相关命名空间的版本，旧值即自然失效，无需逐个删除。
+后端由 settings.CACHES 决定（生产环境为 Redis，所有 worker 共享同一份缓存）。
+
+缓存项过期或失效时采用单飞（single-flight）策略：只有拿到租约的进程重新计算，
+其余请求直接返回稍旧的值；软过期前还会按 XFetch 算法概率性地提前刷新，
+避免大量请求在同一时刻集中重算。命中情况按数据集计数，可通过 get_stats() 查看。
+"""
+import logging
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# 命名空间：每个命名空间对应一类底层数据
+NS_PORTFOLIOS = 'portfolios'
+NS_INDICATORS = 'indicators'
+NS_TRADES = 'trades'
+NS_ALERTS = 'alerts'
+
+# 缓存数据集
+ACTIVE_PORTFOLIOS = 'active_portfolios'
+RISK_INDICATORS_LATEST = 'risk_indicators_latest'
+ALERT_STATISTICS = 'alert_statistics'
+RISK_DASHBOARD = 'risk_dashboard'
+
+# 数据集依赖的命名空间，任一命名空间版本变化都会使数据集失效
+DATASET_DEPENDENCIES = {
+    ACTIVE_PORTFOLIOS: (NS_PORTFOLIOS,),
+    RISK_INDICATORS_LATEST: (NS_PORTFOLIOS, NS_INDICATORS),
+    ALERT_STATISTICS: (NS_ALERTS,),
+    RISK_DASHBOARD: (NS_PORTFOLIOS, NS_INDICATORS, NS_TRADES, NS_ALERTS),
+}
+
+# 缓存策略
+#   soft_ttl: 软过期时间(秒)，过期后由持有租约的进程重算，其他请求返回旧值
+#   beta: XFetch 提前刷新系数，0 表示关闭提前刷新，越大越早刷新
+#   lease_timeout: 重算租约时长(秒)，持有者异常退出时租约到期自动释放
+#   wait_timeout: 无旧值可用时等待其他进程计算结果的最长时间(秒)
+# 硬过期时间为 settings.RISK_CACHE_TIMEOUT；可通过 settings.RISK_CACHE_POLICIES 按数据集覆盖
+DEFAULT_POLICY = {
+    'soft_ttl': 300,
+    'beta': 1.0,
+    'lease_timeout': 30,
+    'wait_timeout': 5,
+}
+DATASET_POLICIES = {
+    ACTIVE_PORTFOLIOS: {'soft_ttl': 600},
+    RISK_INDICATORS_LATEST: {'soft_ttl': 300},
+    ALERT_STATISTICS: {'soft_ttl': 60},
+    RISK_DASHBOARD: {'soft_ttl': 60},
+}
+
+# 计数项
+STAT_HIT = 'hit'            # 直接命中
+STAT_MISS = 'miss'          # 本进程重算
+STAT_COALESCE = 'coalesce'  # 由其他进程重算，本次返回旧值或等待结果
+STAT_EARLY = 'early'        # 软过期前提前刷新
+STAT_OUTCOMES = (STAT_HIT, STAT_MISS, STAT_COALESCE, STAT_EARLY)
+
+KEY_PREFIX = 'risk'
+WAIT_INTERVAL = 0.05
+
+
+def get_cache():
+    """获取风险数据使用的缓存后端"""
+    return caches[getattr(settings, 'RISK_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    """数据集缓存硬过期时间(秒)"""
+    return getattr(settings, 'RISK_CACHE_TIMEOUT', 300)
+
+
+def get_policy(dataset):
+    """合并默认策略、数据集策略与 settings 覆盖项"""
+    policy = dict(DEFAULT_POLICY)
+    policy.update(DATASET_POLICIES.get(dataset, {}))
+    policy.update(getattr(settings, 'RISK_CACHE_POLICIES', {}).get(dataset, {}))
+    return policy
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:ns:{namespace}'
+
+
+def _entry_key(dataset, parts):
+    suffix = ':'.join(str(part) for part in parts)
+    key = f'{KEY_PREFIX}:{dataset}'
+    return f'{key}:{suffix}' if suffix else key
+
+
+def _lease_key(entry_key):
+    return f'{KEY_PREFIX}:lease:{entry_key[len(KEY_PREFIX) + 1:]}'
+
+
+def _stat_key(dataset, outcome):
+    return f'{KEY_PREFIX}:stats:{dataset}:{outcome}'
+
+
+def _init_version(cache, key):
+    # 版本键丢失（首次使用或被淘汰）时用时间戳初始化，
+    # 避免回退到旧版本号而误判旧值有效
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+
+def _stamp(dataset, found):
+    """由已取回的命名空间版本计算数据集版本戳"""
+    cache = get_cache()
+    versions = []
+    for namespace in DATASET_DEPENDENCIES[dataset]:
+        key = _version_key(namespace)
+        version = found.get(key)
+        if version is None:
+            version = _init_version(cache, key)
+        versions.append(str(version))
+    return '.'.join(versions)
+
+
+def get_stamp(dataset):
+    """获取数据集当前版本戳"""
+    keys = [_version_key(ns) for ns in DATASET_DEPENDENCIES[dataset]]
+    return _stamp(dataset, get_cache().get_many(keys))
+
+
+def invalidate(*namespaces):
+    """递增命名空间版本，使依赖它们的数据集全部失效"""
+    cache = get_cache()
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+        logger.debug(f"缓存命名空间{namespace}已失效")
+
+
+def _count(dataset, outcome):
+    if not getattr(settings, 'RISK_CACHE_STATS', True):
+        return
+    cache = get_cache()
+    key = _stat_key(dataset, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats():
+    """各数据集命中/重算/合并计数（跨进程汇总）"""
+    cache = get_cache()
+    keys = {
+        (dataset, outcome): _stat_key(dataset, outcome)
+        for dataset in DATASET_DEPENDENCIES
+        for outcome in STAT_OUTCOMES
+    }
+    found = cache.get_many(list(keys.values()))
+    stats = {dataset: {} for dataset in DATASET_DEPENDENCIES}
+    for (dataset, outcome), key in keys.items():
+        stats[dataset][outcome] = found.get(key, 0)
+    return stats
+
+
+def _is_fresh(entry, stamp, policy, now):
+    if entry is None or entry['stamp'] != stamp:
+        return False
+    # XFetch：距离软过期越近、重算耗时越长，越可能提前刷新
+    beta = policy['beta']
+    if beta > 0:
+        early = entry['delta'] * beta * -math.log(1.0 - random.random())
+        return now + early < entry['soft_expires']
+    return now < entry['soft_expires']
+
+
+def _store(cache, key, stamp, value, delta, policy):
+    entry = {
+        'value': value,
+        'stamp': stamp,
+        'delta': delta,
+        'soft_expires': time.time() + policy['soft_ttl'],
+    }
+    cache.set(key, entry, max(get_timeout(), policy['soft_ttl']))
+
+
+def _compute(cache, key, stamp, builder, policy):
+    started = time.monotonic()
+    value = builder()
+    _store(cache, key, stamp, value, time.monotonic() - started, policy)
+    return value
+
+
+def get_or_set(dataset, builder, *parts):
+    """读穿透：命中则直接返回，否则由单个进程调用 builder 重算"""
+    cache = get_cache()
+    policy = get_policy(dataset)
+    key = _entry_key(dataset, parts)
+    version_keys = [_version_key(ns) for ns in DATASET_DEPENDENCIES[dataset]]
+
+    # 版本号与缓存值一次取回
+    found = cache.get_many(version_keys + [key])
+    stamp = _stamp(dataset, found)
+    entry = found.get(key)
+    now = time.time()
+
+    if _is_fresh(entry, stamp, policy, now):
+        _count(dataset, STAT_HIT)
+        return entry['value']
+
+    lease_key = _lease_key(key)
+    token = uuid.uuid4().hex
+    if cache.add(lease_key, token, policy['lease_timeout']):
+        try:
+            valid = entry is not None and entry['stamp'] == stamp and now < entry['soft_expires']
+            _count(dataset, STAT_EARLY if valid else STAT_MISS)
+            return _compute(cache, key, stamp, builder, policy)
+        finally:
+            if cache.get(lease_key) == token:
+                cache.delete(lease_key)
+
+    # 其他进程正在重算：有旧值则直接返回旧值
+    if entry is not None:
+        _count(dataset, STAT_COALESCE)
+        return entry['value']
+
+    # 没有任何可用值时短暂等待重算结果，超时则自行计算
+    deadline = time.monotonic() + policy['wait_timeout']
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(dataset, STAT_COALESCE)
+            return entry['value']
+
+    _count(dataset, STAT_MISS)
+    return _compute(cache, key, stamp, builder, policy)
+
+
+def refresh(dataset, builder, *parts):
+    """强制重新计算数据集并写入缓存"""
+    cache = get_cache()
+    return _compute(cache, _entry_key(dataset, parts), get_stamp(dataset), builder, get_policy(dataset))
+
+
+# ============================================================
+# 缓存数据集
+# ============================================================
+
+def _build_active_portfolios():
+    from .models import Portfolio
+
+    return list(Portfolio.objects.filter(status='active').values('id', 'code', 'name'))
+
+
+def _build_latest_indicators():
+    from django.db.models import OuterRef, Subquery
+    from .models import RiskIndicator
+    from .serializers import RiskIndicatorSerializer
+
+    # 子查询：每个组合最新指标
+    latest_ids = RiskIndicator.objects.filter(
+        portfolio=OuterRef('portfolio')
+    ).order_by('-indicator_date').values('id')[:1]
+
+    indicators = RiskIndicator.objects.filter(
+        id__in=Subquery(latest_ids)
+    ).select_related('portfolio')
+
+    return list(RiskIndicatorSerializer(indicators, many=True).data)
+
+
+def _build_alert_statistics():
+    from django.db.models import Count
+    from .models import RiskAlert
+
+    return {
+        'by_status': list(RiskAlert.objects.values('status').annotate(count=Count('id'))),
+        'by_severity': list(RiskAlert.objects.values('severity').annotate(count=Count('id'))),
+        'by_type': list(RiskAlert.objects.values('alert_type').annotate(count=Count('id'))),
+    }
+
+
+def _build_dashboard(today):
+    from django.db.models import Avg, Count, Max, Sum
+    from .models import Portfolio, RiskAlert, RiskIndicator, Trade
+    from .serializers import RiskDashboardSerializer
+
+    # 组合统计
+    total_portfolios = Portfolio.objects.count()
+    active_portfolios = len(get_active_portfolios())
+
+    # 今日交易
+    today_trades = Trade.objects.filter(trade_date=today).aggregate(
+        count=Count('id'),
+        amount=Sum('amount')
+    )
+
+    # 风险预警
+    pending_alerts = RiskAlert.objects.filter(status='pending').count()
+    critical_alerts = RiskAlert.objects.filter(
+        status='pending',
+        severity='critical'
+    ).count()
+
+    # 收益统计（所有组合最新指标）
+    latest_indicators = RiskIndicator.objects.filter(
+        id__in=RiskIndicator.objects.values('portfolio').annotate(
+            latest_id=Max('id')
+        ).values('latest_id')
+    ).aggregate(
+        avg_sharpe=Avg('sharpe_ratio'),
+        total_return=Sum('cumulative_return')
+    )
+
+    data = {
+        'total_portfolios': total_portfolios,
+        'active_portfolios': active_portfolios,
+        'today_trades': today_trades['count'] or 0,
+        'today_amount': today_trades['amount'] or 0,
+        'pending_alerts': pending_alerts,
+        'critical_alerts': critical_alerts,
+        'total_return': latest_indicators['total_return'] or 0,
+        'avg_sharpe_ratio': latest_indicators['avg_sharpe'] or 0
+    }
+    return dict(RiskDashboardSerializer(data).data)
+
+
+def get_active_portfolios():
+    """运行中组合列表"""
+    return get_or_set(ACTIVE_PORTFOLIOS, _build_active_portfolios)
+
+
+def get_latest_indicators():
+    """所有组合最新风险指标（序列化后数据）"""
+    return get_or_set(RISK_INDICATORS_LATEST, _build_latest_indicators)
+
+
+def get_alert_statistics():
+    """预警统计"""
+    return get_or_set(ALERT_STATISTICS, _build_alert_statistics)
+
+
+def get_dashboard(today):
+    """风险仪表盘数据，按日期分键"""
+    return get_or_set(RISK_DASHBOARD, lambda: _build_dashboard(today), today)
+
+
+def warm_up(today):
+    """预热全部数据集，返回已刷新的数据集名称"""
+    refresh(ACTIVE_PORTFOLIOS, _build_active_portfolios)
+    refresh(RISK_INDICATORS_LATEST, _build_latest_indicators)
+    refresh(ALERT_STATISTICS, _build_alert_statistics)
+    refresh(RISK_DASHBOARD, lambda: _build_dashboard(today), today)
+    return [ACTIVE_PORTFOLIOS, RISK_INDICATORS_LATEST, ALERT_STATISTICS, RISK_DASHBOARD]
@@ -0,0 +1,582 @@
+"""
+生成合成投资组合数据，用于本地按生产规模压测
+
+    python manage.py generate_synthetic_book --portfolios 500 --days 500 --trades-per-day 40
+
+生成 N 个组合 × D 个交易日的风险指标、持仓、交易记录与风险预警:
+
+    - 证券行情为带市场因子与厚尾冲击的随机游走，组合净值由持仓市值逐日推算，
+      收益、波动、回撤、夏普等指标与持仓一致
+    - 交易笔数按组合规模加权，证券按热度（Zipf 分布）选取，约 0.05% 为金额异常的交易
+    - 预警由指标越限（回撤、VaR、集中度）、连续下跌与异常交易触发，越早的预警越可能已处理
+
+相同的 --seed 与参数生成完全相同的数据。写入绕过 ORM 逐行实例化:
+SQLite 使用 executemany，PostgreSQL 使用 COPY（psycopg2 与 psycopg 3 均支持），整个生成过程在一个事务内完成。
+合成组合代码以 --prefix 开头（默认 SYN），--clear 先删除同前缀的已有合成数据。
+"""
+import csv
+import datetime
+import io
+import itertools
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from risk import cache as risk_cache
+from risk.models import Holding, Portfolio, RiskAlert, RiskIndicator, Trade
+
+PORTFOLIO_TYPE_WEIGHTS = {'bond': 35, 'stock': 25, 'mixed': 25, 'index': 10, 'qdii': 5}
+PORTFOLIO_STATUS_WEIGHTS = {'active': 90, 'suspended': 7, 'closed': 3}
+MANAGERS = ['张伟', '王芳', '李娜', '刘洋', '陈静', '杨帆', '赵磊', '黄敏', '周杰', '吴昊']
+
+# 证券类型: (占比, 代码起始值, 名称前缀, 日波动率, 市场因子暴露, 初始价格中位数)
+SECURITY_PROFILES = {
+    'stock': (70, 600000, '合成股票', 0.018, 1.0, 15.0),
+    'bond': (20, 19000, '合成债券', 0.002, 0.05, 100.0),
+    'fund': (8, 510000, '合成基金', 0.010, 0.7, 1.5),
+    'derivative': (2, 800000, '合成衍生品', 0.030, 1.5, 50.0),
+}
+# 各类组合可投资的证券类型
+PORTFOLIO_UNIVERSE = {
+    'stock': ('stock',),
+    'bond': ('bond',),
+    'mixed': ('stock', 'bond', 'fund'),
+    'index': ('stock', 'fund'),
+    'qdii': ('stock', 'fund', 'derivative'),
+    'other': ('stock', 'bond', 'fund', 'derivative'),
+}
+INDUSTRIES = 30
+
+TRADE_STATUS_WEIGHTS = {'filled': 92, 'partial': 3, 'cancelled': 3, 'rejected': 1, 'pending': 1}
+ABNORMAL_RATE = 0.0005
+
+INDICATOR_FIELDS = (
+    'portfolio', 'indicator_date', 'daily_return', 'cumulative_return', 'annualized_return',
+    'daily_volatility', 'annualized_volatility', 'max_drawdown', 'value_at_risk',
+    'sharpe_ratio', 'sortino_ratio', 'information_ratio', 'industry_concentration',
+    'stock_concentration', 'top10_holdings_ratio', 'created_at',
+)
+HOLDING_FIELDS = (
+    'portfolio', 'holding_date', 'security_type', 'security_code', 'security_name',
+    'quantity', 'cost', 'cost_price', 'market_price', 'market_value', 'unrealized_pnl',
+    'unrealized_pnl_ratio', 'holding_ratio', 'created_at',
+)
+TRADE_FIELDS = (
+    'portfolio', 'trade_type', 'security_type', 'security_code', 'security_name', 'trade_date',
+    'trade_time', 'quantity', 'price', 'amount', 'commission', 'stamp_tax', 'transfer_fee',
+    'status', 'is_abnormal', 'abnormal_reason', 'remark', 'created_at', 'updated_at',
+)
+ALERT_FIELDS = (
+    'alert_type', 'portfolio', 'severity', 'title', 'content', 'indicator_name',
+    'indicator_value', 'threshold', 'status', 'handled_at', 'handle_comment',
+    'notified', 'notification_time', 'alert_time',
+)
+
+# 指标越限预警: 指标, 比较方向, 阈值, 预警类型, 预警等级
+INDICATOR_RULES = (
+    ('max_drawdown', 'lt', -0.10, 'threshold', 'critical'),
+    ('value_at_risk', 'gt', 0.05, 'threshold', 'warning'),
+    ('industry_concentration', 'gt', 0.30, 'limit', 'warning'),
+    ('stock_concentration', 'gt', 0.10, 'limit', 'error'),
+)
+
+
+class BulkWriter:
+    """按批写入原始行，PostgreSQL 使用 COPY，其他数据库使用 executemany"""
+
+    def __init__(self, connection, model, fields, batch_size):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+        qn = connection.ops.quote_name
+        opts = model._meta
+        self.table = qn(opts.db_table)
+        self.columns = ', '.join(qn(opts.get_field(name).column) for name in fields)
+        self.use_copy = connection.vendor == 'postgresql'
+        self.sql = (
+            f"INSERT INTO {self.table} ({self.columns}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def flush_if_full(self):
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        with self.connection.cursor() as cursor:
+            if self.use_copy:
+                from django.db.backends.postgresql import psycopg_any
+
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(self.rows)
+                sql = f"COPY {self.table} ({self.columns}) FROM STDIN WITH (FORMAT csv)"
+                if psycopg_any.is_psycopg3:
+                    # psycopg 3 没有 copy_expert，改用 cursor.copy()
+                    with cursor.copy(sql) as copy:
+                        copy.write(buffer.getvalue())
+                else:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+            else:
+                cursor.executemany(self.sql, self.rows)
+        self.count += len(self.rows)
+        self.rows = []
+
+
+class Security:
+    __slots__ = ('code', 'name', 'type', 'industry', 'price', 'vol', 'beta')
+
+    def __init__(self, code, name, security_type, industry, price, vol, beta):
+        self.code = code
+        self.name = name
+        self.type = security_type
+        self.industry = industry
+        self.price = price
+        self.vol = vol
+        self.beta = beta
+
+
+class BookState:
+    """单个组合的逐日状态"""
+
+    def __init__(self, portfolio_id, code, weight, positions):
+        self.id = portfolio_id
+        self.code = code
+        self.weight = weight
+        # [证券, 数量, 成本价]
+        self.positions = positions
+        self.value = None
+        self.initial_value = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.var = 0.0
+        self.downside_var = 0.0
+        self.active_mean = 0.0
+        self.active_var = 0.0
+        self.days = 0
+        self.down_streak = 0
+        self.breached = set()
+
+
+def weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def business_days(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+class BookGenerator:
+    """按交易日推进行情并生成各表数据"""
+
+    def __init__(self, options, connection, stdout):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.connection = connection
+        self.stdout = stdout
+        self.ops = connection.ops
+        self.prefix = options['prefix']
+        self.end_date = options['end_date']
+        batch_size = options['batch_size']
+        self.writers = {
+            'indicators': BulkWriter(connection, RiskIndicator, INDICATOR_FIELDS, batch_size),
+            'holdings': BulkWriter(connection, Holding, HOLDING_FIELDS, batch_size),
+            'trades': BulkWriter(connection, Trade, TRADE_FIELDS, batch_size),
+            'alerts': BulkWriter(connection, RiskAlert, ALERT_FIELDS, batch_size),
+        }
+        # 交易时间在 9:30-11:30 与 13:00-15:00 之间，按秒预先转换
+        self.trade_times = [
+            self.db_time(datetime.time(second // 3600, second // 60 % 60, second % 60))
+            for second in itertools.chain(range(34200, 41400), range(46800, 54000))
+        ]
+
+    # 时间与数值在写入前按数据库的格式转换
+    def db_date(self, value):
+        return self.ops.adapt_datefield_value(value)
+
+    def db_time(self, value):
+        return self.ops.adapt_timefield_value(value)
+
+    def db_datetime(self, day, hour, minute=0):
+        value = timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour, minute)))
+        return self.ops.adapt_datetimefield_value(value)
+
+    def create_securities(self):
+        rng = self.rng
+        count = self.options['securities']
+        weights = {name: profile[0] for name, profile in SECURITY_PROFILES.items()}
+        self.securities = []
+        offsets = dict.fromkeys(SECURITY_PROFILES, 0)
+        for _ in range(count):
+            security_type = weighted_choice(rng, weights)
+            _, base_code, name_prefix, vol, beta, median_price = SECURITY_PROFILES[security_type]
+            offsets[security_type] += 1
+            index = offsets[security_type]
+            self.securities.append(Security(
+                code=f'{base_code + index:06d}',
+                name=f'{name_prefix}{index:04d}',
+                security_type=security_type,
+                industry=rng.randrange(INDUSTRIES),
+                price=median_price * math.exp(rng.gauss(0, 0.6)),
+                vol=vol * math.exp(rng.gauss(0, 0.25)),
+                beta=beta * clamp(rng.gauss(1, 0.3), 0.2, 2.0),
+            ))
+        # 热度服从 Zipf 分布，排名越靠前的证券交易越频繁
+        self.security_order = self.securities[:]
+        rng.shuffle(self.security_order)
+        self.popularity = list(itertools.accumulate(
+            1 / (rank + 1) ** 1.1 for rank in range(len(self.security_order))
+        ))
+        self.by_type = {}
+        for security in self.securities:
+            self.by_type.setdefault(security.type, []).append(security)
+
+    def create_portfolios(self):
+        rng = self.rng
+        count = self.options['portfolios']
+        created_at = timezone.make_aware(datetime.datetime.combine(self.days[0], datetime.time(9)))
+        portfolios = []
+        for index in range(1, count + 1):
+            portfolio_type = weighted_choice(rng, PORTFOLIO_TYPE_WEIGHTS)
+            portfolios.append(Portfolio(
+                code=f'{self.prefix}{index:05d}',
+                name=f'合成{dict(Portfolio.PORTFOLIO_TYPES)[portfolio_type]}{index:05d}',
+                manager=rng.choice(MANAGERS),
+                portfolio_type=portfolio_type,
+                status=weighted_choice(rng, PORTFOLIO_STATUS_WEIGHTS),
+                # 规模为对数正态分布，中位数 20 亿
+                asset_scale=round(2e9 * math.exp(rng.gauss(0, 1.0)), 2),
+                remark='合成数据',
+            ))
+        Portfolio.objects.using(self.connection.alias).bulk_create(portfolios)
+        Portfolio.objects.using(self.connection.alias).filter(
+            code__startswith=self.prefix
+        ).update(created_at=created_at)
+        ids = dict(
+            Portfolio.objects.using(self.connection.alias)
+            .filter(code__startswith=self.prefix).values_list('code', 'id')
+        )
+
+        mean_scale = sum(float(p.asset_scale) for p in portfolios) / len(portfolios)
+        holdings = self.options['holdings']
+        self.books = []
+        for portfolio in portfolios:
+            scale = float(portfolio.asset_scale)
+            pool = [
+                security for security_type in PORTFOLIO_UNIVERSE[portfolio.portfolio_type]
+                for security in self.by_type.get(security_type, ())
+            ]
+            size = min(len(pool), max(5, int(rng.gauss(holdings, holdings / 4))))
+            chosen = rng.sample(pool, size)
+            # 持仓权重集中在少数证券上
+            raw = [rng.paretovariate(2.5) for _ in chosen]
+            total = sum(raw)
+            positions = []
+            for security, share in zip(chosen, raw):
+                quantity = max(100, round(scale * share / total / security.price, -2))
+                positions.append([security, quantity, security.price])
+            self.books.append(BookState(ids[portfolio.code], portfolio.code, scale / mean_scale, positions))
+        return len(portfolios)
+
+    def advance_prices(self):
+        rng = self.rng
+        market = rng.gauss(0.0003, 0.011)
+        for security in self.securities:
+            shock = rng.gauss(0, 1)
+            # 约 1% 的厚尾冲击
+            if rng.random() < 0.01:
+                shock *= 4
+            change = security.beta * market + security.vol * shock
+            security.price = max(0.01, security.price * math.exp(change))
+        return market
+
+    def generate_day(self, day, market):
+        date = self.db_date(day)
+        indicator_time = self.db_datetime(day, 18, 30)
+        holding_time = self.db_datetime(day, 17)
+        trade_time = self.db_datetime(day, 18)
+        for book in self.books:
+            values = self.write_holdings(book, date, holding_time)
+            indicator = self.write_indicator(book, date, indicator_time, values, market)
+            abnormal = self.write_trades(book, date, trade_time)
+            self.write_alerts(book, day, indicator, abnormal)
+            for writer in self.writers.values():
+                writer.flush_if_full()
+
+    def write_holdings(self, book, date, created_at):
+        market_values = [position[0].price * position[1] for position in book.positions]
+        total = sum(market_values)
+        add = self.writers['holdings'].rows.append
+        industries = [0.0] * INDUSTRIES
+        for (security, quantity, cost_price), market_value in zip(book.positions, market_values):
+            cost = quantity * cost_price
+            pnl = market_value - cost
+            ratio = market_value / total
+            industries[security.industry] += ratio
+            # SQLite 按原值保存，按字段精度取整后写入
+            add((
+                book.id, date, security.type, security.code, security.name,
+                quantity, round(cost, 2), round(cost_price, 4), round(security.price, 4),
+                round(market_value, 2), round(pnl, 2), round(pnl / cost, 4), round(ratio, 4),
+                created_at,
+            ))
+        ratios = sorted(market_values, reverse=True)
+        return {
+            'total': total,
+            'top1': ratios[0] / total,
+            'top10': sum(ratios[:10]) / total,
+            'industry': max(industries),
+        }
+
+    def write_indicator(self, book, date, created_at, values, market):
+        total = values['total']
+        if book.value is None:
+            book.initial_value = book.peak = total
+            daily_return = 0.0
+        else:
+            daily_return = total / book.value - 1
+        book.value = total
+        book.peak = max(book.peak, total)
+        book.days += 1
+        book.down_streak = book.down_streak + 1 if daily_return < 0 else 0
+        book.max_drawdown = min(book.max_drawdown, total / book.peak - 1)
+
+        # 波动率按 EWMA(λ=0.94) 估计
+        book.var = 0.94 * book.var + 0.06 * daily_return ** 2
+        book.downside_var = 0.94 * book.downside_var + 0.06 * min(daily_return, 0) ** 2
+        active = daily_return - market
+        book.active_mean = 0.94 * book.active_mean + 0.06 * active
+        book.active_var = 0.94 * book.active_var + 0.06 * (active - book.active_mean) ** 2
+
+        cumulative = total / book.initial_value - 1
+        annualized = clamp((1 + cumulative) ** (252 / max(book.days, 20)) - 1, -0.99, 99)
+        volatility = math.sqrt(book.var)
+        annualized_volatility = volatility * math.sqrt(252)
+        downside = math.sqrt(book.downside_var) * math.sqrt(252)
+        tracking = math.sqrt(book.active_var) * math.sqrt(252)
+        indicator = {
+            'max_drawdown': book.max_drawdown,
+            'value_at_risk': 1.645 * volatility,
+            'industry_concentration': values['industry'],
+            'stock_concentration': values['top1'],
+        }
+        self.writers['indicators'].add((
+            book.id, date, round(daily_return, 4), round(cumulative, 4), round(annualized, 4),
+            round(volatility, 4), round(annualized_volatility, 4), round(book.max_drawdown, 4),
+            round(indicator['value_at_risk'], 4),
+            round(clamp((annualized - 0.02) / annualized_volatility, -99, 99), 4) if annualized_volatility else 0,
+            round(clamp((annualized - 0.02) / downside, -99, 99), 4) if downside else 0,
+            round(clamp(book.active_mean * 252 / tracking, -99, 99), 4) if tracking else 0,
+            round(values['industry'], 4), round(values['top1'], 4), round(values['top10'], 4),
+            created_at,
+        ))
+        return indicator
+
+    def write_trades(self, book, date, created_at):
+        rng = self.rng
+        mean = self.options['trades_per_day'] * book.weight
+        count = max(0, round(rng.gauss(mean, math.sqrt(mean)))) if mean else 0
+        if not count:
+            return 0
+        # 80% 交易本组合持仓证券，20% 按全市场热度选取
+        held = rng.choices(book.positions, k=count)
+        popular = rng.choices(self.security_order, cum_weights=self.popularity, k=count)
+        add = self.writers['trades'].rows.append
+        trade_times = self.trade_times
+        abnormal_count = 0
+        status_choices = rng.choices(
+            list(TRADE_STATUS_WEIGHTS), weights=list(TRADE_STATUS_WEIGHTS.values()), k=count
+        )
+        random_ = rng.random
+        for index in range(count):
+            security = held[index][0] if random_() < 0.8 else popular[index]
+            trade_type = 'buy' if random_() < 0.52 else 'sell'
+            price = round(security.price * (1 + rng.gauss(0, 0.004)), 4)
+            # 数量为对数正态分布，按手（100股）取整
+            quantity = 100 * (int(rng.lognormvariate(3.4, 1.2)) + 1)
+            abnormal = random_() < ABNORMAL_RATE
+            if abnormal:
+                quantity *= rng.randint(20, 100)
+                abnormal_count += 1
+            amount = quantity * price
+            add((
+                book.id, trade_type, security.type, security.code, security.name, date,
+                trade_times[int(random_() * 14400)],
+                quantity, price, round(amount, 2),
+                round(max(5.0, amount * 0.00025), 2),
+                round(amount * 0.001, 2) if trade_type == 'sell' and security.type == 'stock' else 0,
+                round(amount * 0.00001, 2),
+                status_choices[index], abnormal,
+                '成交金额超过日均水平20倍以上' if abnormal else None, None,
+                created_at, created_at,
+            ))
+        return abnormal_count
+
+    def alert_row(self, book, day, alert_type, severity, title, content,
+                  indicator_name=None, value=None, threshold=None):
+        rng = self.rng
+        age = (self.end_date - day).days
+        if age > 5:
+            status = weighted_choice(rng, {'resolved': 75, 'ignored': 10, 'acknowledged': 15})
+        else:
+            status = weighted_choice(rng, {'pending': 60, 'acknowledged': 30, 'resolved': 10})
+        hour = rng.randint(9, 17)
+        alert_time = self.db_datetime(day, hour, rng.randrange(60))
+        handled_at = None
+        if status != 'pending':
+            handled_at = self.db_datetime(
+                day + datetime.timedelta(days=rng.randint(0, min(age, 3))), rng.randint(9, 20)
+            )
+        notified = severity in ('error', 'critical')
+        self.writers['alerts'].add((
+            alert_type, book.id, severity, title, content, indicator_name,
+            None if value is None else round(value, 4),
+            None if threshold is None else threshold,
+            status, handled_at, '已核实' if status == 'resolved' else None,
+            notified, alert_time if notified else None, alert_time,
+        ))
+
+    def write_alerts(self, book, day, indicator, abnormal):
+        # 越限预警只在指标首次越限时产生，恢复正常后再次越限重新产生
+        for field, op, threshold, alert_type, severity in INDICATOR_RULES:
+            value = indicator[field]
+            breached = value < threshold if op == 'lt' else value > threshold
+            if breached and field not in book.breached:
+                self.alert_row(
+                    book, day, alert_type, severity, f"组合{book.code} - {field}预警",
+                    f"{field}指标触发阈值，当前值: {value:.4f}, 阈值: {threshold}",
+                    field, value, threshold,
+                )
+                book.breached.add(field)
+            elif not breached:
+                book.breached.discard(field)
+        if book.down_streak == 5:
+            self.alert_row(book, day, 'trend', 'info', f"组合{book.code} - 连续下跌",
+                           "组合净值连续5个交易日下跌")
+        if abnormal:
+            self.alert_row(book, day, 'anomaly', 'error', f"组合{book.code} - 异常交易",
+                           f"检测到{abnormal}笔成交金额异常的交易")
+
+    def run(self):
+        self.days = business_days(self.end_date, self.options['days'])
+        self.create_securities()
+        portfolios = self.create_portfolios()
+        for index, day in enumerate(self.days, 1):
+            market = self.advance_prices()
+            self.generate_day(day, market)
+            if self.options['verbosity'] and (index % 20 == 0 or index == len(self.days)):
+                self.stdout.write(
+                    f"  {day} ({index}/{len(self.days)}) 交易 {self.writers['trades'].count + len(self.writers['trades'].rows)}"
+                )
+        for writer in self.writers.values():
+            writer.flush()
+        counts = {name: writer.count for name, writer in self.writers.items()}
+        counts['portfolios'] = portfolios
+        return counts
+
+
+@contextmanager
+def deferred_indexes(connection, models):
+    """写入期间删除模型声明的索引，写完后一次性重建，比逐行维护索引快得多"""
+    editor = connection.schema_editor()
+    indexes = [(model, index) for model in models for index in model._meta.indexes]
+    with connection.cursor() as cursor:
+        for model, index in indexes:
+            cursor.execute(str(index.remove_sql(model, editor)))
+    yield
+    with connection.cursor() as cursor:
+        for model, index in indexes:
+            cursor.execute(str(index.create_sql(model, editor)))
+
+
+def clear_synthetic(connection, prefix):
+    """删除同前缀的合成组合及其数据（直接执行 SQL，不逐条触发删除信号）"""
+    qn = connection.ops.quote_name
+    portfolio_table = qn(Portfolio._meta.db_table)
+    subquery = f"SELECT id FROM {portfolio_table} WHERE code LIKE %s"
+    deleted = {}
+    with connection.cursor() as cursor:
+        for model in (Trade, Holding, RiskIndicator, RiskAlert):
+            cursor.execute(
+                f"DELETE FROM {qn(model._meta.db_table)} WHERE portfolio_id IN ({subquery})",
+                [prefix + '%'],
+            )
+            deleted[model._meta.model_name] = cursor.rowcount
+        cursor.execute(f"DELETE FROM {portfolio_table} WHERE code LIKE %s", [prefix + '%'])
+        deleted['portfolio'] = cursor.rowcount
+    return deleted
+
+
+class Command(BaseCommand):
+    help = '生成合成投资组合数据（风险指标、持仓、交易、预警），用于本地按生产规模压测'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portfolios', type=int, default=50, help='组合数')
+        parser.add_argument('--days', type=int, default=60, help='交易日数（截止 --end-date）')
+        parser.add_argument('--trades-per-day', type=float, default=40,
+                            help='每个组合每日平均交易笔数（按组合规模加权）')
+        parser.add_argument('--holdings', type=int, default=30, help='每个组合平均持仓证券数')
+        parser.add_argument('--securities', type=int, default=3000, help='证券池大小')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat,
+                            default=None, help='最后一个交易日，默认今天')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--prefix', default='SYN', help='合成组合代码前缀')
+        parser.add_argument('--batch-size', type=int, default=10000, help='每批写入行数')
+        parser.add_argument('--clear', action='store_true', help='先删除同前缀的已有合成数据')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='写入期间保留交易、风险指标表的索引（默认写完后重建）')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['portfolios'] <= 0 or options['days'] <= 0:
+            raise CommandError('--portfolios 与 --days 必须大于0')
+        options['end_date'] = options['end_date'] or timezone.localdate()
+        connection = connections[options['database']]
+        prefix = options['prefix']
+
+        started = time.perf_counter()
+        with transaction.atomic(using=connection.alias):
+            if options['clear']:
+                deleted = clear_synthetic(connection, prefix)
+                self.stdout.write(f"已删除旧的合成数据: {deleted}")
+            elif Portfolio.objects.using(connection.alias).filter(code__startswith=prefix).exists():
+                raise CommandError(f'已存在代码以{prefix}开头的组合，使用 --clear 重新生成')
+            generator = BookGenerator(options, connection, self.stdout)
+            if options['keep_indexes']:
+                counts = generator.run()
+            else:
+                with deferred_indexes(connection, (Trade, RiskIndicator)):
+                    counts = generator.run()
+        elapsed = time.perf_counter() - started
+
+        # 绕过了模型信号，需手动使缓存失效
+        for namespace in (risk_cache.NS_PORTFOLIOS, risk_cache.NS_INDICATORS,
+                          risk_cache.NS_TRADES, risk_cache.NS_ALERTS):
+            risk_cache.invalidate(namespace)
+
+        rows = sum(counts.values())
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f"生成完成: {counts}，共{rows}行，耗时{elapsed:.1f}秒（{rows / elapsed:,.0f}行/秒）"
+            ))
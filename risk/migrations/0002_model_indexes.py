@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risk', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='portfolio',
+            name='code',
+            field=models.CharField(help_text='组合唯一代码，格式如 P001', max_length=20, unique=True, verbose_name='组合代码'),
+        ),
+        migrations.AlterField(
+            model_name='portfolio',
+            name='manager',
+            field=models.CharField(blank=True, help_text='负责该组合的投资经理姓名', max_length=100, null=True, verbose_name='投资经理'),
+        ),
+        migrations.AlterField(
+            model_name='portfolio',
+            name='name',
+            field=models.CharField(help_text='组合展示名称', max_length=200, verbose_name='组合名称'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(fields=['code'], name='idx_portfolio_code'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(fields=['status'], name='idx_portfolio_status'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(fields=['portfolio_type'], name='idx_portfolio_type'),
+        ),
+        migrations.AddIndex(
+            model_name='riskindicator',
+            index=models.Index(fields=['portfolio', 'indicator_date'], name='idx_indicator_portfolio_date'),
+        ),
+        migrations.AddIndex(
+            model_name='riskindicator',
+            index=models.Index(fields=['indicator_date'], name='idx_indicator_date'),
+        ),
+        migrations.AddIndex(
+            model_name='riskindicator',
+            index=models.Index(fields=['max_drawdown'], name='idx_indicator_max_dd'),
+        ),
+        migrations.AddIndex(
+            model_name='riskindicator',
+            index=models.Index(fields=['sharpe_ratio'], name='idx_indicator_sharpe'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['portfolio', 'trade_date'], name='idx_trade_portfolio_date'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['trade_date'], name='idx_trade_date'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['security_code'], name='idx_trade_security'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['is_abnormal'], name='idx_trade_abnormal'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['status'], name='idx_trade_status'),
+        ),
+    ]
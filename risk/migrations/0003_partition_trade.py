@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def partition_trade(apps, schema_editor):
+    # 仅 PostgreSQL 使用原生分区，其他数据库保持单表
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from risk.partitions import partition_table
+
+    partition_table(schema_editor, apps.get_model('risk', 'Trade'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risk', '0002_model_indexes'),
+    ]
+
+    operations = [
+        # 分区表对 ORM 透明，回滚时保留分区结构
+        migrations.RunPython(partition_trade, migrations.RunPython.noop),
+    ]
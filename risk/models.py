@@ -242,7 +242,11 @@ class RiskIndicator(models.Model):
 
 
 class Trade(models.Model):
-    """交易记录"""
+    """
+    交易记录
+
+    PostgreSQL 上按 trade_date 月度分区（见 risk.partitions），查询时尽量带上 trade_date 条件以裁剪分区
+    """
     
     portfolio = models.ForeignKey(
         Portfolio,
@@ -0,0 +1,153 @@
+"""
+交易记录按月分区
+
+PostgreSQL 上 risk_trade 为按 trade_date 范围分区的分区表（迁移 0003 转换），
+每月一个子表 risk_trade_YYYYMM，另有默认分区 risk_trade_default 兜底。
+对 ORM 透明：Trade 的读写接口不变，带 trade_date 条件的查询由数据库自动裁剪到相关月份，
+索引维护与 VACUUM 只涉及写入的当月分区。
+
+分区表的主键须包含分区键，数据库中主键为 (id, trade_date)；id 仍由同一序列生成，ORM 照常按 id 查询。
+
+其他数据库（SQLite 开发环境）保持单表，本模块的函数不做任何操作。
+未来月份的分区由 ensure_trade_partitions 任务提前创建。
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'risk_trade'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y%m}'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """已有的分区子表名（不含默认分区）"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        return sorted(name for name, in cursor.fetchall() if name != DEFAULT_PARTITION)
+
+
+def create_partition(connection, month):
+    """
+    创建某月分区
+
+    先建独立表并把默认分区中属于该月的数据移入，再挂载为分区；
+    直接 CREATE TABLE ... PARTITION OF 在默认分区已有该月数据时会失败。
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} "
+            f"WHERE trade_date >= %s AND trade_date < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    logger.info(f"已创建交易分区{name}")
+    return name
+
+
+def ensure_partitions(months_ahead=None, start=None, using=DEFAULT_DB_ALIAS):
+    """确保从 start 所在月起（默认当月）到未来 months_ahead 个月的分区都已存在，返回新建的分区"""
+    connection = connections[using]
+    if not is_partitioned(connection):
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'TRADE_PARTITION_MONTHS_AHEAD', 3)
+    first = month_start(start or datetime.date.today())
+    existing = set(list_partitions(connection))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        if partition_name(month) not in existing:
+            created.append(create_partition(connection, month))
+    return created
+
+
+def partition_table(schema_editor, model):
+    """
+    把普通交易表转换为按月分区表（迁移中调用）
+
+    为已有数据涉及的每个月建分区后整体复制，再在父表上重建主键、外键与索引，
+    索引会自动作用到全部分区。
+    """
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    old = f'{TABLE}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (trade_date)"
+        )
+        cursor.execute(f"CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {qn(TABLE)} DEFAULT")
+        cursor.execute(f"SELECT MIN(trade_date), MAX(trade_date) FROM {qn(old)}")
+        first, last = cursor.fetchone()
+
+    months = []
+    month = month_start(first or datetime.date.today())
+    last = month_start(last or month)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    for month in months:
+        create_partition(connection, month)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"DROP TABLE {qn(old)}")
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY (id, trade_date)")
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(TABLE + '_portfolio_id_fk')} "
+            f"FOREIGN KEY (portfolio_id) REFERENCES {qn('risk_portfolio')} (id) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE INDEX {qn(TABLE + '_portfolio_id')} ON {qn(TABLE)} (portfolio_id)")
+        # 复制数据时显式写入了 id，序列需跳到当前最大值之后
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {qn(TABLE)}",
+            [TABLE],
+        )
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
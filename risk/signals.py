@@ -0,0 +1,32 @@
+"""
+风险数据变更信号
+
+模型写入后递增对应缓存命名空间的版本，使读穿透缓存失效。
+失效放在事务提交之后执行，避免其他请求在提交前把旧数据重新写回缓存。
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import cache as risk_cache
+from .models import Portfolio, RiskAlert, RiskIndicator, Trade
+
+# 模型与缓存命名空间的对应关系
+MODEL_NAMESPACES = {
+    Portfolio: risk_cache.NS_PORTFOLIOS,
+    RiskIndicator: risk_cache.NS_INDICATORS,
+    Trade: risk_cache.NS_TRADES,
+    RiskAlert: risk_cache.NS_ALERTS,
+}
+
+
+def invalidate_on_change(sender, **kwargs):
+    namespace = MODEL_NAMESPACES[sender]
+    transaction.on_commit(lambda: risk_cache.invalidate(namespace))
+
+
+def connect_signals():
+    for model in MODEL_NAMESPACES:
+        post_save.connect(invalidate_on_change, sender=model,
+                          dispatch_uid=f'risk_cache_save_{model.__name__}')
+        post_delete.connect(invalidate_on_change, sender=model,
+                            dispatch_uid=f'risk_cache_delete_{model.__name__}')
@@ -1,16 +1,16 @@
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, Max, Q
+from django.db.models import Sum, Count, Q, OuterRef
 from django.utils import timezone
 from datetime import timedelta
 from .models import Portfolio, RiskIndicator, Trade, Holding, RiskAlert
 from .serializers import (
     PortfolioSerializer, RiskIndicatorSerializer, TradeSerializer,
-    HoldingSerializer, RiskAlertSerializer, RiskAlertUpdateSerializer,
-    RiskDashboardSerializer
+    HoldingSerializer, RiskAlertSerializer, RiskAlertUpdateSerializer
 )
 from accounts.permissions import IsAdminOrReadOnly
+from . import cache as risk_cache
 
 
 class PortfolioViewSet(viewsets.ModelViewSet):
@@ -78,7 +78,7 @@ class PortfolioViewSet(viewsets.ModelViewSet):
 class RiskIndicatorViewSet(viewsets.ReadOnlyModelViewSet):
     """风险指标视图集（只读）"""
     
-    queryset = RiskIndicator.objects.all()
+    queryset = RiskIndicator.objects.select_related('portfolio')
     serializer_class = RiskIndicatorSerializer
     permission_classes = [IsAdminOrReadOnly]
     
@@ -101,19 +101,7 @@ class RiskIndicatorViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def latest(self, request):
         """获取所有组合最新风险指标"""
-        from django.db.models import Subquery, OuterRef
-        
-        # 子查询：每个组合最新指标
-        latest_ids = RiskIndicator.objects.filter(
-            portfolio=OuterRef('portfolio')
-        ).order_by('-indicator_date').values('id')[:1]
-        
-        indicators = RiskIndicator.objects.filter(
-            id__in=Subquery(latest_ids)
-        ).select_related('portfolio')
-        
-        serializer = self.get_serializer(indicators, many=True)
-        return Response(serializer.data)
+        return Response(risk_cache.get_latest_indicators())
     
     @action(detail=False, methods=['get'])
     def history(self, request):
@@ -125,7 +113,7 @@ class RiskIndicatorViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        indicators = RiskIndicator.objects.filter(
+        indicators = RiskIndicator.objects.select_related('portfolio').filter(
             portfolio_id=portfolio_id
         ).order_by('indicator_date')
         
@@ -136,7 +124,7 @@ class RiskIndicatorViewSet(viewsets.ReadOnlyModelViewSet):
 class TradeViewSet(viewsets.ModelViewSet):
     """交易记录视图集"""
     
-    queryset = Trade.objects.all()
+    queryset = Trade.objects.select_related('portfolio')
     serializer_class = TradeSerializer
     permission_classes = [IsAdminOrReadOnly]
     
@@ -213,7 +201,7 @@ class TradeViewSet(viewsets.ModelViewSet):
 class HoldingViewSet(viewsets.ReadOnlyModelViewSet):
     """持仓信息视图集（只读）"""
     
-    queryset = Holding.objects.all()
+    queryset = Holding.objects.select_related('portfolio')
     serializer_class = HoldingSerializer
     permission_classes = [IsAdminOrReadOnly]
     
@@ -244,7 +232,7 @@ class HoldingViewSet(viewsets.ReadOnlyModelViewSet):
 class RiskAlertViewSet(viewsets.ModelViewSet):
     """风险预警视图集"""
     
-    queryset = RiskAlert.objects.all()
+    queryset = RiskAlert.objects.select_related('portfolio', 'handled_by')
     permission_classes = [IsAdminOrReadOnly]
     
     def get_serializer_class(self):
@@ -280,7 +268,7 @@ class RiskAlertViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         # 如果状态变为已确认/已解决/已忽略，记录处理人
         if serializer.validated_data.get('status') in ['acknowledged', 'resolved', 'ignored']:
-            serializer.save(handled_by=self.request.user, handled_at=timezone.now())
+            serializer.save(handled_by_id=self.request.user.pk, handled_at=timezone.now())
         else:
             serializer.save()
     
@@ -300,23 +288,7 @@ class RiskAlertViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """预警统计"""
-        from django.db.models import Count
-        
-        status_stats = RiskAlert.objects.values('status').annotate(
-            count=Count('id')
-        )
-        severity_stats = RiskAlert.objects.values('severity').annotate(
-            count=Count('id')
-        )
-        type_stats = RiskAlert.objects.values('alert_type').annotate(
-            count=Count('id')
-        )
-        
-        return Response({
-            'by_status': list(status_stats),
-            'by_severity': list(severity_stats),
-            'by_type': list(type_stats)
-        })
+        return Response(risk_cache.get_alert_statistics())
 
 
 class RiskDashboardView(views.APIView):
@@ -324,44 +296,4 @@ class RiskDashboardView(views.APIView):
     
     def get(self, request):
         today = timezone.now().date()
-        
-        # 组合统计
-        total_portfolios = Portfolio.objects.count()
-        active_portfolios = Portfolio.objects.filter(status='active').count()
-        
-        # 今日交易
-        today_trades = Trade.objects.filter(trade_date=today).aggregate(
-            count=Count('id'),
-            amount=Sum('amount')
-        )
-        
-        # 风险预警
-        pending_alerts = RiskAlert.objects.filter(status='pending').count()
-        critical_alerts = RiskAlert.objects.filter(
-            status='pending',
-            severity='critical'
-        ).count()
-        
-        # 收益统计（所有组合最新指标）
-        latest_indicators = RiskIndicator.objects.filter(
-            id__in=RiskIndicator.objects.values('portfolio').annotate(
-                latest_id=Max('id')
-            ).values('latest_id')
-        ).aggregate(
-            avg_sharpe=Avg('sharpe_ratio'),
-            total_return=Sum('cumulative_return')
-        )
-        
-        data = {
-            'total_portfolios': total_portfolios,
-            'active_portfolios': active_portfolios,
-            'today_trades': today_trades['count'] or 0,
-            'today_amount': today_trades['amount'] or 0,
-            'pending_alerts': pending_alerts,
-            'critical_alerts': critical_alerts,
-            'total_return': latest_indicators['total_return'] or 0,
-            'avg_sharpe_ratio': latest_indicators['avg_sharpe'] or 0
-        }
-        
-        serializer = RiskDashboardSerializer(data)
-        return Response(serializer.data)
+        return Response(risk_cache.get_dashboard(today))
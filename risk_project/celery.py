@@ -12,6 +12,10 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # 自动发现所有Django应用中的tasks
 app.autodiscover_tasks()
 
+# 任务内的查询按读写分离路由，每个任务使用独立的路由状态
+from .db_router import connect_celery_signals  # noqa: E402
+connect_celery_signals()
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
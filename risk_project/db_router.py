@@ -0,0 +1,189 @@
+"""
+读写分离路由
+
+只读请求（GET/HEAD/OPTIONS）的查询在只读副本间轮询分发，写入及以下情况始终使用主库:
+
+    - 非安全方法的请求（POST/PUT/PATCH/DELETE）
+    - Celery 任务：水位、锁持有者等读取不能容忍副本延迟，默认全部读主库；
+      只读且允许延迟的代码段可用 routing_context() 显式读副本
+    - 本次请求/任务中已经发生过写入（写后读粘滞主库），
+      并在 REPLICA_STICKY_SECONDS 内通过 Cookie 让同一客户端的后续请求继续读主库
+    - 处于主库事务中
+    - 请求/任务之外的查询（管理命令、shell、迁移等）
+    - 副本延迟超过 REPLICA_MAX_LAG 秒或不可用
+
+副本在 settings.DATABASES 中配置，别名列在 settings.DATABASE_REPLICAS 中。
+本地可用两个 SQLite 文件验证：DB_REPLICAS=/path/to/replica.sqlite3。
+"""
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """一次请求或任务内的路由状态"""
+
+    def __init__(self, use_primary=False):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+_counter = itertools.count()
+_lag_cache = {}
+
+
+@contextmanager
+def routing_context(use_primary=False):
+    """在上下文内允许读副本，use_primary=True 时全部使用主库"""
+    state = RoutingState(use_primary)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """上下文内的读取强制使用主库"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous = state.use_primary
+    state.use_primary = True
+    try:
+        yield
+    finally:
+        state.use_primary = previous
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def measure_lag(alias):
+    """副本延迟(秒)，无法判断时视为无延迟"""
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            )
+            return float(cursor.fetchone()[0])
+    return 0.0
+
+
+def get_replica_lag(alias):
+    """带缓存的副本延迟，REPLICA_LAG_CHECK_INTERVAL 秒内复用上次结果；不可用时返回 None"""
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    cached = _lag_cache.get(alias)
+    if cached is not None and now - cached[0] < interval:
+        return cached[1]
+    try:
+        lag = measure_lag(alias)
+    except Exception as e:
+        logger.warning(f"副本{alias}不可用: {str(e)}")
+        lag = None
+    _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+    healthy = []
+    for alias in get_replicas():
+        lag = get_replica_lag(alias)
+        if lag is not None and lag <= max_lag:
+            healthy.append(alias)
+    return healthy
+
+
+class ReplicaRouter:
+    """主库写、副本读的数据库路由"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.use_primary or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        replicas = healthy_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        # 轮询分发
+        return replicas[next(_counter) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本由主库复制，不单独迁移
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """为每个请求建立路由状态，写入后通过 Cookie 在一段时间内粘滞主库"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sticky = STICKY_COOKIE in request.COOKIES
+        use_primary = request.method not in SAFE_METHODS or sticky
+        with routing_context(use_primary=use_primary) as state:
+            response = self.get_response(request)
+
+        if state.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+_task_tokens = {}
+
+
+def task_prerun(task_id=None, **kwargs):
+    # Celery worker 线程会复用，每个任务使用独立的路由状态；任务默认读主库
+    _task_tokens[task_id] = _state.set(RoutingState(use_primary=True))
+
+
+def task_postrun(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        _state.reset(token)
+
+
+def connect_celery_signals():
+    from celery.signals import task_postrun as postrun_signal
+    from celery.signals import task_prerun as prerun_signal
+
+    prerun_signal.connect(task_prerun, weak=False, dispatch_uid='db_routing_prerun')
+    postrun_signal.connect(task_postrun, weak=False, dispatch_uid='db_routing_postrun')
@@ -0,0 +1,217 @@
+"""
+接口性能监控
+
+按解析后的视图与动作统计每个请求的 SQL 条数、SQL 耗时、响应序列化耗时和响应大小，
+以 Prometheus 文本格式暴露在 /metrics。超过阈值的慢请求会连同其 SQL 一起写入
+risk.slow_requests 日志。
+
+多进程部署（gunicorn）时设置 PROMETHEUS_MULTIPROC_DIR 环境变量，
+/metrics 会汇总所有 worker 的数据。
+
+/metrics 不经用户认证，只允许 METRICS_ALLOWED_IPS 中的地址（按 REMOTE_ADDR，不信任
+X-Forwarded-For）或携带 "Authorization: Bearer <METRICS_TOKEN>" 的请求访问，其余返回 403。
+"""
+import hmac
+import ipaddress
+import logging
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily
+
+logger = logging.getLogger('risk.slow_requests')
+
+LABELS = ('view', 'action', 'method')
+
+REGISTRY = CollectorRegistry()
+
+REQUESTS = Counter(
+    'risk_http_requests_total', '请求数',
+    LABELS + ('status',), registry=REGISTRY,
+)
+REQUEST_DURATION = Histogram(
+    'risk_http_request_duration_seconds', '请求总耗时',
+    LABELS, registry=REGISTRY,
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'risk_http_request_queries', '单个请求执行的SQL条数',
+    LABELS, registry=REGISTRY,
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_SQL_DURATION = Histogram(
+    'risk_http_request_sql_seconds', '单个请求的SQL总耗时',
+    LABELS, registry=REGISTRY,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+SERIALIZATION_DURATION = Histogram(
+    'risk_http_response_serialization_seconds', '响应序列化(渲染)耗时',
+    LABELS, registry=REGISTRY,
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+RESPONSE_SIZE = Histogram(
+    'risk_http_response_size_bytes', '响应大小',
+    LABELS, registry=REGISTRY,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+
+class RiskCacheCollector:
+    """导出 risk.cache 的命中/重算/合并计数（计数保存在共享缓存中）"""
+
+    def collect(self):
+        from risk import cache as risk_cache
+
+        family = CounterMetricFamily(
+            'risk_cache_events', '风险数据缓存事件', labels=('dataset', 'outcome'),
+        )
+        for dataset, outcomes in risk_cache.get_stats().items():
+            for outcome, count in outcomes.items():
+                family.add_metric((dataset, outcome), count)
+        yield family
+
+
+REGISTRY.register(RiskCacheCollector())
+
+
+class QueryRecorder:
+    """数据库执行包装器：记录请求内的 SQL 条数、耗时与语句"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.queries.append((sql, elapsed))
+
+
+def resolve_labels(request):
+    """由解析结果得到 (视图, 动作, 方法) 标签"""
+    method = request.method
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', method.lower(), method
+
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    view = view_class.__name__ if view_class else match.view_name or func.__name__
+
+    # ViewSet 的路由带有 方法 -> 动作 映射
+    actions = getattr(func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return view, action, method
+
+
+class QueryMetricsMiddleware:
+    """记录每个接口的SQL条数、SQL耗时、序列化耗时与响应大小"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True) or request.path == '/metrics':
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        labels = resolve_labels(request)
+        REQUESTS.labels(*labels, str(response.status_code)).inc()
+        REQUEST_DURATION.labels(*labels).observe(duration)
+        REQUEST_QUERIES.labels(*labels).observe(recorder.count)
+        REQUEST_SQL_DURATION.labels(*labels).observe(recorder.duration)
+        serialization = getattr(request, '_metrics_render_duration', None)
+        if serialization is not None:
+            SERIALIZATION_DURATION.labels(*labels).observe(serialization)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(*labels).observe(len(response.content))
+
+        self.log_slow_request(request, labels, duration, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF 的 Response 在所有中间件处理后才渲染，借助渲染回调计时
+        started = time.perf_counter()
+
+        def record(rendered):
+            request._metrics_render_duration = time.perf_counter() - started
+
+        response.add_post_render_callback(record)
+        return response
+
+    def log_slow_request(self, request, labels, duration, recorder):
+        threshold_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        query_threshold = getattr(settings, 'SLOW_REQUEST_QUERY_THRESHOLD', None)
+        too_slow = threshold_ms is not None and duration * 1000 >= threshold_ms
+        too_many = query_threshold is not None and recorder.count >= query_threshold
+        if not (too_slow or too_many):
+            return
+
+        max_sql = getattr(settings, 'SLOW_REQUEST_MAX_SQL', 50)
+        lines = [
+            f"慢请求 {request.method} {request.get_full_path()} "
+            f"[{labels[0]}.{labels[1]}] 耗时{duration * 1000:.1f}ms, "
+            f"SQL {recorder.count}条/{recorder.duration * 1000:.1f}ms"
+        ]
+        for sql, elapsed in recorder.queries[:max_sql]:
+            lines.append(f"  {elapsed * 1000:.2f}ms  {sql}")
+        if recorder.count > max_sql:
+            lines.append(f"  ... 其余{recorder.count - max_sql}条省略")
+        logger.warning('\n'.join(lines))
+
+
+def get_registry():
+    """多进程模式下汇总所有 worker 的指标"""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(RiskCacheCollector())
+    return registry
+
+
+def is_scrape_allowed(request):
+    """请求来源在 METRICS_ALLOWED_IPS 内，或携带正确的 METRICS_TOKEN"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    )
+
+
+def metrics_view(request):
+    """Prometheus 指标"""
+    if not is_scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -3,6 +3,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -35,6 +37,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'risk_project.metrics.QueryMetricsMiddleware',
+    'risk_project.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +77,32 @@ DATABASES = {
     }
 }
 
+# 只读副本：DB_REPLICAS 为逗号分隔的副本库名称（SQLite 为文件路径），连接参数与主库相同
+# 只读请求的查询按 risk_project.db_router 分发到副本，Celery 任务默认读主库
+DATABASE_REPLICAS = []
+for _index, _name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    DATABASES[f'replica_{_index}'] = dict(
+        DATABASES['default'], NAME=_name.strip(), TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+DATABASE_ROUTERS = ['risk_project.db_router.ReplicaRouter']
+# 副本延迟超过该值(秒)时读主库；延迟检测结果缓存时间(秒)；写入后同一客户端粘滞主库的时间(秒)
+REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 10))
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_STICKY_SECONDS = 5
+
+# SQLite 连接参数：每个新连接建立时执行（见 risk_project.sqlite），设为空字典关闭
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -64 * 1024,  # 64 MiB
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+# sqlite_maintenance 任务的 WAL 检查点模式: PASSIVE / FULL / RESTART / TRUNCATE
+SQLITE_CHECKPOINT_MODE = 'TRUNCATE'
+
 # Password validation
 AUTH_USER_MODEL = 'accounts.User'
 AUTH_PASSWORD_VALIDATORS = [
@@ -103,8 +133,14 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework configuration
+# 无状态JWT认证：按令牌中的用户ID/角色/权限版本认证，请求不查询用户表（accounts.authentication）
+# 登出注销依赖共享缓存，开启时必须配置 REDIS_URL，否则启动报错（accounts.tokens.check_revocation_cache）
+JWT_STATELESS_AUTH = os.environ.get('JWT_STATELESS_AUTH', 'False').lower() in ('true', '1', 'yes')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'accounts.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -120,8 +156,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_THROTTLE_CLASSES': (
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'risk_project.throttling.SharedAnonRateThrottle',
+        'risk_project.throttling.SharedUserRateThrottle',
     ),
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
@@ -141,16 +177,54 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    # 令牌携带角色代码与权限版本（accounts.tokens）
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.tokens.RiskTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.RiskTokenRefreshSerializer',
 }
 
 # Redis Cache (optional - uses local memory cache if Redis not available)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,
+# 多个 gunicorn/celery 进程需共享缓存时务必配置 REDIS_URL
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+            'TIMEOUT': 300,
+        }
+    }
+
+# 跨进程限流（risk_project.throttling）：未配置时退回进程内缓存限流
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', REDIS_URL)
+# 传给 redis.Redis.from_url 的参数，默认 socket_timeout=0.1 秒
+THROTTLE_REDIS_OPTIONS = {}
+
+# 风险数据读穿透缓存（risk.cache）
+RISK_CACHE_ALIAS = 'default'
+# 写入时按命名空间失效，因此缓存时间可以覆盖预热周期(30分钟)
+RISK_CACHE_TIMEOUT = int(os.environ.get('RISK_CACHE_TIMEOUT', 35 * 60))
+# 按数据集覆盖缓存策略（soft_ttl / beta / lease_timeout / wait_timeout），例如:
+# RISK_CACHE_POLICIES = {'risk_dashboard': {'soft_ttl': 30, 'beta': 2.0}}
+RISK_CACHE_POLICIES = {}
+# 记录命中/重算/合并计数
+RISK_CACHE_STATS = True
+
+# 用户权限位集缓存（accounts.permission_cache），角色/权限变化时按版本失效
+PERMISSION_CACHE_ALIAS = 'default'
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+# 进程内缓存（未配置 REDIS_URL）时的缓存时间：失效信号不能传到其他进程，只短时缓存
+PERMISSION_CACHE_LOCAL_TIMEOUT = 5
 
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/1')
@@ -160,7 +234,70 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Shanghai'
 CELERY_TASK_TRACK_STARTED = True
+CELERY_RESULT_EXTENDED = True  # 结果中保存任务名，便于按任务查询锁持有者
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
+CELERY_BEAT_SCHEDULE = {
+    # 夜间批处理流水线：同步 → 异常交易 → 预警 → 预热 → 日报，输入未变化的阶段自动跳过
+    'nightly-risk-pipeline': {
+        'task': 'tasks.run_nightly_pipeline',
+        'schedule': crontab(hour=18, minute=30),
+    },
+    # SQLite 维护：PRAGMA optimize 与 WAL 检查点
+    'sqlite-maintenance': {
+        'task': 'tasks.sqlite_maintenance',
+        'schedule': crontab(minute=45),
+    },
+    # 交易表按月分区（PostgreSQL）：每天检查并提前创建未来月份的分区
+    'ensure-trade-partitions': {
+        'task': 'tasks.ensure_trade_partitions',
+        'schedule': crontab(hour=1, minute=0),
+    },
+}
+
+# 定时任务互斥锁后端: redis / database
+TASK_LOCK_BACKEND = os.environ.get('TASK_LOCK_BACKEND', 'redis' if REDIS_URL else 'database')
+TASK_LOCK_REDIS_URL = os.environ.get('TASK_LOCK_REDIS_URL', REDIS_URL or CELERY_BROKER_URL)
+
+# 风险指标同步分片大小（每个分片一个 Celery 子任务）
+RISK_SYNC_CHUNK_SIZE = int(os.environ.get('RISK_SYNC_CHUNK_SIZE', 50))
+
+# 交易分区提前创建的月数
+TRADE_PARTITION_MONTHS_AHEAD = 3
+
+# 日报导出目录
+REPORTS_DIR = Path(os.environ.get('REPORTS_DIR', BASE_DIR / 'reports'))
+# 日报数据水位的缓存时间（秒），兜底未触发缓存失效的写入
+REPORT_WATERMARK_CACHE_TIMEOUT = 60
+
+# 任务进度推送（SSE）：轮询结果后端的间隔与单个连接的最长时间（秒）
+# 同步 WSGI 下每个推送连接在推送期间独占一个 worker 线程，因此限制单进程的连接数，
+# 超出时返回 429，客户端改为轮询批量状态接口；连接超时后 EventSource 会自动重连
+TASK_PROGRESS_STREAM_INTERVAL = 1.0
+TASK_PROGRESS_STREAM_TIMEOUT = 60
+TASK_PROGRESS_STREAM_MAX_CONNECTIONS = int(os.environ.get('TASK_PROGRESS_STREAM_MAX_CONNECTIONS', 4))
+# 分片任务的汇总进度所用缓存，需为 worker 与 Web 进程共享的缓存（如 Redis），
+# 进程内缓存下只能在汇总回调结束后得知完成
+TASK_PROGRESS_CACHE_ALIAS = 'default'
+
+# 接口性能监控（/metrics）
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+# /metrics 访问控制：允许的来源地址（逗号分隔，可为网段，如 10.0.0.0/8），默认只允许本机；
+# 或由 Prometheus 以 bearer_token 携带 METRICS_TOKEN
+METRICS_ALLOWED_IPS = [
+    _address.strip()
+    for _address in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+    if _address.strip()
+]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+# 慢请求日志：耗时(毫秒)或SQL条数超过阈值时记录请求的SQL，环境变量设为空或 none 关闭对应条件
+def _optional_int(name, default):
+    value = os.environ.get(name, str(default)).strip()
+    return None if value.lower() in ('', 'none') else int(value)
+
+
+SLOW_REQUEST_THRESHOLD_MS = _optional_int('SLOW_REQUEST_THRESHOLD_MS', 500)
+SLOW_REQUEST_QUERY_THRESHOLD = _optional_int('SLOW_REQUEST_QUERY_THRESHOLD', 100)
+SLOW_REQUEST_MAX_SQL = 50
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -0,0 +1,71 @@
+"""
+SQLite 连接调优
+
+默认的回滚日志模式下写事务独占整个库文件，Celery 写入与 Web 读取相互阻塞。
+每个新连接建立时按 settings.SQLITE_PRAGMAS 设置:
+
+    journal_mode=WAL      读写互不阻塞（写入之间仍串行）
+    synchronous=NORMAL    WAL 下只在检查点时 fsync，断电最多丢失最近的事务，不会损坏数据库
+    mmap_size             以内存映射读取库文件，减少系统调用与拷贝
+    cache_size            每个连接的页缓存（负数为 KiB）
+    busy_timeout          遇到锁时等待的毫秒数，而不是立即报 database is locked
+    temp_store=MEMORY     排序、临时表放在内存中
+
+WAL 文件由 sqlite_maintenance 任务定期检查点截断，并执行 PRAGMA optimize 更新查询规划统计。
+"""
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+
+def get_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_pragmas(cursor, pragmas):
+    """在游标上依次执行 PRAGMA 设置"""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def on_connection_created(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = get_pragmas()
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
+
+
+def connect_signals():
+    connection_created.connect(on_connection_created, dispatch_uid='sqlite_pragmas')
+
+
+def sqlite_aliases():
+    """需要维护的 SQLite 数据库别名（只读副本除外）"""
+    replicas = set(getattr(settings, 'DATABASE_REPLICAS', ()))
+    return [
+        alias for alias in settings.DATABASES
+        if alias not in replicas and connections[alias].vendor == 'sqlite'
+    ]
+
+
+def maintain(alias=DEFAULT_DB_ALIAS, checkpoint_mode=None):
+    """
+    执行 PRAGMA optimize 与 WAL 检查点
+
+    返回检查点结果: busy(是否有读者阻止了完整检查点)、log(WAL 页数)、checkpointed(已写回页数)
+    """
+    mode = checkpoint_mode or getattr(settings, 'SQLITE_CHECKPOINT_MODE', 'TRUNCATE')
+    with connections[alias].cursor() as cursor:
+        cursor.execute('PRAGMA optimize')
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        busy, log, checkpointed = cursor.fetchone()
+    if busy:
+        logger.warning(f"数据库{alias}检查点未完成，存在长时间运行的读事务")
+    return {'busy': bool(busy), 'log': log, 'checkpointed': checkpointed}
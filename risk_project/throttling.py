@@ -0,0 +1,171 @@
+"""
+跨进程限流
+
+以 GCRA（通用信元速率算法，等价于令牌桶）实现 DRF 限流，状态保存在 Redis 中，
+所有 worker 共享同一份配额。每个键只保存一个时间戳（理论到达时间 TAT），
+判断与更新在一次 Lua 脚本调用内原子完成，时间取自 Redis 服务器，不受各机器时钟偏差影响。
+
+未配置 THROTTLE_REDIS_URL 时退回 DRF 基于缓存的实现（单进程有效）。
+Redis 不可用时放行请求并记录日志，不影响接口可用性。
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'throttle:'
+
+# KEYS[1]: 限流键
+# ARGV[1]: 单次请求的间隔(毫秒) = 周期 / 次数
+# ARGV[2]: 突发容量(毫秒) = 周期
+# ARGV[3]: 本次消耗(请求数)，0 表示只查询不消耗
+# 返回: {是否放行, 剩余次数, 需等待(毫秒), 配额完全恢复所需时间(毫秒)}
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+-- 以整数毫秒保存，避免 Lua 数值转字符串时丢失精度
+local new_tat = math.ceil(tat + interval * cost)
+local allow_at = new_tat - burst
+if now < allow_at then
+    local remaining = math.floor((burst - (tat - now)) / interval)
+    return {0, remaining, allow_at - now, tat - now}
+end
+
+if cost > 0 then
+    redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+end
+local remaining = math.floor((burst - (new_tat - now)) / interval)
+return {1, remaining, 0, new_tat - now}
+"""
+
+
+class RedisRateLimiter:
+    """GCRA 限流器"""
+
+    def __init__(self, client):
+        self.client = client
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    def hit(self, key, limit, period, cost=1):
+        """消耗配额，返回 (是否放行, 剩余次数, 需等待秒数, 完全恢复秒数)"""
+        interval = period * 1000 / limit
+        allowed, remaining, retry_after, reset = self._script(
+            keys=[KEY_PREFIX + key],
+            args=[interval, period * 1000, cost],
+        )
+        return bool(allowed), max(int(remaining), 0), retry_after / 1000, reset / 1000
+
+    def peek(self, key, limit, period):
+        """查询剩余配额，不消耗"""
+        return self.hit(key, limit, period, cost=0)
+
+
+_limiter = None
+
+
+def get_limiter():
+    """按 settings.THROTTLE_REDIS_URL 创建限流器，未配置时返回 None"""
+    global _limiter
+    url = getattr(settings, 'THROTTLE_REDIS_URL', None)
+    if not url:
+        return None
+    if _limiter is None:
+        import redis
+        options = dict(getattr(settings, 'THROTTLE_REDIS_OPTIONS', {}))
+        options.setdefault('socket_timeout', 0.1)
+        _limiter = RedisRateLimiter(redis.Redis.from_url(url, **options))
+    return _limiter
+
+
+def _reset_limiter(setting, **kwargs):
+    global _limiter
+    if setting in ('THROTTLE_REDIS_URL', 'THROTTLE_REDIS_OPTIONS'):
+        _limiter = None
+
+
+setting_changed.connect(_reset_limiter)
+
+
+class SharedRateThrottleMixin:
+    """以 Redis GCRA 替代 DRF 缓存限流的判断逻辑，限流键与速率配置不变"""
+
+    def allow_request(self, request, view):
+        limiter = get_limiter()
+        if limiter is None:
+            return super().allow_request(request, view)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, remaining, retry_after, reset = limiter.hit(
+                self.key, self.num_requests, self.duration
+            )
+        except Exception as e:
+            logger.warning(f"限流存储不可用，放行请求: {str(e)}")
+            return True
+
+        self._wait = retry_after
+        return allowed
+
+    def wait(self):
+        if get_limiter() is None:
+            return super().wait()
+        return getattr(self, '_wait', None)
+
+    def get_quota(self, request, view):
+        """当前请求者在本限流规则下的配额，不适用时返回 None
+
+        reset 为配额完全恢复所需秒数。限流存储不可用时（此时请求被放行）
+        remaining / reset 为 None。
+        """
+        if self.rate is None:
+            return None
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return None
+
+        limiter = get_limiter()
+        if limiter is not None:
+            try:
+                _, remaining, _, reset = limiter.peek(key, self.num_requests, self.duration)
+            except Exception as e:
+                logger.warning(f"限流存储不可用，无法查询配额: {str(e)}")
+                remaining = reset = None
+        else:
+            # 缓存实现：请求记录按时间倒序，最新一条移出窗口时配额完全恢复
+            now = time.time()
+            history = [t for t in self.cache.get(key, []) if t > now - self.duration]
+            remaining = max(self.num_requests - len(history), 0)
+            reset = history[0] + self.duration - now if history else 0
+        return {
+            'scope': self.scope,
+            'limit': self.num_requests,
+            'period': self.duration,
+            'remaining': remaining,
+            'reset': round(reset, 3) if reset is not None else None,
+        }
+
+
+class SharedAnonRateThrottle(SharedRateThrottleMixin, AnonRateThrottle):
+    """匿名用户限流（按IP）"""
+
+
+class SharedUserRateThrottle(SharedRateThrottleMixin, UserRateThrottle):
+    """登录用户限流（按用户ID）"""
@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 from django.http import JsonResponse
+from .metrics import metrics_view
 
 def api_root(request):
     return JsonResponse({
@@ -17,6 +18,7 @@ def api_root(request):
             'token': '/api/token/',
             'token_refresh': '/api/token/refresh/',
             'token_verify': '/api/token/verify/',
+            'metrics': '/metrics',
         },
         'documentation': 'Visit /api-auth/ for DRF browsable API',
     })
@@ -35,6 +37,9 @@ urlpatterns = [
     path('api/risk/', include('risk.urls')),
     path('api/tasks/', include('tasks.urls')),
     
+    # Prometheus 指标
+    path('metrics', metrics_view, name='metrics'),
+    
     # DRF可浏览API
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 ]
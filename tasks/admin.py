@@ -1,3 +1,24 @@
 from django.contrib import admin
+from .models import TaskLock, PipelineRun, PipelineStageRun
 
-# Register your models here.
+
+@admin.register(TaskLock)
+class TaskLockAdmin(admin.ModelAdmin):
+    list_display = ['name', 'acquired_at', 'expires_at', 'holder']
+    search_fields = ['name']
+    ordering = ['name']
+
+
+class PipelineStageRunInline(admin.TabularInline):
+    model = PipelineStageRun
+    extra = 0
+    fields = ['stage', 'status', 'input_version', 'output_version', 'started_at', 'duration_ms']
+    readonly_fields = fields
+
+
+@admin.register(PipelineRun)
+class PipelineRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'pipeline', 'run_date', 'status', 'started_at', 'finished_at']
+    list_filter = ['pipeline', 'status']
+    date_hierarchy = 'run_date'
+    inlines = [PipelineStageRunInline]
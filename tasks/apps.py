@@ -5,3 +5,7 @@ class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
     verbose_name = '定时任务'
+
+    def ready(self):
+        from risk_project.sqlite import connect_signals
+        connect_signals()
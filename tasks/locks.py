@@ -0,0 +1,304 @@
+"""
+定时任务分布式锁
+
+防止同一任务的多次执行相互重叠（定时调度与手动触发并发、执行时间超过调度周期等）。
+锁带有租期，持有期间由后台线程定期续租；持有者进程异常退出时锁在租期后自动释放。
+
+后端:
+    redis: SET NX PX + Lua 校验令牌续租/释放，适用于多机部署
+    database: 基于 TaskLock 表的条件更新，无 Redis 时使用
+
+用法:
+    @shared_task(bind=True, name='tasks.check_risk_alerts')
+    @single_instance(ttl=10 * 60)
+    def check_risk_alerts(self):
+        for portfolio in ...:
+            check_lease()
+            ...
+
+续租失败（锁已过期并被其他执行者接管）后，任务中的 check_lease() 抛出 LeaseLost 终止执行，
+single_instance 返回 status=aborted；未检查的任务执行完毕后同样返回 status=aborted。
+
+分发子任务后即返回的任务（如 chord）用 hand_over() 把锁转交给子任务:
+锁在任务返回时不释放，由子任务 renew() 续租、汇总回调 release() 释放；
+回调未执行（worker 退出等）时锁在转交的租期后自动过期。
+"""
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'task-lock:'
+DEFAULT_TTL = 10 * 60  # 秒
+
+# 当前线程正在执行的任务持有的锁（供 check_lease 使用）
+_local = threading.local()
+
+
+class LeaseLost(Exception):
+    """续租失败，锁已被其他执行者接管"""
+
+
+class RedisLockBackend:
+    """Redis 锁后端"""
+
+    RENEW_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value and cjson.decode(value)['token'] == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value and cjson.decode(value)['token'] == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._renew = client.register_script(self.RENEW_SCRIPT)
+        self._release = client.register_script(self.RELEASE_SCRIPT)
+
+    def acquire(self, name, token, holder, ttl):
+        value = json.dumps(dict(holder, token=token))
+        return bool(self.client.set(KEY_PREFIX + name, value, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, name, token, ttl):
+        return bool(self._renew(keys=[KEY_PREFIX + name], args=[token, int(ttl * 1000)]))
+
+    def release(self, name, token):
+        return bool(self._release(keys=[KEY_PREFIX + name], args=[token]))
+
+    def get_holder(self, name):
+        value = self.client.get(KEY_PREFIX + name)
+        if not value:
+            return None
+        holder = json.loads(value)
+        holder.pop('token', None)
+        return holder
+
+
+class DatabaseLockBackend:
+    """数据库锁后端（TaskLock 表）"""
+
+    def acquire(self, name, token, holder, ttl):
+        from .models import TaskLock
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl)
+        # 接管已过期的锁
+        taken = TaskLock.objects.filter(name=name, expires_at__lte=now).update(
+            token=token, holder=holder, acquired_at=now, expires_at=expires_at
+        )
+        if taken:
+            return True
+        try:
+            with transaction.atomic():
+                TaskLock.objects.create(
+                    name=name, token=token, holder=holder,
+                    acquired_at=now, expires_at=expires_at
+                )
+            return True
+        except IntegrityError:
+            return False
+
+    def renew(self, name, token, ttl):
+        from .models import TaskLock
+
+        return bool(TaskLock.objects.filter(name=name, token=token).update(
+            expires_at=timezone.now() + timedelta(seconds=ttl)
+        ))
+
+    def release(self, name, token):
+        from .models import TaskLock
+
+        deleted, _ = TaskLock.objects.filter(name=name, token=token).delete()
+        return bool(deleted)
+
+    def get_holder(self, name):
+        from .models import TaskLock
+
+        lock = TaskLock.objects.filter(name=name, expires_at__gt=timezone.now()).first()
+        return lock.holder if lock else None
+
+
+_backend = None
+
+
+def get_backend():
+    """按 settings.TASK_LOCK_BACKEND 创建锁后端"""
+    global _backend
+    if _backend is None:
+        if getattr(settings, 'TASK_LOCK_BACKEND', 'database') == 'redis':
+            import redis
+            _backend = RedisLockBackend(redis.Redis.from_url(settings.TASK_LOCK_REDIS_URL))
+        else:
+            _backend = DatabaseLockBackend()
+    return _backend
+
+
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting in ('TASK_LOCK_BACKEND', 'TASK_LOCK_REDIS_URL'):
+        _backend = None
+
+
+setting_changed.connect(_reset_backend)
+
+
+class Lease:
+    """已获取的锁，持有期间后台线程按 ttl/3 的间隔续租"""
+
+    def __init__(self, backend, name, token, ttl):
+        self.backend = backend
+        self.name = name
+        self.token = token
+        self.ttl = ttl
+        self.lost = False
+        self.handed_over = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _renew_loop(self):
+        from django.db import connections
+
+        try:
+            while not self._stop.wait(self.ttl / 3):
+                try:
+                    if not self.backend.renew(self.name, self.token, self.ttl):
+                        self.lost = True
+                        logger.error(f"任务锁{self.name}续租失败，锁已被其他执行者接管")
+                        return
+                except Exception as e:
+                    logger.warning(f"任务锁{self.name}续租异常: {str(e)}")
+        finally:
+            # 关闭续租线程自身的数据库连接
+            connections.close_all()
+
+    def check(self):
+        """锁已丢失时抛出 LeaseLost"""
+        if self.lost:
+            raise LeaseLost(self.name)
+
+    def hand_over(self, ttl):
+        """停止续租并把租期延长为 ttl 秒，退出时不再释放，返回 (锁名称, 令牌)"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if not self.backend.renew(self.name, self.token, ttl):
+            self.lost = True
+            raise LeaseLost(self.name)
+        self.handed_over = True
+        return self.name, self.token
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._renew_loop, name=f'lock-renew-{self.name}', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if not self.handed_over:
+            self.backend.release(self.name, self.token)
+        return False
+
+
+def acquire(name, holder, ttl=DEFAULT_TTL):
+    """尝试获取锁，成功返回 Lease，已被占用返回 None"""
+    backend = get_backend()
+    token = uuid.uuid4().hex
+    if backend.acquire(name, token, holder, ttl):
+        return Lease(backend, name, token, ttl)
+    return None
+
+
+def get_holder(name):
+    """当前持有者信息，未被持有时返回 None"""
+    return get_backend().get_holder(name)
+
+
+def renew(name, token, ttl):
+    """续租已转交的锁，锁已被其他执行者接管时返回 False"""
+    return get_backend().renew(name, token, ttl)
+
+
+def release(name, token):
+    """释放已转交的锁"""
+    return get_backend().release(name, token)
+
+
+def hand_over(ttl):
+    """把当前任务持有的锁转交给后续任务，返回 (锁名称, 令牌)；当前任务未持有锁时返回 None"""
+    lease = getattr(_local, 'lease', None)
+    if lease is None:
+        return None
+    return lease.hand_over(ttl)
+
+
+def check_lease():
+    """在长时间运行的任务循环中调用：当前任务的锁已丢失时抛出 LeaseLost"""
+    lease = getattr(_local, 'lease', None)
+    if lease is not None:
+        lease.check()
+
+
+def single_instance(lock_name=None, ttl=DEFAULT_TTL):
+    """任务互斥装饰器：同名任务正在执行时直接跳过，返回 status=skipped；执行中丢失锁时返回 status=aborted"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            name = lock_name or self.name
+            holder = {
+                'task_id': self.request.id,
+                'hostname': self.request.hostname or socket.gethostname(),
+                'pid': os.getpid(),
+                'acquired_at': timezone.now().isoformat(),
+            }
+            lease = acquire(name, holder, ttl)
+            if lease is None:
+                current = get_holder(name)
+                logger.info(f"任务{name}正在执行中，跳过本次运行: {current}")
+                return {
+                    'status': 'skipped',
+                    'reason': 'locked',
+                    'lock': name,
+                    'holder': current,
+                }
+            previous = getattr(_local, 'lease', None)
+            _local.lease = lease
+            try:
+                with lease:
+                    result = func(self, *args, **kwargs)
+                    # 任务未检查或在最后一次检查后丢失锁
+                    lease.check()
+                    return result
+            except LeaseLost:
+                logger.error(f"任务{name}的锁已被其他执行者接管，终止本次运行")
+                return {
+                    'status': 'aborted',
+                    'reason': 'lock_lost',
+                    'lock': name,
+                }
+            finally:
+                _local.lease = previous
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLock',
+            fields=[
+                ('name', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='锁名称')),
+                ('token', models.CharField(max_length=64, verbose_name='持有令牌')),
+                ('holder', models.JSONField(default=dict, verbose_name='持有者信息')),
+                ('acquired_at', models.DateTimeField(verbose_name='获取时间')),
+                ('expires_at', models.DateTimeField(verbose_name='到期时间')),
+            ],
+            options={
+                'verbose_name': '任务锁',
+                'verbose_name_plural': '任务锁',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pipeline', models.CharField(max_length=100, verbose_name='流水线')),
+                ('run_date', models.DateField(verbose_name='业务日期')),
+                ('status', models.CharField(choices=[('running', '运行中'), ('waiting', '等待分片完成'), ('success', '成功'), ('failed', '失败')], default='running', max_length=20, verbose_name='状态')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+            ],
+            options={
+                'verbose_name': '流水线运行',
+                'verbose_name_plural': '流水线运行',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineStageRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=100, verbose_name='阶段')),
+                ('status', models.CharField(choices=[('running', '运行中'), ('success', '成功'), ('skipped', '跳过'), ('failed', '失败')], default='running', max_length=20, verbose_name='状态')),
+                ('input_version', models.CharField(blank=True, default='', max_length=64, verbose_name='输入水位')),
+                ('output_version', models.CharField(blank=True, default='', max_length=64, verbose_name='输出水位')),
+                ('started_at', models.DateTimeField(verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='耗时(毫秒)')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='执行结果')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='tasks.pipelinerun', verbose_name='流水线运行')),
+            ],
+            options={
+                'verbose_name': '流水线阶段',
+                'verbose_name_plural': '流水线阶段',
+                'ordering': ['run', 'started_at'],
+                'indexes': [models.Index(fields=['stage', 'status'], name='idx_stage_run_stage_status')],
+            },
+        ),
+    ]
@@ -1,3 +1,91 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class TaskLock(models.Model):
+    """
+    定时任务互斥锁（数据库后端）
+    
+    未配置 Redis 时由 tasks.locks.DatabaseLockBackend 使用。
+    每个任务名一行，expires_at 之前有效，持有者需在到期前续租。
+    """
+    
+    name = models.CharField(_('锁名称'), max_length=200, primary_key=True)
+    token = models.CharField(_('持有令牌'), max_length=64)
+    holder = models.JSONField(_('持有者信息'), default=dict)
+    acquired_at = models.DateTimeField(_('获取时间'))
+    expires_at = models.DateTimeField(_('到期时间'))
+    
+    class Meta:
+        verbose_name = _('任务锁')
+        verbose_name_plural = _('任务锁')
+    
+    def __str__(self):
+        return self.name
+
+
+class PipelineRun(models.Model):
+    """流水线运行记录"""
+    
+    STATUS_CHOICES = (
+        ('running', '运行中'),
+        ('waiting', '等待分片完成'),
+        ('success', '成功'),
+        ('failed', '失败'),
+    )
+    
+    pipeline = models.CharField(_('流水线'), max_length=100)
+    run_date = models.DateField(_('业务日期'))
+    status = models.CharField(_('状态'), max_length=20, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(_('开始时间'), auto_now_add=True)
+    finished_at = models.DateTimeField(_('结束时间'), blank=True, null=True)
+    
+    class Meta:
+        verbose_name = _('流水线运行')
+        verbose_name_plural = _('流水线运行')
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.pipeline} - {self.run_date}"
+
+
+class PipelineStageRun(models.Model):
+    """
+    流水线阶段运行记录
+    
+    input_version 为阶段开始时输入数据水位的摘要，与该阶段上次成功运行的
+    input_version 相同时跳过；output_version 为阶段结束后发布的输出水位。
+    """
+    
+    STATUS_CHOICES = (
+        ('running', '运行中'),
+        ('success', '成功'),
+        ('skipped', '跳过'),
+        ('failed', '失败'),
+    )
+    
+    run = models.ForeignKey(
+        PipelineRun,
+        on_delete=models.CASCADE,
+        verbose_name=_('流水线运行'),
+        related_name='stages'
+    )
+    stage = models.CharField(_('阶段'), max_length=100)
+    status = models.CharField(_('状态'), max_length=20, choices=STATUS_CHOICES, default='running')
+    input_version = models.CharField(_('输入水位'), max_length=64, blank=True, default='')
+    output_version = models.CharField(_('输出水位'), max_length=64, blank=True, default='')
+    started_at = models.DateTimeField(_('开始时间'))
+    finished_at = models.DateTimeField(_('结束时间'), blank=True, null=True)
+    duration_ms = models.PositiveIntegerField(_('耗时(毫秒)'), blank=True, null=True)
+    result = models.JSONField(_('执行结果'), blank=True, null=True)
+    
+    class Meta:
+        verbose_name = _('流水线阶段')
+        verbose_name_plural = _('流水线阶段')
+        ordering = ['run', 'started_at']
+        indexes = [
+            models.Index(fields=['stage', 'status'], name='idx_stage_run_stage_status'),
+        ]
+    
+    def __str__(self):
+        return f"{self.run_id} - {self.stage}"
@@ -0,0 +1,276 @@
+"""
+夜间风险批处理流水线
+
+    sync_risk_indicators → detect_abnormal_trades → check_risk_alerts
+        → cache_warmup → export_daily_report
+
+每个阶段声明其输入数据水位（watermark），阶段开始前计算输入水位摘要，与该阶段
+上次成功运行时的摘要相同则跳过；阶段完成后发布输出水位，下游阶段据此判断是否需要
+重算。各阶段的状态、水位与耗时记录在 PipelineRun / PipelineStageRun 中。
+
+同步阶段以 chord 分发到多个 worker，汇总完成后由回调续跑流水线的后续阶段。
+"""
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_NAME = 'nightly_risk'
+
+
+def _portfolios_watermark(date):
+    from risk.models import Portfolio
+
+    return Portfolio.objects.filter(status='active').aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    )
+
+
+def _indicators_watermark(date):
+    from risk.models import RiskIndicator
+
+    return RiskIndicator.objects.aggregate(
+        count=Count('id'), last_id=Max('id'), created=Max('created_at')
+    )
+
+
+def _trades_watermark(date):
+    from risk.models import Trade
+
+    return Trade.objects.filter(trade_date=date).aggregate(
+        count=Count('id'), updated=Max('updated_at'), amount=Sum('amount')
+    )
+
+
+def _abnormal_trades_watermark(date):
+    from risk.models import Trade
+
+    return Trade.objects.filter(trade_date=date).aggregate(
+        abnormal=Count('id', filter=Q(is_abnormal=True))
+    )
+
+
+def _alerts_watermark(date):
+    from risk.models import RiskAlert
+
+    return RiskAlert.objects.aggregate(
+        count=Count('id'), last_id=Max('id'), handled=Max('handled_at'),
+        pending=Count('id', filter=Q(status='pending')),
+    )
+
+
+# 数据水位：每个水位一条聚合查询
+WATERMARKS = {
+    'date': lambda date: date.isoformat(),
+    'portfolios': _portfolios_watermark,
+    'indicators': _indicators_watermark,
+    'trades': _trades_watermark,
+    'abnormal_trades': _abnormal_trades_watermark,
+    'alerts': _alerts_watermark,
+}
+
+
+@dataclass(frozen=True)
+class Stage:
+    """流水线阶段
+
+    task: 任务名（tasks.tasks 中的函数名）
+    inputs: 输入水位，全部未变化时跳过本阶段
+    outputs: 本阶段发布的输出水位
+    fan_out: 是否以 chord 分发，完成后由回调续跑流水线
+    """
+    task: str
+    description: str
+    inputs: tuple
+    outputs: tuple = ()
+    fan_out: bool = False
+    kwargs: dict = field(default_factory=dict)
+
+
+STAGES = (
+    Stage('sync_risk_indicators', '同步风险指标数据',
+          inputs=('date', 'portfolios'), outputs=('indicators',), fan_out=True),
+    Stage('detect_abnormal_trades', '检测异常交易',
+          inputs=('date', 'trades'), outputs=('abnormal_trades',)),
+    Stage('check_risk_alerts', '检查风险预警',
+          inputs=('portfolios', 'indicators'), outputs=('alerts',)),
+    Stage('cache_warmup', '缓存预热',
+          inputs=('date', 'portfolios', 'indicators', 'trades', 'abnormal_trades', 'alerts')),
+    Stage('export_daily_report', '导出日报',
+          inputs=('date', 'portfolios', 'indicators', 'trades', 'abnormal_trades', 'alerts')),
+)
+
+# 接收业务日期参数的阶段
+DATED_STAGES = {'detect_abnormal_trades', 'export_daily_report'}
+
+
+def compute_version(names, date):
+    """计算一组水位的摘要"""
+    values = {name: WATERMARKS[name](date) for name in names}
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def last_success(stage):
+    """阶段最近一次成功运行记录"""
+    from .models import PipelineStageRun
+
+    return (
+        PipelineStageRun.objects.filter(stage=stage.task, status='success')
+        .order_by('-finished_at')
+        .first()
+    )
+
+
+def _get_task(name):
+    from . import tasks
+
+    return getattr(tasks, name)
+
+
+def _finish_stage(stage_run, status, result, output_version=''):
+    now = timezone.now()
+    stage_run.status = status
+    stage_run.result = result
+    stage_run.output_version = output_version
+    stage_run.finished_at = now
+    stage_run.duration_ms = int((now - stage_run.started_at).total_seconds() * 1000)
+    stage_run.save(update_fields=[
+        'status', 'result', 'output_version', 'finished_at', 'duration_ms'
+    ])
+
+
+def _stage_status(result):
+    if isinstance(result, dict) and result.get('status') in ('error', 'partial'):
+        return 'failed'
+    return 'success'
+
+
+def _finish_run(run, status):
+    run.status = status
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+
+
+def resume_fan_out(run, stage, result):
+    """chord 回调：记录分发阶段的结果，失败时终止流水线"""
+    stage_run = run.stages.filter(stage=stage.task, status='running').first()
+    if stage_run is None:
+        return 'success'
+    status = _stage_status(result)
+    output_version = compute_version(stage.outputs, run.run_date) if stage.outputs else ''
+    _finish_stage(stage_run, status, result, output_version)
+    return status
+
+
+def run_stages(run, start=0, previous=None, task=None):
+    """从第 start 个阶段开始执行流水线
+
+    previous 为上一个分发阶段的汇总结果（chord 回调续跑时传入）。
+    遇到分发阶段时派发 chord 并返回，由回调以 start+1 续跑。
+    """
+    from .models import PipelineStageRun
+
+    if start > 0 and STAGES[start - 1].fan_out:
+        if resume_fan_out(run, STAGES[start - 1], previous) == 'failed':
+            _finish_run(run, 'failed')
+            return summarize(run)
+
+    run.status = 'running'
+    run.save(update_fields=['status'])
+
+    reporter = ProgressReporter(task, len(STAGES), interval=0)
+    reporter.processed = start
+    for index in range(start, len(STAGES)):
+        stage = STAGES[index]
+        reporter.report(stage=stage.task, run_id=run.id)
+        input_version = compute_version(stage.inputs, run.run_date)
+        previous_run = last_success(stage)
+
+        if previous_run and previous_run.input_version == input_version:
+            now = timezone.now()
+            PipelineStageRun.objects.create(
+                run=run, stage=stage.task, status='skipped',
+                input_version=input_version,
+                output_version=previous_run.output_version,
+                started_at=now, finished_at=now, duration_ms=0,
+                result={'reason': 'unchanged'},
+            )
+            logger.info(f"流水线阶段{stage.task}输入未变化，跳过")
+            reporter.processed += 1
+            continue
+
+        stage_run = PipelineStageRun.objects.create(
+            run=run, stage=stage.task, input_version=input_version,
+            started_at=timezone.now(),
+        )
+        stage_task = _get_task(stage.task)
+        kwargs = dict(stage.kwargs)
+        if stage.task in DATED_STAGES:
+            kwargs['date'] = run.run_date.isoformat()
+
+        if stage.fan_out and task is not None:
+            # 由 chord 回调续跑后续阶段；先置为等待，避免与回调的状态更新交错
+            kwargs['then'] = task.s(run_id=run.id, start=index + 1)
+            run.status = 'waiting'
+            run.save(update_fields=['status'])
+            result = stage_task.apply(kwargs=kwargs).get()
+            if result.get('status') not in ('skipped', 'error'):
+                logger.info(f"流水线阶段{stage.task}已分发，等待分片完成")
+                run.refresh_from_db()
+                return summarize(run)
+            # 锁被占用或分发失败时回调不会触发，在本进程内继续
+            run.status = 'running'
+            run.save(update_fields=['status'])
+        else:
+            result = stage_task.apply(kwargs=kwargs).get()
+
+        status = _stage_status(result)
+        if isinstance(result, dict) and result.get('status') == 'skipped':
+            status = 'skipped'
+        output_version = compute_version(stage.outputs, run.run_date) if stage.outputs else ''
+        _finish_stage(stage_run, status, result, output_version)
+
+        if status == 'failed':
+            logger.error(f"流水线阶段{stage.task}失败，终止后续阶段: {result}")
+            _finish_run(run, 'failed')
+            return summarize(run)
+        reporter.processed += 1
+
+    _finish_run(run, 'success')
+    return summarize(run)
+
+
+def start_run(date=None):
+    """创建一次流水线运行"""
+    from .models import PipelineRun
+
+    return PipelineRun.objects.create(
+        pipeline=PIPELINE_NAME, run_date=date or timezone.now().date()
+    )
+
+
+def summarize(run):
+    """运行概况与各阶段耗时"""
+    return {
+        'status': run.status,
+        'run_id': run.id,
+        'date': run.run_date.isoformat(),
+        'stages': [
+            {
+                'stage': s.stage,
+                'status': s.status,
+                'duration_ms': s.duration_ms,
+                'input_version': s.input_version,
+                'output_version': s.output_version,
+            }
+            for s in sorted(run.stages.all(), key=lambda s: (s.started_at, s.id))
+        ],
+    }
@@ -0,0 +1,181 @@
+"""
+任务进度
+
+长任务通过 update_state 上报结构化进度（state=PROGRESS），meta 格式:
+
+    {'processed': 120, 'total': 500, 'rate': 35.2, 'eta': 10.8, 'stage': '...'}
+
+以 chord 分发的任务（风险指标同步）由各分片在缓存中累加已处理数量，
+状态接口按父任务 ID 读取汇总进度；流水线按 PipelineRun 的阶段完成情况计算进度。
+
+汇总进度需要 worker 与 Web 进程共享的缓存（TASK_PROGRESS_CACHE_ALIAS，如 Redis）。
+进程内缓存（LocMem/Dummy）下不登记汇总进度，改由 chord 汇总回调的结果判断是否完成。
+"""
+import logging
+import time
+
+from celery import current_app
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STATE = 'PROGRESS'
+FAN_OUT_KEY = 'task-progress:{}'
+FAN_OUT_TIMEOUT = 24 * 60 * 60
+
+
+def build_meta(processed, total, started, **extra):
+    """由已处理数量与开始时间计算处理速率和预计剩余时间"""
+    elapsed = max(time.time() - started, 1e-6)
+    rate = processed / elapsed
+    meta = {
+        'processed': processed,
+        'total': total,
+        'rate': round(rate, 2),
+        'eta': round((total - processed) / rate, 1) if rate and total else None,
+    }
+    meta.update(extra)
+    return meta
+
+
+class ProgressReporter:
+    """在任务内上报进度，interval 秒内最多写一次结果后端"""
+
+    def __init__(self, task, total, interval=1.0):
+        self.task = task
+        self.total = total
+        self.interval = interval
+        self.processed = 0
+        self.started = time.time()
+        self._reported = 0.0
+
+    def advance(self, count=1, **extra):
+        self.processed += count
+        now = time.time()
+        if now - self._reported >= self.interval or self.processed >= self.total:
+            self._reported = now
+            self.report(**extra)
+
+    def report(self, **extra):
+        # 直接调用（非 worker 执行）时没有任务ID，不上报
+        if self.task is None or not self.task.request.id or self.task.request.is_eager:
+            return
+        self.task.update_state(
+            state=PROGRESS_STATE,
+            meta=build_meta(self.processed, self.total, self.started, **extra),
+        )
+
+
+def fan_out_cache():
+    """汇总进度所用的缓存；不能跨进程共享时返回 None
+    
+    任务以 eager 方式在当前进程执行时进程内缓存同样可用。
+    """
+    cache = caches[getattr(settings, 'TASK_PROGRESS_CACHE_ALIAS', 'default')]
+    if isinstance(cache, (LocMemCache, DummyCache)) and not current_app.conf.task_always_eager:
+        return None
+    return cache
+
+
+def start_fan_out(task_id, total):
+    """登记分发任务的总量"""
+    cache = fan_out_cache()
+    if cache is None:
+        logger.warning("任务进度缓存为进程内缓存，不登记分片汇总进度")
+        return
+    cache.set(
+        FAN_OUT_KEY.format(task_id),
+        {'total': total, 'started': time.time()},
+        FAN_OUT_TIMEOUT,
+    )
+    cache.set(FAN_OUT_KEY.format(task_id) + ':processed', 0, FAN_OUT_TIMEOUT)
+
+
+def advance_fan_out(task_id, count):
+    """分片完成后累加已处理数量"""
+    cache = fan_out_cache()
+    if not task_id or cache is None:
+        return
+    try:
+        cache.incr(FAN_OUT_KEY.format(task_id) + ':processed', count)
+    except ValueError:
+        # 登记已过期
+        pass
+
+
+def get_fan_out(task_id):
+    cache = fan_out_cache()
+    if cache is None:
+        return None
+    key = FAN_OUT_KEY.format(task_id)
+    values = cache.get_many([key, key + ':processed'])
+    info = values.get(key)
+    if info is None:
+        return None
+    return build_meta(values.get(key + ':processed', 0), info['total'], info['started'])
+
+
+def get_pipeline_progress(run_id):
+    from .models import PipelineRun
+    from .pipeline import STAGES
+
+    run = PipelineRun.objects.filter(pk=run_id).first()
+    if run is None:
+        return None
+    stages = list(run.stages.values_list('stage', 'status'))
+    done = sum(1 for _, stage_status in stages if stage_status != 'running')
+    current = next((stage for stage, stage_status in stages if stage_status == 'running'), None)
+    return {
+        'processed': done,
+        'total': len(STAGES),
+        'run_id': run.id,
+        'run_status': run.status,
+        'stage': current,
+    }
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (dict, list, str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def get_status(task_id, result=None):
+    """任务状态与结构化进度"""
+    if result is None:
+        result = AsyncResult(task_id)
+    state = result.state
+    info = result.info
+    data = {
+        'task_id': task_id,
+        'status': state,
+        'ready': result.ready(),
+        'done': result.ready(),
+        'progress': None,
+        'result': None,
+    }
+
+    if state == PROGRESS_STATE:
+        data['progress'] = info
+    elif result.ready():
+        data['result'] = _jsonable(info)
+
+    # 已分发的任务在结果返回后继续由分片/流水线推进
+    if isinstance(info, dict):
+        if info.get('status') == 'dispatched':
+            progress = get_fan_out(task_id)
+            data['progress'] = progress
+            if progress is not None:
+                data['done'] = progress['processed'] >= progress['total']
+            elif info.get('callback_id'):
+                # 无汇总进度（非共享缓存或登记已过期）时以汇总回调是否结束为准
+                data['done'] = AsyncResult(info['callback_id']).ready()
+        elif info.get('run_id') and info.get('status') in ('running', 'waiting'):
+            progress = get_pipeline_progress(info['run_id'])
+            data['progress'] = progress
+            data['done'] = progress is None or progress['run_status'] not in ('running', 'waiting')
+    return data
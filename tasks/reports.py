@@ -0,0 +1,307 @@
+"""
+风险日报
+
+以固定数量的集合查询收集日报各部分数据，逐行流式写入磁盘文件:
+
+    1. 运行中组合（含最新一期指标ID）
+    2. 最新一期风险指标（以子查询按组合取最新，一条查询）
+    3. 当日交易汇总（一条聚合查询）
+    4. 当日预警汇总（一条聚合查询）
+
+支持 csv / xlsx（openpyxl write-only 模式）/ parquet（pyarrow，每个部分一个文件）。
+生成的文件以 业务日期 + 数据水位 命名，数据未变化时重复导出直接返回已有文件。
+"""
+import csv
+import logging
+import os
+import shutil
+from datetime import date as date_cls
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+from .locks import check_lease
+from .pipeline import compute_version
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'xlsx', 'parquet')
+
+# 日报依赖的数据水位（见 pipeline.WATERMARKS）
+REPORT_WATERMARKS = ('portfolios', 'indicators', 'trades', 'abnormal_trades', 'alerts')
+# 水位缓存按风险数据命名空间版本区分（见 risk.cache），数据写入后自然失效
+WATERMARK_CACHE_DATASET = 'risk_dashboard'
+
+# 各部分的列: (标题, 类型)，类型用于 parquet 的列定义
+SECTIONS = (
+    ('portfolios', '一、组合概况', (
+        ('组合代码', 'str'), ('组合名称', 'str'), ('资产规模', 'num'), ('状态', 'str'),
+    )),
+    ('indicators', '二、风险指标', (
+        ('组合代码', 'str'), ('日收益率', 'num'), ('年化收益率', 'num'),
+        ('夏普比率', 'num'), ('最大回撤', 'num'), ('VaR', 'num'),
+    )),
+    ('trades', '三、今日交易', (
+        ('总交易笔数', 'int'), ('总成交金额', 'num'), ('异常交易笔数', 'int'),
+    )),
+    ('alerts', '四、风险预警', (
+        ('待处理预警数', 'int'), ('严重预警数', 'int'),
+    )),
+)
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def _latest_indicator_ids():
+    from risk.models import Portfolio, RiskIndicator
+
+    latest = RiskIndicator.objects.filter(portfolio=OuterRef('pk')).order_by(
+        '-indicator_date', '-created_at'
+    ).values('id')[:1]
+    return Portfolio.objects.filter(status='active').annotate(
+        latest_indicator_id=Subquery(latest)
+    ).values('latest_indicator_id')
+
+
+def portfolio_rows():
+    from risk.models import Portfolio
+
+    return Portfolio.objects.filter(status='active').order_by('code').values_list(
+        'code', 'name', 'asset_scale', 'status'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def indicator_rows():
+    from risk.models import RiskIndicator
+
+    return RiskIndicator.objects.filter(
+        id__in=_latest_indicator_ids()
+    ).order_by('portfolio__code').values_list(
+        'portfolio__code', 'daily_return', 'annualized_return',
+        'sharpe_ratio', 'max_drawdown', 'value_at_risk'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def trade_rows(date):
+    from risk.models import Trade
+
+    summary = Trade.objects.filter(trade_date=date).aggregate(
+        count=Count('id'),
+        amount=Sum('amount'),
+        abnormal=Count('id', filter=Q(is_abnormal=True)),
+    )
+    return [(summary['count'], summary['amount'], summary['abnormal'])]
+
+
+def alert_rows(date):
+    from risk.models import RiskAlert
+
+    summary = RiskAlert.objects.filter(alert_time__date=date).aggregate(
+        pending=Count('id', filter=Q(status='pending')),
+        critical=Count('id', filter=Q(severity='critical')),
+    )
+    return [(summary['pending'], summary['critical'])]
+
+
+def iter_sections(date):
+    """按顺序产出 (部分, 标题, 列, 行迭代器)，每部分一条查询"""
+    sources = {
+        'portfolios': portfolio_rows,
+        'indicators': indicator_rows,
+        'trades': lambda: trade_rows(date),
+        'alerts': lambda: alert_rows(date),
+    }
+    for key, title, columns in SECTIONS:
+        yield key, title, columns, sources[key]()
+
+
+class CsvReportWriter:
+    """单个 CSV 文件，保持原日报的分段版式"""
+
+    suffix = '.csv'
+
+    def __init__(self, path, date):
+        # utf-8-sig 便于 Excel 直接打开中文
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['风险日报', str(date)])
+
+    def start_section(self, key, title, columns):
+        self.writer.writerow([])
+        self.writer.writerow([title])
+        self.writer.writerow([label for label, _ in columns])
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxReportWriter:
+    """write-only 工作簿，每个部分一个工作表，行写入后即刷出，不在内存中保留"""
+
+    suffix = '.xlsx'
+
+    def __init__(self, path, date):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+
+    def start_section(self, key, title, columns):
+        self.sheet = self.workbook.create_sheet(title=title[2:])
+        self.sheet.append([label for label, _ in columns])
+
+    def write_row(self, row):
+        self.sheet.append(list(row))
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class ParquetReportWriter:
+    """目录下每个部分一个 parquet 文件，按批写入行组"""
+
+    suffix = ''
+    batch_size = 10000
+    TYPES = {'str': 'string', 'num': 'float64', 'int': 'int64'}
+
+    def __init__(self, path, date):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.writer = None
+        self.schema = None
+        self.rows = []
+
+    def start_section(self, key, title, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._close_section()
+        self.schema = pa.schema([
+            (label, getattr(pa, self.TYPES[kind])()) for label, kind in columns
+        ])
+        self.writer = pq.ParquetWriter(os.path.join(self.path, f'{key}.parquet'), self.schema)
+
+    def write_row(self, row):
+        self.rows.append([float(v) if isinstance(v, Decimal) else v for v in row])
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+
+        if self.rows:
+            columns = list(zip(*self.rows))
+            self.writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema,
+            ))
+            self.rows = []
+
+    def _close_section(self):
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+            self.writer = None
+
+    def close(self):
+        self._close_section()
+
+
+WRITERS = {
+    'csv': CsvReportWriter,
+    'xlsx': XlsxReportWriter,
+    'parquet': ParquetReportWriter,
+}
+
+
+def get_reports_dir():
+    path = Path(getattr(settings, 'REPORTS_DIR', Path(settings.BASE_DIR) / 'reports'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def get_report_watermark(date):
+    """日报数据水位
+
+    水位计算需要 5 条聚合查询，结果按 业务日期 + 命名空间版本 缓存。
+    模型写入（信号）与批量写入任务都会递增命名空间版本；不经过二者的写入
+    （如 QuerySet.update）由 REPORT_WATERMARK_CACHE_TIMEOUT 秒的过期时间兜底。
+    """
+    from risk import cache as risk_cache
+
+    cache = risk_cache.get_cache()
+    key = f'report-watermark:{date}:{risk_cache.get_stamp(WATERMARK_CACHE_DATASET)}'
+    watermark = cache.get(key)
+    if watermark is None:
+        watermark = compute_version(REPORT_WATERMARKS, date)
+        cache.set(key, watermark, getattr(settings, 'REPORT_WATERMARK_CACHE_TIMEOUT', 60))
+    return watermark
+
+
+def build_daily_report(date=None, fmt='csv', reporter=None):
+    """生成日报文件
+
+    返回 {'path', 'filename', 'format', 'watermark', 'cached', 'rows'}。
+    同一日期、同一数据水位的文件已存在时直接返回（cached=True）。
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f'不支持的日报格式: {fmt}')
+    if date is None:
+        from django.utils import timezone
+        date = timezone.now().date()
+    elif isinstance(date, str):
+        date = date_cls.fromisoformat(date)
+
+    writer_class = WRITERS[fmt]
+    watermark = get_report_watermark(date)
+    filename = f'risk_report_{date}_{watermark}{writer_class.suffix}'
+    path = get_reports_dir() / filename
+    result = {
+        'path': str(path),
+        'filename': filename,
+        'format': fmt,
+        'watermark': watermark,
+    }
+    if path.exists():
+        logger.info(f"日报{filename}数据未变化，使用已生成文件")
+        return dict(result, cached=True, rows=None)
+
+    # 先写入临时文件，完成后原子替换，避免读取到写了一半的文件
+    tmp_path = path.with_name(f'.{filename}.{os.getpid()}.tmp')
+    rows = 0
+    writer = writer_class(str(tmp_path), date)
+    try:
+        for key, title, columns, section_rows in iter_sections(date):
+            writer.start_section(key, title, columns)
+            for row in section_rows:
+                writer.write_row(row)
+                rows += 1
+            if reporter is not None:
+                reporter.advance(stage=key)
+            # 锁已被其他执行者接管时放弃本次生成
+            check_lease()
+        writer.close()
+        os.replace(tmp_path, path)
+    except Exception:
+        _remove(tmp_path)
+        raise
+
+    # 清理同一日期旧水位的文件
+    for stale in path.parent.glob(f'risk_report_{date}_*'):
+        if stale.name != filename and stale.suffix == writer_class.suffix:
+            _remove(stale)
+
+    return dict(result, cached=False, rows=rows)
@@ -1,71 +1,214 @@
 from celery import shared_task
-from celery.exceptions import SoftTimeLimitExceeded
 from django.utils import timezone
-from django.core.cache import cache
 from django.db import transaction, models
 from django.db.models import Sum, Avg, Max
 from decimal import Decimal
 import logging
 import json
 
+from . import locks
+from .locks import LeaseLost, check_lease, single_instance
+from . import progress
+
 logger = logging.getLogger(__name__)
 
 
+# 分片重试参数
+SYNC_CHUNK_MAX_RETRIES = 3
+SYNC_CHUNK_RETRY_DELAY = 10  # 秒，按指数退避
+# 分发后转交给分片的锁租期：每个分片开始时续租，覆盖单个分片的执行时间与重试等待
+SYNC_LOCK_TTL = 15 * 60
+
+
 @shared_task(bind=True, name='tasks.sync_risk_indicators')
-def sync_risk_indicators(self):
-    """同步风险指标数据"""
-    from risk.models import Portfolio, RiskIndicator
+@single_instance(ttl=5 * 60)
+def sync_risk_indicators(self, chunk_size=None, then=None):
+    """同步风险指标数据
+    
+    将运行中组合按 chunk_size 分片，以 chord 形式分发到所有 worker 并行处理，
+    全部分片完成后由 finalize_sync_risk_indicators 汇总结果并使缓存失效。
+    then 为汇总完成后继续执行的任务签名（接收汇总结果），供流水线衔接下游阶段。
+    
+    任务锁在分发后转交给分片，由汇总回调释放，分片执行期间新的同步会被跳过。
+    """
+    from celery import chord, signature
+    from django.conf import settings
+    from risk.models import Portfolio
     
     logger.info("开始同步风险指标数据")
     
     try:
-        today = timezone.now().date()
-        portfolios = Portfolio.objects.filter(status='active')
+        today = timezone.now().date().isoformat()
+        chunk_size = chunk_size or settings.RISK_SYNC_CHUNK_SIZE
+        portfolio_ids = list(
+            Portfolio.objects.filter(status='active')
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        chunks = [
+            portfolio_ids[i:i + chunk_size]
+            for i in range(0, len(portfolio_ids), chunk_size)
+        ]
         
-        for portfolio in portfolios:
-            # 检查是否已有今日指标
-            if RiskIndicator.objects.filter(
-                portfolio=portfolio,
-                indicator_date=today
-            ).exists():
-                logger.info(f"组合{portfolio.code}今日指标已存在，跳过")
-                continue
-            
-            # 模拟生成风险指标（实际应从数据源获取）
-            indicator = RiskIndicator.objects.create(
-                portfolio=portfolio,
-                indicator_date=today,
-                daily_return=Decimal('0.0012'),
-                cumulative_return=Decimal('0.0523'),
-                annualized_return=Decimal('0.1234'),
-                daily_volatility=Decimal('0.0123'),
-                annualized_volatility=Decimal('0.1987'),
-                max_drawdown=Decimal('-0.0523'),
-                value_at_risk=Decimal('0.0234'),
-                sharpe_ratio=Decimal('0.6523'),
-                sortino_ratio=Decimal('0.8923'),
-                information_ratio=Decimal('0.1234'),
-                industry_concentration=Decimal('0.2345'),
-                stock_concentration=Decimal('0.3456'),
-                top10_holdings_ratio=Decimal('0.4523')
-            )
-            
-            logger.info(f"组合{portfolio.code}风险指标已生成")
+        if not chunks:
+            summary = finalize_sync_risk_indicators([], today)
+            if then:
+                signature(then).delay(summary)
+            return summary
         
-        # 清除缓存
-        cache.delete('risk_indicators_latest')
+        lock = locks.hand_over(SYNC_LOCK_TTL)
+        callback = finalize_sync_risk_indicators.s(today, lock=lock)
+        if then:
+            callback = callback | signature(then)
+        # 各分片完成后按本任务ID累加进度
+        progress.start_fan_out(self.request.id, len(portfolio_ids))
+        try:
+            result = chord(
+                sync_risk_indicators_chunk.s(chunk, today, progress_id=self.request.id, lock=lock)
+                for chunk in chunks
+            )(callback)
+        except Exception:
+            if lock:
+                locks.release(*lock)
+            raise
         
-        return {'status': 'success', 'portfolios_processed': portfolios.count()}
+        logger.info(f"风险指标同步已分发: {len(portfolio_ids)}个组合, {len(chunks)}个分片")
+        return {
+            'status': 'dispatched',
+            'portfolios': len(portfolio_ids),
+            'chunks': len(chunks),
+            'callback_id': result.id,
+        }
     
-    except SoftTimeLimitExceeded:
-        logger.error("同步风险指标任务超时")
-        return {'status': 'error', 'message': '任务超时'}
+    except LeaseLost:
+        raise
     except Exception as e:
         logger.error(f"同步风险指标失败: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
 
+def _insert_risk_indicators(portfolio_ids, date):
+    """写入分片内组合的当日风险指标，返回 (实际新增行数, 已存在/被跳过行数)
+    
+    先锁定分片内的组合，同一批组合的并发写入（重叠运行、重试）依次进行；
+    ignore_conflicts 下冲突行会被静默跳过，新增数按写入后的实际行数统计。
+    """
+    from risk.models import Portfolio, RiskIndicator
+    
+    # 行锁（SQLite 上为空操作，由数据库写锁串行）
+    list(Portfolio.objects.select_for_update().filter(id__in=portfolio_ids).values_list('id', flat=True))
+    
+    # 一次查询取出分片内已有当日指标的组合
+    existing = set(
+        RiskIndicator.objects.filter(
+            portfolio_id__in=portfolio_ids,
+            indicator_date=date
+        ).values_list('portfolio_id', flat=True)
+    )
+    
+    # 模拟生成风险指标（实际应从数据源获取）
+    indicators = [
+        RiskIndicator(
+            portfolio_id=portfolio_id,
+            indicator_date=date,
+            daily_return=Decimal('0.0012'),
+            cumulative_return=Decimal('0.0523'),
+            annualized_return=Decimal('0.1234'),
+            daily_volatility=Decimal('0.0123'),
+            annualized_volatility=Decimal('0.1987'),
+            max_drawdown=Decimal('-0.0523'),
+            value_at_risk=Decimal('0.0234'),
+            sharpe_ratio=Decimal('0.6523'),
+            sortino_ratio=Decimal('0.8923'),
+            information_ratio=Decimal('0.1234'),
+            industry_concentration=Decimal('0.2345'),
+            stock_concentration=Decimal('0.3456'),
+            top10_holdings_ratio=Decimal('0.4523')
+        )
+        for portfolio_id in portfolio_ids
+        if portfolio_id not in existing
+    ]
+    RiskIndicator.objects.bulk_create(indicators, ignore_conflicts=True)
+    present = RiskIndicator.objects.filter(
+        portfolio_id__in=portfolio_ids,
+        indicator_date=date
+    ).count()
+    created = present - len(existing)
+    return created, len(portfolio_ids) - created
+
+
+@shared_task(bind=True, name='tasks.sync_risk_indicators_chunk',
+             soft_time_limit=5 * 60, time_limit=6 * 60)
+def sync_risk_indicators_chunk(self, portfolio_ids, date, progress_id=None, lock=None):
+    """同步一个分片内组合的风险指标，失败时仅重试本分片
+    
+    progress_id 为分发任务的ID，分片完成（含最终失败）后累加其进度。
+    lock 为分发任务转交的 (锁名称, 令牌)，分片开始时续租。
+    """
+    if lock and not locks.renew(*lock, SYNC_LOCK_TTL):
+        logger.warning(f"风险指标同步锁{lock[0]}已过期或被接管")
+    try:
+        with transaction.atomic():
+            created, skipped = _insert_risk_indicators(portfolio_ids, date)
+        progress.advance_fan_out(progress_id, len(portfolio_ids))
+        
+        return {
+            'status': 'success',
+            'created': created,
+            'skipped': skipped,
+        }
+    
+    except Exception as e:
+        retries = self.request.retries
+        if retries < SYNC_CHUNK_MAX_RETRIES:
+            countdown = SYNC_CHUNK_RETRY_DELAY * 2 ** retries
+            logger.warning(f"风险指标分片同步失败，{countdown}秒后重试: {str(e)}")
+            raise self.retry(exc=e, countdown=countdown, max_retries=SYNC_CHUNK_MAX_RETRIES)
+        
+        # 重试耗尽后返回失败结果，不影响其他分片的汇总
+        logger.error(f"风险指标分片同步最终失败: {portfolio_ids}, {str(e)}")
+        progress.advance_fan_out(progress_id, len(portfolio_ids))
+        return {
+            'status': 'error',
+            'portfolio_ids': portfolio_ids,
+            'message': str(e),
+        }
+
+
+@shared_task(bind=True, name='tasks.finalize_sync_risk_indicators')
+def finalize_sync_risk_indicators(self, results, date, lock=None):
+    """汇总各分片同步结果并使指标缓存失效，释放分发任务转交的锁"""
+    from risk import cache as risk_cache
+    
+    if lock:
+        locks.release(*lock)
+    
+    created = sum(r.get('created', 0) for r in results)
+    skipped = sum(r.get('skipped', 0) for r in results)
+    failed = [r for r in results if r.get('status') != 'success']
+    failed_ids = [pid for r in failed for pid in r.get('portfolio_ids', [])]
+    
+    # 批量写入不会触发模型信号，需手动使指标缓存失效
+    if created:
+        risk_cache.invalidate(risk_cache.NS_INDICATORS)
+    
+    if failed:
+        logger.error(f"风险指标同步部分失败: {len(failed)}个分片, 组合{failed_ids}")
+    logger.info(f"风险指标同步完成({date}): 新增{created}, 已存在{skipped}")
+    
+    return {
+        'status': 'partial' if failed else 'success',
+        'date': date,
+        'portfolios_processed': created + skipped,
+        'created': created,
+        'skipped': skipped,
+        'failed_chunks': len(failed),
+        'failed_portfolios': failed_ids,
+    }
+
+
 @shared_task(bind=True, name='tasks.check_risk_alerts')
+@single_instance(ttl=30 * 60)
 def check_risk_alerts(self):
     """检查风险预警"""
     from risk.models import Portfolio, RiskIndicator, RiskAlert
@@ -87,6 +230,7 @@ def check_risk_alerts(self):
         alerts_created = 0
         
         for portfolio in Portfolio.objects.filter(status='active'):
+            check_lease()
             latest_indicator = RiskIndicator.objects.filter(
                 portfolio=portfolio
             ).order_by('-indicator_date').first()
@@ -130,137 +274,97 @@ def check_risk_alerts(self):
         logger.info(f"检查风险预警完成，新增{alerts_created}条预警")
         return {'status': 'success', 'alerts_created': alerts_created}
     
+    except LeaseLost:
+        raise
     except Exception as e:
         logger.error(f"检查风险预警失败: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
 
 @shared_task(bind=True, name='tasks.export_daily_report')
-def export_daily_report(self, date=None):
-    """导出日报"""
-    from risk.models import Portfolio, RiskIndicator, Trade, RiskAlert
-    from django.core.files.base import ContentFile
-    from django.core import mail
-    import csv
-    from io import StringIO
+@single_instance(ttl=30 * 60)
+def export_daily_report(self, date=None, fmt='csv'):
+    """导出日报
+    
+    fmt: csv / xlsx / parquet。同一日期数据未变化时直接返回已生成的文件。
+    """
+    from .reports import build_daily_report, SECTIONS
     
     logger.info("开始导出日报")
     
     try:
-        if date is None:
-            date = timezone.now().date()
-        
-        # 生成CSV报告
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # 标题
-        writer.writerow(['风险日报', str(date)])
-        writer.writerow([])
-        
-        # 组合汇总
-        writer.writerow(['一、组合概况'])
-        writer.writerow(['组合代码', '组合名称', '资产规模', '状态'])
-        for portfolio in Portfolio.objects.filter(status='active'):
-            writer.writerow([
-                portfolio.code, portfolio.name,
-                portfolio.asset_scale, portfolio.status
-            ])
-        writer.writerow([])
-        
-        # 风险指标
-        writer.writerow(['二、风险指标'])
-        writer.writerow(['组合代码', '日收益率', '年化收益率', '夏普比率', '最大回撤', 'VaR'])
-        for portfolio in Portfolio.objects.filter(status='active'):
-            indicator = RiskIndicator.objects.filter(
-                portfolio=portfolio
-            ).order_by('-indicator_date').first()
-            if indicator:
-                writer.writerow([
-                    portfolio.code, indicator.daily_return,
-                    indicator.annualized_return, indicator.sharpe_ratio,
-                    indicator.max_drawdown, indicator.value_at_risk
-                ])
-        writer.writerow([])
-        
-        # 交易统计
-        writer.writerow(['三、今日交易'])
-        today_trades = Trade.objects.filter(trade_date=date)
-        writer.writerow(['总交易笔数', '总成交金额'])
-        writer.writerow([today_trades.count(), today_trades.aggregate(total=Sum('amount'))['total']])
-        writer.writerow([])
-        
-        # 预警统计
-        writer.writerow(['四、风险预警'])
-        alerts = RiskAlert.objects.filter(alert_time__date=date)
-        writer.writerow(['待处理预警数', '严重预警数'])
-        writer.writerow([
-            alerts.filter(status='pending').count(),
-            alerts.filter(severity='critical').count()
-        ])
-        
-        # 保存文件
-        report_content = output.getvalue()
-        filename = f"risk_report_{date}.csv"
+        reporter = progress.ProgressReporter(self, total=len(SECTIONS))
+        report = build_daily_report(date, fmt, reporter=reporter)
         
         # 这里可以添加邮件发送逻辑
         # with mail.get_connection() as connection:
         #     mail.send_mail(...)
         
-        logger.info(f"日报导出完成: {filename}")
-        return {'status': 'success', 'filename': filename}
+        logger.info(f"日报导出完成: {report['filename']}")
+        return dict(report, status='success')
     
+    except LeaseLost:
+        raise
     except Exception as e:
         logger.error(f"导出日报失败: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
 
 @shared_task(bind=True, name='tasks.cache_warmup')
+@single_instance(ttl=10 * 60)
 def cache_warmup(self):
     """缓存预热"""
-    from risk.models import Portfolio, RiskIndicator, RiskAlert
-    from django.db.models import Max
+    from risk import cache as risk_cache
     
     logger.info("开始缓存预热")
     
     try:
-        # 缓存组合列表
-        portfolios = Portfolio.objects.filter(status='active').values('id', 'code', 'name')
-        cache.set('active_portfolios', list(portfolios), 300)
-        
-        # 缓存最新风险指标
-        latest_indicators = RiskIndicator.objects.filter(
-            id__in=RiskIndicator.objects.values('portfolio').annotate(
-                latest_id=Max('id')
-            ).values('latest_id')
-        ).select_related('portfolio')
-        
-        indicators_data = [{
-            'portfolio_code': i.portfolio.code,
-            'portfolio_name': i.portfolio.name,
-            'daily_return': str(i.daily_return),
-            'sharpe_ratio': str(i.sharpe_ratio),
-            'max_drawdown': str(i.max_drawdown),
-        } for i in latest_indicators]
-        
-        cache.set('risk_indicators_latest', indicators_data, 300)
-        
-        # 缓存预警统计
-        alert_stats = {
-            'pending': RiskAlert.objects.filter(status='pending').count(),
-            'critical': RiskAlert.objects.filter(status='pending', severity='critical').count()
-        }
-        cache.set('alert_statistics', alert_stats, 300)
+        # 与视图共用同一组数据集与缓存键，预热结果可直接被视图读取
+        datasets = risk_cache.warm_up(timezone.now().date())
         
         logger.info("缓存预热完成")
-        return {'status': 'success'}
+        return {'status': 'success', 'datasets': datasets}
     
     except Exception as e:
         logger.error(f"缓存预热失败: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
 
+@shared_task(bind=True, name='tasks.sqlite_maintenance')
+@single_instance(ttl=10 * 60)
+def sqlite_maintenance(self):
+    """SQLite 维护：更新查询规划统计并截断 WAL 文件"""
+    from risk_project import sqlite
+
+    try:
+        databases = {alias: sqlite.maintain(alias) for alias in sqlite.sqlite_aliases()}
+        logger.info(f"SQLite维护完成: {databases}")
+        return {'status': 'success', 'databases': databases}
+
+    except Exception as e:
+        logger.error(f"SQLite维护失败: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+
+@shared_task(bind=True, name='tasks.ensure_trade_partitions')
+@single_instance(ttl=10 * 60)
+def ensure_trade_partitions(self, months_ahead=None):
+    """提前创建未来月份的交易分区（仅 PostgreSQL）"""
+    from risk import partitions
+
+    try:
+        created = partitions.ensure_partitions(months_ahead)
+        if created:
+            logger.info(f"新建交易分区: {created}")
+        return {'status': 'success', 'created': created}
+
+    except Exception as e:
+        logger.error(f"创建交易分区失败: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+
 @shared_task(bind=True, name='tasks.detect_abnormal_trades')
+@single_instance(ttl=30 * 60)
 def detect_abnormal_trades(self, date=None):
     """检测异常交易"""
     from risk.models import Trade
@@ -294,9 +398,42 @@ def detect_abnormal_trades(self, date=None):
             abnormal_reason='价格或金额偏离正常范围'
         )
         
+        # 批量更新不会触发模型信号，需手动使交易缓存失效
+        if updated:
+            from risk import cache as risk_cache
+            risk_cache.invalidate(risk_cache.NS_TRADES)
+        
         logger.info(f"检测到{updated}条异常交易")
         return {'status': 'success', 'abnormal_count': updated}
     
     except Exception as e:
         logger.error(f"检测异常交易失败: {str(e)}")
         return {'status': 'error', 'message': str(e)}
+
+
+@shared_task(bind=True, name='tasks.run_nightly_pipeline')
+def run_nightly_pipeline(self, previous=None, run_id=None, start=0):
+    """夜间风险批处理流水线
+    
+    按 pipeline.STAGES 顺序执行，输入数据水位未变化的阶段直接跳过。
+    同步阶段分发后由 chord 回调以 run_id/start 续跑，previous 为回调传入的同步汇总结果。
+    """
+    from . import pipeline
+    from .models import PipelineRun
+    
+    run = None
+    try:
+        if run_id is None:
+            run = pipeline.start_run()
+            logger.info(f"开始执行流水线: {run.id}")
+        else:
+            run = PipelineRun.objects.get(pk=run_id)
+        return pipeline.run_stages(run, start=start, previous=previous, task=self)
+    
+    except Exception as e:
+        logger.error(f"流水线执行失败: {str(e)}")
+        if run is not None:
+            PipelineRun.objects.filter(pk=run.pk).update(
+                status='failed', finished_at=timezone.now()
+            )
+        return {'status': 'error', 'message': str(e)}
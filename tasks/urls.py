@@ -1,8 +1,14 @@
 from django.urls import path
-from .views import TaskListView, TaskExecuteView, TaskStatusView
+from .views import (
+    TaskListView, TaskExecuteView, TaskStatusView, PipelineRunListView,
+    TaskBatchStatusView, TaskProgressStreamView,
+)
 
 urlpatterns = [
     path('', TaskListView.as_view(), name='task-list'),
     path('execute/', TaskExecuteView.as_view(), name='task-execute'),
     path('status/', TaskStatusView.as_view(), name='task-status'),
+    path('status/batch/', TaskBatchStatusView.as_view(), name='task-status-batch'),
+    path('stream/', TaskProgressStreamView.as_view(), name='task-stream'),
+    path('pipeline/runs/', PipelineRunListView.as_view(), name='pipeline-runs'),
 ]
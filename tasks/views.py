@@ -2,52 +2,108 @@ from rest_framework import views, status
 from rest_framework.response import Response
 from celery.result import AsyncResult
 from celery import current_app
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from .tasks import (
     sync_risk_indicators, check_risk_alerts,
-    export_daily_report, cache_warmup, detect_abnormal_trades
+    export_daily_report, cache_warmup, detect_abnormal_trades,
+    run_nightly_pipeline, sqlite_maintenance, ensure_trade_partitions
 )
+from .locks import get_holder
+from .models import PipelineRun, PipelineStageRun
+from . import pipeline, progress
+
+TASK_MAP = {
+    'run_nightly_pipeline': run_nightly_pipeline,
+    'sync_risk_indicators': sync_risk_indicators,
+    'check_risk_alerts': check_risk_alerts,
+    'export_daily_report': export_daily_report,
+    'cache_warmup': cache_warmup,
+    'detect_abnormal_trades': detect_abnormal_trades,
+    'sqlite_maintenance': sqlite_maintenance,
+    'ensure_trade_partitions': ensure_trade_partitions,
+}
+
+
+def describe_schedule(task_name):
+    """由 CELERY_BEAT_SCHEDULE 得到任务的调度描述"""
+    schedules = []
+    for entry in getattr(settings, 'CELERY_BEAT_SCHEDULE', {}).values():
+        if entry['task'] != task_name:
+            continue
+        schedule = entry['schedule']
+        if hasattr(schedule, '_orig_minute'):
+            schedules.append(
+                f"{schedule._orig_minute} {schedule._orig_hour} {schedule._orig_day_of_month} "
+                f"{schedule._orig_month_of_year} {schedule._orig_day_of_week}"
+            )
+        else:
+            schedules.append(str(schedule))
+    return ', '.join(schedules) or None
+
+
+def serialize_stage_run(stage_run):
+    if stage_run is None:
+        return None
+    return {
+        'run_id': stage_run.run_id,
+        'status': stage_run.status,
+        'started_at': stage_run.started_at,
+        'duration_ms': stage_run.duration_ms,
+    }
 
 
 class TaskListView(views.APIView):
     """任务列表"""
     
     def get(self, request):
-        """获取所有定时任务"""
+        """获取流水线及其各阶段任务"""
+        latest = PipelineRun.objects.filter(pipeline=pipeline.PIPELINE_NAME).first()
         tasks = [
             {
-                'name': 'sync_risk_indicators',
-                'description': '同步风险指标数据',
-                'schedule': '每天 6:00',
-                'enabled': True
-            },
-            {
-                'name': 'check_risk_alerts',
-                'description': '检查风险预警',
-                'schedule': '每小时',
-                'enabled': True
-            },
-            {
-                'name': 'export_daily_report',
-                'description': '导出日报',
-                'schedule': '每天 18:00',
-                'enabled': True
-            },
-            {
-                'name': 'cache_warmup',
-                'description': '缓存预热',
-                'schedule': '每30分钟',
-                'enabled': True
-            },
-            {
-                'name': 'detect_abnormal_trades',
-                'description': '检测异常交易',
-                'schedule': '每天收盘后',
-                'enabled': True
+                'name': 'run_nightly_pipeline',
+                'description': '夜间风险批处理流水线',
+                'schedule': describe_schedule(run_nightly_pipeline.name),
+                'enabled': True,
+                'last_run': {
+                    'run_id': latest.id,
+                    'status': latest.status,
+                    'started_at': latest.started_at,
+                    'finished_at': latest.finished_at,
+                } if latest else None,
             }
         ]
+        for index, stage in enumerate(pipeline.STAGES, start=1):
+            stage_run = (
+                PipelineStageRun.objects.filter(stage=stage.task)
+                .order_by('-started_at', '-id')
+                .first()
+            )
+            tasks.append({
+                'name': stage.task,
+                'description': stage.description,
+                'schedule': describe_schedule(TASK_MAP[stage.task].name) or f'流水线第{index}步',
+                'enabled': True,
+                'inputs': list(stage.inputs),
+                'last_run': serialize_stage_run(stage_run),
+            })
         return Response(tasks)
 
 
+class PipelineRunListView(views.APIView):
+    """流水线运行记录及各阶段耗时"""
+    
+    def get(self, request):
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+        runs = PipelineRun.objects.prefetch_related('stages')[:limit]
+        return Response([pipeline.summarize(run) for run in runs])
+
+
 class TaskExecuteView(views.APIView):
     """手动执行任务"""
     
@@ -60,22 +116,26 @@ class TaskExecuteView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        task_map = {
-            'sync_risk_indicators': sync_risk_indicators,
-            'check_risk_alerts': check_risk_alerts,
-            'export_daily_report': export_daily_report,
-            'cache_warmup': cache_warmup,
-            'detect_abnormal_trades': detect_abnormal_trades,
-        }
-        
-        if task_name not in task_map:
+        if task_name not in TASK_MAP:
             return Response(
                 {'error': f'任务{task_name}不存在'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # 任务正在执行时不再重复触发
+        holder = get_holder(TASK_MAP[task_name].name)
+        if holder:
+            return Response(
+                {
+                    'status': 'skipped',
+                    'error': f'任务{task_name}正在执行中',
+                    'lock_holder': holder,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        
         # 异步执行任务
-        task = task_map[task_name].delay()
+        task = TASK_MAP[task_name].delay()
         
         return Response({
             'message': f'任务{task_name}已开始执行',
@@ -88,17 +148,187 @@ class TaskStatusView(views.APIView):
     
     def get(self, request):
         task_id = request.query_params.get('task_id')
+        task_name = request.query_params.get('task_name')
         
-        if not task_id:
+        if not task_id and not task_name:
+            return Response(
+                {'error': '请指定任务ID或任务名称'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = {}
+        if task_id:
+            result = AsyncResult(task_id)
+            task_status = progress.get_status(task_id, result)
+            data.update({
+                'task_id': task_id,
+                'status': task_status['status'],
+                'result': str(result.result) if task_status['result'] else None,
+                'progress': task_status['progress'],
+            })
+            task_name = task_name or result.name
+        
+        # 锁持有者（正在执行该任务的 worker）
+        if task_name:
+            lock_name = TASK_MAP[task_name].name if task_name in TASK_MAP else task_name
+            data['task_name'] = task_name
+            data['lock_holder'] = get_holder(lock_name)
+        
+        return Response(data)
+
+
+MAX_BATCH_TASKS = 100
+
+
+def parse_task_ids(request):
+    """task_ids 支持重复参数或逗号分隔，POST 时也可传列表"""
+    values = request.query_params.getlist('task_ids')
+    if request.method == 'POST':
+        data = request.data.get('task_ids') or []
+        values += data if isinstance(data, list) else [data]
+    task_ids = []
+    for value in values:
+        for task_id in str(value).split(','):
+            task_id = task_id.strip()
+            if task_id and task_id not in task_ids:
+                task_ids.append(task_id)
+    return task_ids
+
+
+class TaskBatchStatusView(views.APIView):
+    """批量查询任务状态与进度"""
+    
+    def get(self, request):
+        return self.batch(request)
+    
+    def post(self, request):
+        return self.batch(request)
+    
+    def batch(self, request):
+        task_ids = parse_task_ids(request)
+        if not task_ids:
             return Response(
                 {'error': '请指定任务ID'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if len(task_ids) > MAX_BATCH_TASKS:
+            return Response(
+                {'error': f'单次最多查询{MAX_BATCH_TASKS}个任务'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response([progress.get_status(task_id) for task_id in task_ids])
+
+
+class EventStreamRenderer(BaseRenderer):
+    """text/event-stream，仅用于错误响应的渲染"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class _StreamSlots:
+    """限制单个进程内同时打开的推送连接数
+    
+    同步 WSGI 下每个推送连接在整个推送期间独占一个 worker 线程，
+    超出 TASK_PROGRESS_STREAM_MAX_CONNECTIONS 时拒绝，由客户端改为轮询批量状态接口。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+    
+    def acquire(self):
+        limit = getattr(settings, 'TASK_PROGRESS_STREAM_MAX_CONNECTIONS', 4)
+        with self._lock:
+            if self.active >= limit:
+                return False
+            self.active += 1
+            return True
+    
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+stream_slots = _StreamSlots()
+
+
+class _SlotStream:
+    """推送内容迭代器，响应关闭（含客户端断开）时释放连接名额"""
+    
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.closed = False
+    
+    def __iter__(self):
+        return self.iterator
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.iterator.close()
+            stream_slots.release()
+
+
+class TaskProgressStreamView(views.APIView):
+    """以服务端推送事件(SSE)持续推送任务进度，全部完成或超时后结束
+    
+    超时后客户端（EventSource）会自动重连，因此单个连接的时长不宜过长。
+    """
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
+    
+    def get(self, request):
+        task_ids = parse_task_ids(request)
+        if not task_ids or len(task_ids) > MAX_BATCH_TASKS:
+            return Response(
+                {'error': f'请指定1~{MAX_BATCH_TASKS}个任务ID'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not stream_slots.acquire():
+            response = Response(
+                {'error': '推送连接数已达上限，请改用批量状态接口轮询'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = str(int(getattr(settings, 'TASK_PROGRESS_STREAM_INTERVAL', 1.0)) or 1)
+            return response
         
-        result = AsyncResult(task_id)
+        response = StreamingHttpResponse(
+            _SlotStream(self.stream(task_ids)), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def stream(self, task_ids):
+        interval = getattr(settings, 'TASK_PROGRESS_STREAM_INTERVAL', 1.0)
+        timeout = getattr(settings, 'TASK_PROGRESS_STREAM_TIMEOUT', 5 * 60)
+        deadline = time.monotonic() + timeout
+        last_sent = {}
+        pending = list(task_ids)
         
-        return Response({
-            'task_id': task_id,
-            'status': result.status,
-            'result': str(result.result) if result.result else None,
-        })
+        while pending:
+            for task_id in list(pending):
+                data = progress.get_status(task_id)
+                # 只推送有变化的状态
+                if data != last_sent.get(task_id):
+                    last_sent[task_id] = data
+                    yield format_event('progress', data)
+                if data['done']:
+                    pending.remove(task_id)
+            if not pending:
+                break
+            if time.monotonic() >= deadline:
+                yield format_event('timeout', {'pending': pending})
+                return
+            # 心跳，防止代理断开空闲连接
+            yield ': keep-alive\n\n'
+            time.sleep(interval)
+        
+        yield format_event('done', {'task_ids': task_ids})
@@ -1,12 +1,19 @@
 """
 风险预警系统 - 单元测试
 """
+import os
+import tempfile
+
+from unittest import skipUnless
+
 import pytest
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, tag
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from accounts.models import User, Role, Permission
+from fakeredis import FakeRedisConnection
 
 
 class UserModelTest(TestCase):
@@ -268,5 +275,1179 @@ class AuthenticationTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+
+FAKE_REDIS_CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://fake-redis:6379/0',
+        'OPTIONS': {
+            'CONNECTION_POOL_KWARGS': {'connection_class': FakeRedisConnection},
+        },
+    }
+}
+
+
+@override_settings(CACHES=FAKE_REDIS_CACHES)
+class RiskCacheTest(APITestCase):
+    """风险数据缓存测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from django.core.cache import cache
+        from risk.models import Portfolio
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.portfolio = Portfolio.objects.create(
+            code='TEST005',
+            name='测试组合5',
+            portfolio_type='mixed'
+        )
+    
+    def test_warmup_feeds_views(self):
+        """测试预热后视图直接读取缓存"""
+        from tasks.tasks import cache_warmup
+        result = cache_warmup.apply().get()
+        self.assertEqual(result['status'], 'success')
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('indicator-latest'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('risk-dashboard'))
+        self.assertEqual(response.data['active_portfolios'], 1)
+    
+    def test_write_invalidates(self):
+        """测试写入后缓存失效"""
+        from datetime import date
+        from risk.models import RiskIndicator
+        url = reverse('indicator-latest')
+        self.assertEqual(self.client.get(url).data, [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            RiskIndicator.objects.create(
+                portfolio=self.portfolio,
+                indicator_date=date(2024, 1, 2)
+            )
+        
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['portfolio_code'], 'TEST005')
+
+    
+    def test_single_flight_serves_stale(self):
+        """测试其他进程持有租约时返回旧值"""
+        from django.core.cache import cache
+        from risk import cache as risk_cache
+        url = reverse('indicator-latest')
+        self.client.get(url)
+        
+        # 模拟数据失效且另一个 worker 正在重算
+        with self.captureOnCommitCallbacks(execute=True):
+            self.portfolio.save()
+        entry_key = risk_cache._entry_key(risk_cache.RISK_INDICATORS_LATEST, ())
+        cache.add(risk_cache._lease_key(entry_key), 'other-worker', 30)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data, [])
+        
+        stats = risk_cache.get_stats()[risk_cache.RISK_INDICATORS_LATEST]
+        self.assertEqual(stats['miss'], 1)
+        self.assertEqual(stats['coalesce'], 1)
+    
+    @override_settings(RISK_CACHE_POLICIES={'risk_dashboard': {'soft_ttl': 0, 'beta': 0}})
+    def test_soft_ttl_policy(self):
+        """测试按数据集配置软过期"""
+        from risk import cache as risk_cache
+        url = reverse('risk-dashboard')
+        self.client.get(url)
+        self.client.get(url)
+        stats = risk_cache.get_stats()[risk_cache.RISK_DASHBOARD]
+        self.assertEqual(stats['miss'], 2)
+        self.assertEqual(stats['hit'], 0)
+
+
+class MetricsTest(APITestCase):
+    """接口性能监控测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        self.user = User.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.client.force_authenticate(user=self.user)
+    
+    def test_metrics_endpoint(self):
+        """测试按视图与动作导出指标"""
+        self.client.get(reverse('trade-summary'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content.decode()
+        self.assertIn(
+            'risk_http_request_queries_count{action="summary",method="GET",view="TradeViewSet"}',
+            content
+        )
+        self.assertIn('risk_http_response_serialization_seconds_bucket', content)
+        self.assertIn('risk_cache_events_total', content)
+    
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1', '10.1.0.0/16'], METRICS_TOKEN='scrape-token')
+    def test_metrics_access_control(self):
+        """测试 /metrics 只允许白名单地址或携带令牌的请求"""
+        self.client.force_authenticate(user=None)
+        for address in ('127.0.0.1', '10.1.2.3'):
+            response = self.client.get('/metrics', REMOTE_ADDR=address)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_log(self):
+        """测试慢请求日志记录SQL"""
+        with self.assertLogs('risk.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('trade-summary'))
+        self.assertIn('TradeViewSet.summary', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+
+class SyncRiskIndicatorsTest(TestCase):
+    """风险指标分片同步测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from risk.models import Portfolio
+        from risk_project.celery import app
+        self.celery_conf = app.conf
+        self.celery_conf.task_always_eager = True
+        Portfolio.objects.bulk_create([
+            Portfolio(code=f'SYNC{i:03d}', name=f'同步组合{i}')
+            for i in range(5)
+        ])
+    
+    def tearDown(self):
+        self.celery_conf.task_always_eager = False
+    
+    def test_chunked_sync(self):
+        """测试分片分发与汇总"""
+        from tasks.tasks import sync_risk_indicators
+        from risk.models import RiskIndicator
+        result = sync_risk_indicators.apply(kwargs={'chunk_size': 2}).get()
+        self.assertEqual(result['status'], 'dispatched')
+        self.assertEqual(result['chunks'], 3)
+        self.assertEqual(RiskIndicator.objects.count(), 5)
+        # 汇总回调已释放锁
+        from tasks import locks
+        self.assertIsNone(locks.get_holder('tasks.sync_risk_indicators'))
+    
+    def test_lock_held_until_callback(self):
+        """测试分发后锁由分片持有，汇总回调执行前新的同步被跳过"""
+        from unittest import mock
+        from tasks import locks
+        from tasks.tasks import finalize_sync_risk_indicators, sync_risk_indicators
+        dispatched = {}
+        
+        def chord(header):
+            dispatched['chunks'] = list(header)
+            
+            def apply(callback):
+                dispatched['callback'] = callback
+                return mock.Mock(id='callback-id')
+            return apply
+        
+        # 模拟分片尚在其他 worker 上执行
+        with mock.patch('celery.chord', chord):
+            result = sync_risk_indicators.apply(kwargs={'chunk_size': 2}).get()
+        self.assertEqual(result['status'], 'dispatched')
+        self.assertIsNotNone(locks.get_holder('tasks.sync_risk_indicators'))
+        self.assertEqual(sync_risk_indicators.apply().get()['status'], 'skipped')
+        
+        lock = dispatched['callback'].kwargs['lock']
+        self.assertEqual([chunk.kwargs['lock'] for chunk in dispatched['chunks']], [lock] * 3)
+        self.assertTrue(locks.renew(*lock, 60))
+        finalize_sync_risk_indicators([], '2024-01-02', lock=lock)
+        self.assertIsNone(locks.get_holder('tasks.sync_risk_indicators'))
+        self.assertEqual(sync_risk_indicators.apply(kwargs={'chunk_size': 2}).get()['status'], 'dispatched')
+    
+    def test_chunk_counts_rows_actually_inserted(self):
+        """测试批量写入跳过部分行时只统计实际新增的行"""
+        from unittest import mock
+        from risk.models import Portfolio, RiskIndicator
+        from tasks.tasks import sync_risk_indicators_chunk
+        
+        ids = list(Portfolio.objects.values_list('id', flat=True)[:3])
+        bulk_create = RiskIndicator.objects.bulk_create
+        
+        def partial_bulk_create(objs, **kwargs):
+            # 模拟 ignore_conflicts 静默跳过了第一行
+            return bulk_create(objs[1:], **kwargs)
+        
+        with mock.patch.object(RiskIndicator.objects, 'bulk_create', side_effect=partial_bulk_create):
+            result = sync_risk_indicators_chunk.apply(args=[ids, '2024-01-02']).get()
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(RiskIndicator.objects.filter(indicator_date='2024-01-02').count(), 2)
+    
+    def test_finalize_aggregates_failures(self):
+        """测试汇总失败分片"""
+        from tasks.tasks import finalize_sync_risk_indicators
+        result = finalize_sync_risk_indicators([
+            {'status': 'success', 'created': 2, 'skipped': 1},
+            {'status': 'error', 'portfolio_ids': [7, 8], 'message': 'timeout'},
+        ], '2024-01-02')
+        self.assertEqual(result['status'], 'partial')
+        self.assertEqual(result['portfolios_processed'], 3)
+        self.assertEqual(result['failed_portfolios'], [7, 8])
+
+
+
+class TaskLockTest(APITestCase):
+    """定时任务互斥锁测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        self.user = User.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.client.force_authenticate(user=self.user)
+    
+    def test_database_backend(self):
+        """测试数据库锁互斥与释放"""
+        from tasks import locks
+        lease = locks.acquire('tasks.cache_warmup', {'task_id': 'a'})
+        self.assertIsNotNone(lease)
+        self.assertIsNone(locks.acquire('tasks.cache_warmup', {'task_id': 'b'}))
+        self.assertEqual(locks.get_holder('tasks.cache_warmup'), {'task_id': 'a'})
+        with lease:
+            pass
+        self.assertIsNone(locks.get_holder('tasks.cache_warmup'))
+    
+    def test_redis_backend(self):
+        """测试 Redis 锁续租只对持有者生效"""
+        import fakeredis
+        from tasks.locks import RedisLockBackend
+        backend = RedisLockBackend(fakeredis.FakeRedis())
+        self.assertTrue(backend.acquire('job', 'token-a', {'task_id': 'a'}, 60))
+        self.assertFalse(backend.acquire('job', 'token-b', {'task_id': 'b'}, 60))
+        self.assertFalse(backend.renew('job', 'token-b', 60))
+        self.assertTrue(backend.renew('job', 'token-a', 60))
+        self.assertEqual(backend.get_holder('job'), {'task_id': 'a'})
+        self.assertFalse(backend.release('job', 'token-b'))
+        self.assertTrue(backend.release('job', 'token-a'))
+        self.assertIsNone(backend.get_holder('job'))
+    
+    def test_overlapping_run_skipped(self):
+        """测试重叠执行被跳过并可查询持有者"""
+        from tasks import locks
+        from tasks.tasks import check_risk_alerts
+        lease = locks.acquire('tasks.check_risk_alerts', {'task_id': 'running'})
+        with lease:
+            result = check_risk_alerts.apply().get()
+            self.assertEqual(result['status'], 'skipped')
+            self.assertEqual(result['holder'], {'task_id': 'running'})
+            
+            response = self.client.get(reverse('task-status'), {'task_name': 'check_risk_alerts'})
+            self.assertEqual(response.data['lock_holder'], {'task_id': 'running'})
+            
+            response = self.client.post(reverse('task-execute'), {'task_name': 'check_risk_alerts'})
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        result = check_risk_alerts.apply().get()
+        self.assertEqual(result['status'], 'success')
+    
+    def test_lost_lease_aborts_run(self):
+        """测试续租失败（锁被接管）后任务终止"""
+        from unittest import mock
+        from risk.models import Portfolio, RiskAlert, RiskIndicator
+        from tasks import locks
+        from tasks.tasks import check_risk_alerts
+        portfolio = Portfolio.objects.create(code='LOST001', name='锁丢失组合')
+        RiskIndicator.objects.create(
+            portfolio=portfolio, indicator_date='2024-01-02', max_drawdown='0.5'
+        )
+        acquire = locks.acquire
+        
+        def acquire_lost(*args, **kwargs):
+            lease = acquire(*args, **kwargs)
+            lease.lost = True
+            return lease
+        
+        with mock.patch.object(locks, 'acquire', side_effect=acquire_lost):
+            result = check_risk_alerts.apply().get()
+        self.assertEqual(result['status'], 'aborted')
+        self.assertEqual(result['reason'], 'lock_lost')
+        self.assertFalse(RiskAlert.objects.exists())
+        # 锁已释放（未被续租的令牌不会删除他人持有的锁）
+        self.assertIsNone(locks.get_holder('tasks.check_risk_alerts'))
+    
+    def test_check_lease_outside_task(self):
+        """测试未持有锁时 check_lease 不生效"""
+        from tasks.locks import check_lease
+        check_lease()
+
+
+class PipelineTest(APITestCase):
+    """夜间批处理流水线测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from risk.models import Portfolio
+        from risk_project.celery import app
+        self.celery_conf = app.conf
+        self.celery_conf.task_always_eager = True
+        reports_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(reports_dir.cleanup)
+        self.enterContext(override_settings(REPORTS_DIR=reports_dir.name))
+        self.user = User.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.client.force_authenticate(user=self.user)
+        Portfolio.objects.bulk_create([
+            Portfolio(code=f'PIPE{i:03d}', name=f'流水线组合{i}')
+            for i in range(3)
+        ])
+    
+    def tearDown(self):
+        self.celery_conf.task_always_eager = False
+    
+    def test_unchanged_stages_skipped(self):
+        """测试输入未变化的阶段被跳过，并记录各阶段耗时"""
+        from tasks.models import PipelineRun
+        from tasks.tasks import run_nightly_pipeline
+        run_nightly_pipeline.apply().get()
+        first = PipelineRun.objects.order_by('id').first()
+        self.assertEqual(first.status, 'success')
+        self.assertEqual(
+            list(first.stages.order_by('id').values_list('status', flat=True)),
+            ['success'] * 5
+        )
+        self.assertFalse(first.stages.filter(duration_ms__isnull=True).exists())
+        
+        run_nightly_pipeline.apply().get()
+        second = PipelineRun.objects.order_by('id').last()
+        self.assertEqual(second.status, 'success')
+        self.assertEqual(
+            list(second.stages.order_by('id').values_list('status', flat=True)),
+            ['skipped'] * 5
+        )
+    
+    def test_changed_input_reruns_downstream(self):
+        """测试新增交易只触发依赖交易数据的阶段"""
+        from django.utils import timezone
+        from risk.models import Portfolio, Trade
+        from tasks.models import PipelineRun
+        from tasks.tasks import run_nightly_pipeline
+        run_nightly_pipeline.apply().get()
+        Trade.objects.create(
+            portfolio=Portfolio.objects.first(),
+            trade_type='buy',
+            security_type='stock',
+            security_code='600000',
+            security_name='浦发银行',
+            trade_date=timezone.now().date(),
+            quantity=100,
+            price=10,
+            amount=1000
+        )
+        run_nightly_pipeline.apply().get()
+        run = PipelineRun.objects.order_by('id').last()
+        self.assertEqual(
+            dict(run.stages.values_list('stage', 'status')),
+            {
+                'sync_risk_indicators': 'skipped',
+                'detect_abnormal_trades': 'success',
+                'check_risk_alerts': 'skipped',
+                'cache_warmup': 'success',
+                'export_daily_report': 'success',
+            }
+        )
+        
+        response = self.client.get(reverse('pipeline-runs'))
+        self.assertEqual(response.data[0]['run_id'], run.id)
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.data[0]['last_run']['run_id'], run.id)
+
+class TaskProgressTest(APITestCase):
+    """任务批量状态与进度推送测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from functools import partial
+        from unittest import mock
+        from celery.backends.cache import CacheBackend
+        from celery.result import AsyncResult
+        from risk_project.celery import app
+        self.backend = CacheBackend(app=app, backend='memory')
+        patcher = mock.patch('tasks.progress.AsyncResult', partial(AsyncResult, backend=self.backend))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.client.force_authenticate(user=self.user)
+    
+    def test_batch_status(self):
+        """测试批量查询返回结构化进度与结果"""
+        self.backend.store_result('task-a', {'processed': 3, 'total': 10, 'rate': 1.5}, 'PROGRESS')
+        self.backend.store_result('task-b', {'status': 'success', 'alerts_created': 2}, 'SUCCESS')
+        response = self.client.get(reverse('task-status-batch'), {'task_ids': 'task-a,task-b'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        a, b = response.data
+        self.assertEqual(a['progress']['processed'], 3)
+        self.assertFalse(a['done'])
+        self.assertEqual(b['result'], {'status': 'success', 'alerts_created': 2})
+        self.assertTrue(b['done'])
+    
+    @override_settings(TASK_PROGRESS_STREAM_INTERVAL=0)
+    def test_fan_out_progress_stream(self):
+        """测试分片任务的汇总进度通过SSE推送"""
+        from unittest import mock
+        from django.core.cache import cache
+        from tasks import progress
+        # 模拟 worker 与 Web 进程共享的缓存
+        patcher = mock.patch('tasks.progress.fan_out_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        progress.start_fan_out('sync-1', 4)
+        self.backend.store_result('sync-1', {'status': 'dispatched', 'chunks': 2}, 'SUCCESS')
+        progress.advance_fan_out('sync-1', 2)
+        self.assertEqual(progress.get_status('sync-1')['progress']['processed'], 2)
+        self.assertFalse(progress.get_status('sync-1')['done'])
+        
+        progress.advance_fan_out('sync-1', 2)
+        response = self.client.get(
+            reverse('task-stream'), {'task_ids': 'sync-1'}, HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: progress', body)
+        self.assertIn('"processed": 4', body)
+        self.assertTrue(body.rstrip().startswith('event: progress'))
+        self.assertIn('event: done', body)
+    
+    def test_fan_out_without_shared_cache(self):
+        """测试进程内缓存下不登记汇总进度，以汇总回调结果判断完成"""
+        from tasks import progress
+        progress.start_fan_out('sync-2', 4)
+        progress.advance_fan_out('sync-2', 4)
+        self.assertIsNone(progress.get_fan_out('sync-2'))
+        self.backend.store_result(
+            'sync-2', {'status': 'dispatched', 'chunks': 2, 'callback_id': 'sync-2-callback'}, 'SUCCESS'
+        )
+        self.assertFalse(progress.get_status('sync-2')['done'])
+        self.backend.store_result('sync-2-callback', {'status': 'success'}, 'SUCCESS')
+        self.assertTrue(progress.get_status('sync-2')['done'])
+    
+    @override_settings(TASK_PROGRESS_STREAM_INTERVAL=0, TASK_PROGRESS_STREAM_MAX_CONNECTIONS=1)
+    def test_stream_connection_limit(self):
+        """测试推送连接数达到上限时拒绝，连接关闭后释放名额"""
+        from tasks.views import stream_slots
+        self.backend.store_result('task-c', {'status': 'success'}, 'SUCCESS')
+        url = reverse('task-stream')
+        first = self.client.get(url, {'task_ids': 'task-c'}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(stream_slots.active, 1)
+        second = self.client.get(url, {'task_ids': 'task-c'}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        b''.join(first.streaming_content)
+        self.assertEqual(stream_slots.active, 0)
+        third = self.client.get(url, {'task_ids': 'task-c'}, HTTP_ACCEPT='text/event-stream')
+        self.assertIn('event: done', b''.join(third.streaming_content).decode())
+
+class DailyReportTest(TestCase):
+    """日报导出测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from django.core.cache import cache
+        from risk.models import Portfolio, RiskIndicator
+        cache.clear()
+        reports_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(reports_dir.cleanup)
+        self.enterContext(override_settings(REPORTS_DIR=reports_dir.name))
+        portfolios = Portfolio.objects.bulk_create([
+            Portfolio(code=f'RPT{i:03d}', name=f'日报组合{i}')
+            for i in range(20)
+        ])
+        RiskIndicator.objects.bulk_create([
+            RiskIndicator(portfolio=portfolio, indicator_date=f'2024-01-0{day}', sharpe_ratio=day)
+            for portfolio in portfolios
+            for day in (1, 2)
+        ])
+    
+    def test_fixed_query_count_and_cache(self):
+        """测试查询条数与组合数量无关，数据未变化时复用已生成文件"""
+        import csv
+        from tasks.reports import build_daily_report
+        # 水位 5 条 + 日报 4 条
+        with self.assertNumQueries(9):
+            report = build_daily_report('2024-01-02')
+        self.assertFalse(report['cached'])
+        with open(report['path'], encoding='utf-8-sig') as f:
+            rows = list(csv.reader(f))
+        indicators = rows[rows.index(['二、风险指标']) + 2:][:20]
+        self.assertEqual(indicators[0][0], 'RPT000')
+        self.assertEqual(indicators[0][3], '2.0000')
+        
+        # 水位已缓存，不再查询
+        with self.assertNumQueries(0):
+            self.assertTrue(build_daily_report('2024-01-02')['cached'])
+    
+    def test_watermark_invalidated_on_write(self):
+        """测试数据写入后日报水位失效并重新生成"""
+        from risk.models import RiskAlert, Portfolio
+        from tasks.reports import build_daily_report
+        first = build_daily_report('2024-01-02')
+        with self.captureOnCommitCallbacks(execute=True):
+            RiskAlert.objects.create(
+                portfolio=Portfolio.objects.first(), alert_type='threshold',
+                title='回撤预警', content='回撤超限',
+            )
+        second = build_daily_report('2024-01-02')
+        self.assertNotEqual(first['watermark'], second['watermark'])
+        self.assertFalse(second['cached'])
+    
+    def test_xlsx_and_parquet(self):
+        """测试 xlsx 与 parquet 输出"""
+        import os
+        from openpyxl import load_workbook
+        import pyarrow.parquet as pq
+        from tasks.reports import build_daily_report
+        report = build_daily_report('2024-01-02', 'xlsx')
+        workbook = load_workbook(report['path'])
+        self.assertEqual(workbook.sheetnames, ['组合概况', '风险指标', '今日交易', '风险预警'])
+        self.assertEqual(workbook['组合概况'].max_row, 21)
+        
+        report = build_daily_report('2024-01-02', 'parquet')
+        table = pq.read_table(os.path.join(report['path'], 'indicators.parquet'))
+        self.assertEqual(table.num_rows, 20)
+        self.assertEqual(table.column('夏普比率')[0].as_py(), 2.0)
+
+class PermissionCacheTest(TestCase):
+    """权限位集缓存测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from types import SimpleNamespace
+        from django.core.cache import cache
+        cache.clear()
+        self.read = Permission.objects.create(name='查看风险', code='risk.read')
+        self.export = Permission.objects.create(name='导出报告', code='report.export')
+        self.role = Role.objects.create(name='风控专员', code='risk_officer')
+        self.role.permissions.add(self.read)
+        self.user = User.objects.create_user(email='officer@example.com', password='pass123')
+        self.user.roles.add(self.role)
+        self.request = SimpleNamespace(user=self.user)
+        self.view = SimpleNamespace(permission_code='risk.read')
+    
+    def check(self, code):
+        from types import SimpleNamespace
+        from accounts.permissions import HasPermission
+        # 模拟新请求：重新加载用户，不复用请求内的结果
+        user = User.objects.get(pk=self.user.pk)
+        return HasPermission().has_permission(
+            SimpleNamespace(user=user), SimpleNamespace(permission_code=code)
+        )
+    
+    def test_cached_check_without_queries(self):
+        """测试缓存命中后鉴权不查询数据库"""
+        from accounts.permissions import HasPermission
+        permission = HasPermission()
+        self.assertTrue(permission.has_permission(self.request, self.view))
+        self.request.user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(permission.has_permission(self.request, self.view))
+            self.assertFalse(permission.has_permission(
+                self.request, type('View', (), {'permission_code': 'report.export'})()
+            ))
+            self.assertTrue(permission.has_permission(self.request, object()))
+    
+    def test_invalidate_on_role_changes(self):
+        """测试角色权限与用户角色变化后缓存失效"""
+        self.assertFalse(self.check('report.export'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions.add(self.export)
+        self.assertTrue(self.check('report.export'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.roles.remove(self.role)
+        self.assertFalse(self.check('risk.read'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.user_set.add(self.user)
+        self.assertTrue(self.check('risk.read'))
+    
+    def test_local_cache_short_timeout(self):
+        """测试进程内缓存下位集只短时缓存，其他进程的变更在超时后生效"""
+        import time
+        from unittest import mock
+        from django.conf import settings
+        from accounts import permission_cache
+        self.assertEqual(permission_cache.get_timeout(), settings.PERMISSION_CACHE_LOCAL_TIMEOUT)
+        self.assertTrue(self.check('risk.read'))
+        # 不执行提交回调：相当于在其他进程撤销权限，本进程收不到失效
+        self.role.permissions.remove(self.read)
+        self.assertTrue(self.check('risk.read'))
+        later = time.time() + settings.PERMISSION_CACHE_LOCAL_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertFalse(self.check('risk.read'))
+
+class StatelessJWTTest(APITestCase):
+    """无状态JWT认证测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from django.core.cache import cache
+        cache.clear()
+        self.role = Role.objects.create(name='风控专员', code='risk_officer')
+        self.user = User.objects.create_user(email='officer@example.com', password='pass123')
+        self.user.roles.add(self.role)
+        response = self.client.post(
+            reverse('login'), {'email': 'officer@example.com', 'password': 'pass123'}, format='json'
+        )
+        self.access = response.data['access']
+        self.refresh = response.data['refresh']
+    
+    def authenticate(self, token):
+        from rest_framework.test import APIRequestFactory
+        from accounts.authentication import StatelessJWTAuthentication
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return StatelessJWTAuthentication().authenticate(request)
+    
+    def test_claims_authenticate_without_queries(self):
+        """测试令牌声明认证不查询数据库，角色变化后退回数据库加载"""
+        from accounts.authentication import ClaimUser
+        with self.assertNumQueries(0):
+            user, token = self.authenticate(self.access)
+        self.assertIsInstance(user, ClaimUser)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.roles, ['risk_officer'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.roles.clear()
+        user, token = self.authenticate(self.access)
+        self.assertIsInstance(user, User)
+    
+    def test_logout_revokes_session(self):
+        """测试登出后该会话的令牌立即失效"""
+        from rest_framework_simplejwt.exceptions import InvalidToken
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        refreshed_access = response.data['access']
+        
+        response = self.client.post(reverse('logout'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for token in (self.access, refreshed_access):
+            with self.assertRaises(InvalidToken):
+                self.authenticate(token)
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_stateless_auth_requires_shared_cache(self):
+        """测试无状态认证在进程内缓存下拒绝启动"""
+        from django.core.exceptions import ImproperlyConfigured
+        from accounts.tokens import check_revocation_cache
+        with override_settings(JWT_STATELESS_AUTH=True):
+            with self.assertRaises(ImproperlyConfigured):
+                check_revocation_cache()
+            with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+            }}):
+                check_revocation_cache()
+        check_revocation_cache()
+
+@override_settings(
+    THROTTLE_REDIS_URL='redis://fake-redis:6379/0',
+    THROTTLE_REDIS_OPTIONS={'connection_class': FakeRedisConnection},
+)
+class SharedThrottleTest(APITestCase):
+    """跨进程限流测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from risk_project.throttling import get_limiter
+        self.limiter = get_limiter()
+        self.limiter.client.flushall()
+        self.user = User.objects.create_user(email='trader@example.com', password='pass123')
+        self.client.force_authenticate(user=self.user)
+    
+    def test_limit_shared_between_throttles(self):
+        """测试配额由所有限流实例共享，超限后返回等待时间"""
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        from risk_project.throttling import SharedUserRateThrottle
+        
+        class BurstThrottle(SharedUserRateThrottle):
+            rate = '3/min'
+        
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.user
+        # 每次新建实例，模拟不同 worker 处理请求
+        results = [BurstThrottle().allow_request(request, None) for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        throttle = BurstThrottle()
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertGreater(throttle.wait(), 0)
+        self.assertLessEqual(throttle.wait(), 20)
+        self.assertEqual(throttle.get_quota(request, None)['remaining'], 0)
+    
+    def test_quota_endpoint(self):
+        """测试配额查询不额外消耗配额"""
+        response = self.client.get(reverse('quota'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quota = response.data[0]
+        self.assertEqual(quota['scope'], 'user')
+        self.assertEqual(quota['limit'], 1000)
+        self.assertEqual(quota['remaining'], 999)
+        response = self.client.get(reverse('quota'))
+        self.assertEqual(response.data[0]['remaining'], 998)
+    
+    def test_quota_when_redis_unavailable(self):
+        """测试限流存储不可用时配额查询不报错"""
+        from unittest import mock
+        import redis
+        with mock.patch.object(self.limiter, 'hit', side_effect=redis.ConnectionError('down')):
+            response = self.client.get(reverse('quota'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data[0]['remaining'])
+        self.assertIsNone(response.data[0]['reset'])
+    
+    @override_settings(THROTTLE_REDIS_URL=None)
+    def test_cache_fallback_quota_reset(self):
+        """测试缓存实现的 reset 为配额完全恢复时间（按最新一次请求计算）"""
+        from unittest import mock
+        from django.core.cache import cache
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from risk_project.throttling import SharedUserRateThrottle
+        
+        class BurstThrottle(SharedUserRateThrottle):
+            rate = '3/min'
+        
+        cache.clear()
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.user
+        with mock.patch('rest_framework.throttling.SimpleRateThrottle.timer', side_effect=[1000.0, 1030.0]):
+            BurstThrottle().allow_request(request, None)
+            BurstThrottle().allow_request(request, None)
+        with mock.patch('risk_project.throttling.time.time', return_value=1040.0):
+            quota = BurstThrottle().get_quota(request, None)
+        self.assertEqual(quota['remaining'], 1)
+        self.assertEqual(quota['reset'], 50)
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'], REPLICA_MAX_LAG=10)
+class ReplicaRouterTest(TestCase):
+    """读写分离路由测试"""
+    
+    def setUp(self):
+        """测试数据准备"""
+        from unittest import mock
+        from django.db import connections
+        from risk_project import db_router
+        db_router._lag_cache.clear()
+        self.lags = {'replica_0': 0.5, 'replica_1': 1.0}
+        patchers = [
+            mock.patch.object(db_router, 'measure_lag', lambda alias: self.lags[alias]),
+            # TestCase 始终处于事务中，此处模拟事务外的读取
+            mock.patch.object(connections['default'], 'in_atomic_block', False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = db_router.ReplicaRouter()
+    
+    def test_reads_spread_and_lag_fallback(self):
+        """测试读取轮询副本，延迟过高时退回主库"""
+        from risk.models import Portfolio
+        from risk_project import db_router
+        self.assertEqual(self.router.db_for_read(Portfolio), 'default')
+        with db_router.routing_context():
+            aliases = {self.router.db_for_read(Portfolio) for _ in range(4)}
+            self.assertEqual(aliases, {'replica_0', 'replica_1'})
+            
+            db_router._lag_cache.clear()
+            self.lags['replica_1'] = 30
+            self.assertEqual({self.router.db_for_read(Portfolio) for _ in range(4)}, {'replica_0'})
+            
+            db_router._lag_cache.clear()
+            self.lags['replica_0'] = None
+            self.assertEqual(self.router.db_for_read(Portfolio), 'default')
+    
+    def test_sticky_primary_after_write(self):
+        """测试写入后本次请求与后续请求读主库"""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from risk.models import Portfolio
+        from risk_project.db_router import ReplicaRoutingMiddleware, STICKY_COOKIE
+        used = []
+        
+        def view(request):
+            used.append(self.router.db_for_read(Portfolio))
+            if request.method == 'POST':
+                self.router.db_for_write(Portfolio)
+                used.append(self.router.db_for_read(Portfolio))
+            return HttpResponse()
+        
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get('/'))
+        self.assertTrue(used[-1].startswith('replica_'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        
+        response = middleware(factory.post('/'))
+        self.assertEqual(used[-2:], ['default', 'default'])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(used[-1], 'default')
+
+
+class ReplicaRoutingDatabaseTest(TransactionTestCase):
+    """读写分离路由测试（两个 SQLite 库）"""
+    
+    def setUp(self):
+        """测试数据准备：临时 SQLite 文件作为副本，数据与主库不同以区分读取来源"""
+        from django.db import connections
+        from risk.models import Portfolio
+        from risk_project import db_router
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        connections.settings['replica_test'] = dict(
+            connections['default'].settings_dict, NAME=os.path.join(tmp, 'replica.sqlite3')
+        )
+        self.addCleanup(connections.settings.pop, 'replica_test')
+        self.addCleanup(connections.__delitem__, 'replica_test')
+        self.addCleanup(lambda: connections['replica_test'].close())
+        with connections['replica_test'].schema_editor() as editor:
+            editor.create_model(Portfolio)
+        Portfolio.objects.using('replica_test').create(code='REPLICA', name='副本组合')
+        Portfolio.objects.create(code='PRIMARY', name='主库组合')
+        
+        db_router._lag_cache.clear()
+        self.enterContext(override_settings(DATABASE_REPLICAS=['replica_test']))
+    
+    def test_reads_replica_writes_primary(self):
+        """测试读请求读副本，写入及写后读（含粘滞）使用主库"""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from risk.models import Portfolio
+        from risk_project.db_router import ReplicaRoutingMiddleware, STICKY_COOKIE
+        seen = []
+        
+        def view(request):
+            if request.method == 'POST':
+                Portfolio.objects.create(code='NEW', name='新组合')
+            seen.append(sorted(Portfolio.objects.values_list('code', flat=True)))
+            return HttpResponse()
+        
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.get('/'))
+        self.assertEqual(seen[-1], ['REPLICA'])
+        
+        response = middleware(factory.post('/'))
+        self.assertEqual(seen[-1], ['NEW', 'PRIMARY'])
+        self.assertFalse(Portfolio.objects.using('replica_test').filter(code='NEW').exists())
+        
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = response.cookies[STICKY_COOKIE].value
+        middleware(request)
+        self.assertEqual(seen[-1], ['NEW', 'PRIMARY'])
+        
+        middleware(factory.get('/'))
+        self.assertEqual(seen[-1], ['REPLICA'])
+    
+    def test_tasks_read_primary_despite_lag(self):
+        """测试副本落后时任务中的读取（含锁持有者）仍使用主库"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.db import connections
+        from django.utils import timezone
+        from risk.models import Portfolio
+        from risk_project import db_router
+        from tasks.locks import DatabaseLockBackend
+        from tasks.models import TaskLock
+        with connections['replica_test'].schema_editor() as editor:
+            editor.create_model(TaskLock)
+        # 副本延迟 3 秒（未超过 REPLICA_MAX_LAG），尚未复制主库刚写入的锁
+        self.enterContext(mock.patch.object(db_router, 'measure_lag', lambda alias: 3.0))
+        now = timezone.now()
+        TaskLock.objects.create(
+            name='sync', token='t1', holder={'worker': 'w1'},
+            acquired_at=now, expires_at=now + timedelta(minutes=5),
+        )
+        
+        db_router.task_prerun(task_id='task-1')
+        try:
+            self.assertEqual(DatabaseLockBackend().get_holder('sync'), {'worker': 'w1'})
+            self.assertEqual(list(Portfolio.objects.values_list('code', flat=True)), ['PRIMARY'])
+            # 显式允许延迟的只读代码段读副本
+            with db_router.routing_context():
+                self.assertEqual(list(Portfolio.objects.values_list('code', flat=True)), ['REPLICA'])
+                self.assertIsNone(DatabaseLockBackend().get_holder('sync'))
+        finally:
+            db_router.task_postrun(task_id='task-1')
+
+
+class SQLiteTuningTest(TransactionTestCase):
+    """SQLite 连接调优测试"""
+    
+    def test_pragmas_applied_on_connect(self):
+        """测试新连接按 SQLITE_PRAGMAS 设置 WAL 等参数"""
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        wrapper = DatabaseWrapper(
+            dict(connections['default'].settings_dict, NAME=os.path.join(tmp, 'tuned.sqlite3')),
+            alias='tuned',
+        )
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            values = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        self.assertEqual(values, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2,
+        })
+    
+    def test_maintenance_task(self):
+        """测试维护任务执行 optimize 与检查点"""
+        from tasks.tasks import sqlite_maintenance
+        result = sqlite_maintenance.apply().get()
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('default', result['databases'])
+
+
+class TradePartitionTest(TestCase):
+    """交易分区测试"""
+    
+    def test_month_helpers(self):
+        """测试分区月份计算与命名"""
+        import datetime
+        from risk import partitions
+        month = partitions.month_start(datetime.date(2024, 11, 18))
+        self.assertEqual(month, datetime.date(2024, 11, 1))
+        self.assertEqual(partitions.add_months(month, 2), datetime.date(2025, 1, 1))
+        self.assertEqual(partitions.partition_name(month), 'risk_trade_202411')
+    
+    def test_noop_without_native_partitioning(self):
+        """测试非 PostgreSQL 数据库不创建分区"""
+        from tasks.tasks import ensure_trade_partitions
+        result = ensure_trade_partitions.apply().get()
+        self.assertEqual(result, {'status': 'success', 'created': []})
+
+
+@tag('postgresql')
+@skipUnless(connection.vendor == 'postgresql', '交易分区仅在 PostgreSQL 上生效')
+class TradePartitionPostgresTest(TransactionTestCase):
+    """交易分区测试（PostgreSQL）
+    
+    python manage.py test tests --tag postgresql（需配置 PostgreSQL 数据库）
+    """
+    
+    def setUp(self):
+        """测试数据准备"""
+        from risk.models import Portfolio
+        self.portfolio = Portfolio.objects.create(code='PART001', name='分区组合')
+    
+    def trade(self, model, trade_date, **fields):
+        return model(
+            portfolio_id=self.portfolio.id, trade_type='buy', security_type='stock',
+            security_code='600000', security_name='浦发银行', trade_date=trade_date,
+            quantity=100, price=10, amount=1000, **fields
+        )
+    
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+    
+    def test_migration_partitions_existing_data(self):
+        """测试迁移 0003 把已有数据的普通表转换为按月分区表"""
+        import datetime
+        from django.db.migrations.executor import MigrationExecutor
+        from risk import partitions
+        from risk.models import Trade
+        before, after = ('risk', '0002_model_indexes'), ('risk', '0003_partition_trade')
+        executor = MigrationExecutor(connection)
+        executor.migrate([before])
+        # 回滚不改变分区结构，此处按 0002 的模型重建普通表
+        old_trade = executor.loader.project_state(before).apps.get_model('risk', 'Trade')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {partitions.TABLE} CASCADE')
+        with connection.schema_editor() as editor:
+            editor.create_model(old_trade)
+        old_trade.objects.bulk_create([
+            self.trade(old_trade, datetime.date(2024, 1, 15)),
+            self.trade(old_trade, datetime.date(2024, 1, 31)),
+            self.trade(old_trade, datetime.date(2024, 3, 1)),
+        ])
+        
+        executor = MigrationExecutor(connection)
+        executor.migrate([after])
+        self.assertTrue(partitions.is_partitioned(connection))
+        self.assertEqual(
+            partitions.list_partitions(connection),
+            ['risk_trade_202401', 'risk_trade_202402', 'risk_trade_202403'],
+        )
+        self.assertEqual(self.count('risk_trade_202401'), 2)
+        self.assertEqual(self.count('risk_trade_202403'), 1)
+        self.assertEqual(self.count(partitions.DEFAULT_PARTITION), 0)
+        # 序列跳过已复制的 id，ORM 写入与按 id 查询不受影响
+        trade = Trade.objects.create(**{
+            field: getattr(self.trade(Trade, datetime.date(2024, 3, 2)), field)
+            for field in ('portfolio_id', 'trade_type', 'security_type', 'security_code',
+                          'security_name', 'trade_date', 'quantity', 'price', 'amount')
+        })
+        self.assertEqual(Trade.objects.get(pk=trade.pk).trade_date, datetime.date(2024, 3, 2))
+        self.assertEqual(Trade.objects.count(), 4)
+        
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+    
+    def test_ensure_partitions_moves_default_rows(self):
+        """测试新建分区时把默认分区中该月的数据移入，重复执行不再新建"""
+        import datetime
+        from risk import partitions
+        from risk.models import Trade
+        from tasks.tasks import ensure_trade_partitions
+        self.assertTrue(partitions.is_partitioned(connection))
+        # 测试库建表时没有 2020 年的分区，数据先落入默认分区
+        Trade.objects.bulk_create([
+            self.trade(Trade, datetime.date(2020, 5, 6)),
+            self.trade(Trade, datetime.date(2020, 6, 7)),
+        ])
+        self.assertEqual(self.count(partitions.DEFAULT_PARTITION), 2)
+        
+        created = partitions.ensure_partitions(1, start=datetime.date(2020, 5, 1))
+        self.assertEqual(created, ['risk_trade_202005', 'risk_trade_202006'])
+        self.assertEqual(self.count('risk_trade_202005'), 1)
+        self.assertEqual(self.count('risk_trade_202006'), 1)
+        self.assertEqual(self.count(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(Trade.objects.filter(trade_date__year=2020).count(), 2)
+        self.assertEqual(partitions.ensure_partitions(1, start=datetime.date(2020, 5, 1)), [])
+        
+        result = ensure_trade_partitions.apply().get()
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(ensure_trade_partitions.apply().get(), {'status': 'success', 'created': []})
+
+
+class SyntheticBookTest(TestCase):
+    """合成数据生成命令测试"""
+    
+    def generate(self, **options):
+        import datetime
+        from io import StringIO
+        from django.core.management import call_command
+        options.setdefault('end_date', datetime.date(2024, 6, 28))
+        call_command('generate_synthetic_book', portfolios=3, days=5, securities=200,
+                     stdout=StringIO(), **options)
+    
+    def snapshot(self):
+        from risk.models import Trade, Holding, RiskIndicator, RiskAlert
+        return (
+            list(Trade.objects.order_by('trade_date', 'trade_time', 'security_code', 'amount')
+                 .values_list('portfolio__code', 'security_code', 'quantity', 'amount')),
+            Holding.objects.count(), RiskIndicator.objects.count(), RiskAlert.objects.count(),
+        )
+    
+    def test_seeded_generation(self):
+        """测试相同种子生成相同数据，重复生成需要 --clear"""
+        from django.core.management.base import CommandError
+        from risk.models import Portfolio, RiskIndicator
+        self.generate()
+        first = self.snapshot()
+        self.assertEqual(Portfolio.objects.filter(code__startswith='SYN').count(), 3)
+        self.assertEqual(first[2], 15)
+        self.assertTrue(first[0])
+        self.assertFalse(RiskIndicator.objects.filter(indicator_date__week_day__in=[1, 7]).exists())
+        
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.generate(clear=True)
+        self.assertEqual(self.snapshot(), first)
+    
+    def test_copy_with_psycopg2_and_psycopg3(self):
+        """测试 PostgreSQL 下按驱动选择 copy_expert（psycopg2）或 cursor.copy（psycopg 3）"""
+        from contextlib import contextmanager
+        from types import SimpleNamespace
+        from unittest import mock
+        from django.db.backends.postgresql import psycopg_any
+        from risk.management.commands.generate_synthetic_book import BulkWriter
+        from risk.models import Portfolio
+        written = []
+        
+        class Psycopg2Cursor:
+            def copy_expert(self, sql, file):
+                written.append((sql, file.read()))
+        
+        class Psycopg3Cursor:
+            @contextmanager
+            def copy(self, sql):
+                yield SimpleNamespace(write=lambda data: written.append((sql, data)))
+        
+        for is_psycopg3, cursor in ((False, Psycopg2Cursor()), (True, Psycopg3Cursor())):
+            @contextmanager
+            def open_cursor(cursor=cursor):
+                yield cursor
+            
+            fake = SimpleNamespace(vendor='postgresql', ops=connection.ops, cursor=open_cursor)
+            writer = BulkWriter(fake, Portfolio, ['code', 'name'], batch_size=10)
+            writer.add(('P001', '组合,一'))
+            with mock.patch.object(psycopg_any, 'is_psycopg3', is_psycopg3):
+                writer.flush()
+            self.assertEqual(writer.count, 1)
+        
+        self.assertEqual(written[0], written[1])
+        self.assertTrue(written[0][0].startswith('COPY "risk_portfolio" ("code", "name") FROM STDIN'))
+        self.assertEqual(written[0][1], 'P001,"组合,一"\r\n')
+
+
+class QueryBudgetTest(APITestCase):
+    """接口 SQL 条数预算测试（benchmarks/budgets.json）"""
+    
+    def setUp(self):
+        import datetime
+        from io import StringIO
+        from django.core.management import call_command
+        from accounts import tokens
+        call_command('generate_synthetic_book', portfolios=3, days=5, securities=200,
+                     end_date=datetime.date(2024, 6, 28), stdout=StringIO())
+        self.user = User.objects.create_superuser(email='budget@example.com', password='budget-pass-123')
+        role = Role.objects.create(name='风控', code='risk')
+        role.permissions.add(Permission.objects.create(name='查看', code='risk.view'))
+        self.user.roles.add(role)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens.issue_tokens(self.user).access_token}')
+    
+    def test_query_budgets(self):
+        """测试各接口的 SQL 条数不超过预算（N+1 查询会导致失败）"""
+        from unittest import mock
+        from rest_framework.throttling import SimpleRateThrottle
+        from benchmarks import endpoints
+        budgets = endpoints.load_budgets()
+        fixtures = endpoints.get_fixtures('budget@example.com', 'budget-pass-123')
+        results = {}
+        with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'anon': None, 'user': None}):
+            for name, method, url, params in endpoints.build_requests(fixtures):
+                results[name] = endpoints.measure(self.client, method, url, params, iterations=2)
+        self.assertEqual(set(results), set(budgets))
+        self.assertEqual(endpoints.check(results, budgets, latency=False), [])
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])